@@ -0,0 +1,113 @@
+"""
+Coalesced User Activity Tracking
+
+Every authenticated request records "user X was seen now" in memory. A task
+started in main.lifespan writes the latest timestamp per user to users.last_active
+with one UPDATE ... CASE statement every ACTIVITY_FLUSH_INTERVAL_SECONDS, so
+activity tracking costs no write per request. Without a running flusher (CLI
+scripts, tests without lifespan) each touch is written right away - in the
+default executor when called on the event loop, so the loop never blocks on it.
+"""
+import asyncio
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from sqlalchemy import case, update
+from .database import SessionLocal
+
+load_dotenv()
+
+ACTIVITY_FLUSH_INTERVAL_SECONDS = float(os.getenv("ACTIVITY_FLUSH_INTERVAL_SECONDS", 60))
+
+# Users per UPDATE statement
+FLUSH_CHUNK_SIZE = 500
+
+
+class ActivityTracker:
+    """Latest last-seen time per user id, flushed in bulk."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._seen: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self, user_id: int, when: Optional[datetime] = None):
+        if user_id is None:
+            return
+        with self._lock:
+            self._seen[user_id] = when or datetime.now()
+        if self._task is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+            else:
+                loop.run_in_executor(None, self.flush)
+
+    def pending(self, user_id: int) -> Optional[datetime]:
+        """Last-seen time not yet written to the database, if any."""
+        with self._lock:
+            return self._seen.get(user_id)
+
+    def flush(self) -> int:
+        """Write all pending timestamps. Returns the number of users updated."""
+        from backend.models import User
+
+        with self._flush_lock:
+            with self._lock:
+                seen, self._seen = self._seen, {}
+            if not seen:
+                return 0
+
+            items = list(seen.items())
+            db = SessionLocal()
+            try:
+                for i in range(0, len(items), FLUSH_CHUNK_SIZE):
+                    chunk = dict(items[i:i + FLUSH_CHUNK_SIZE])
+                    db.execute(
+                        update(User)
+                        .where(User.id.in_(chunk))
+                        .values(last_active=case(chunk, value=User.id))
+                        .execution_options(synchronize_session=False)
+                    )
+                db.commit()
+                return len(items)
+            except Exception as e:
+                db.rollback()
+                print(f"[Activity] Flush of {len(items)} users failed, will retry: {e}")
+                with self._lock:
+                    # Keep newer touches that arrived during the failed flush
+                    for user_id, when in seen.items():
+                        self._seen.setdefault(user_id, when)
+                return 0
+            finally:
+                db.close()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            await loop.run_in_executor(None, self.flush)
+
+    def start(self):
+        """Start the periodic flusher on the running event loop (application startup)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write pending timestamps (application shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+
+tracker = ActivityTracker(ACTIVITY_FLUSH_INTERVAL_SECONDS)
@@ -0,0 +1,128 @@
+"""
+Write-Behind Audit Logging
+
+auth.log_audit queues entries here instead of committing one row per call. A
+background task started in main.lifespan writes the queue with one bulk INSERT
+every AUDIT_FLUSH_INTERVAL_SECONDS, or sooner once AUDIT_BATCH_SIZE entries are
+waiting, and flushes whatever is left on shutdown.
+
+Without a running flusher (CLI scripts, tests without lifespan) or with
+AUDIT_MODE=sync every entry is written immediately, as before.
+
+ConnectionManager.notify_change calls flush_now() before announcing a change, so
+clients that refetch on the notification already see the audit row for it; only
+entries without a notification (logins, failed checks) wait for the interval.
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from .database import SessionLocal
+
+load_dotenv()
+
+AUDIT_MODE = os.getenv("AUDIT_MODE", "buffered")
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 100))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", 2))
+
+# Entries kept while the database is unreachable; the oldest are dropped beyond this
+MAX_PENDING_ENTRIES = 10000
+
+
+class AuditWriter:
+    """Thread-safe queue of audit rows flushed in batches by an asyncio task."""
+
+    def __init__(self, batch_size: int, interval: float):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def buffering(self) -> bool:
+        return AUDIT_MODE != "sync" and self._task is not None
+
+    def enqueue(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._pending.append(entry)
+            dropped = len(self._pending) - MAX_PENDING_ENTRIES
+            if dropped > 0:
+                del self._pending[:dropped]
+                print(f"[Audit] Queue full, dropped {dropped} oldest entries")
+            full = len(self._pending) >= self.batch_size
+
+        if not self.buffering:
+            self.flush()
+        elif full:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def flush(self) -> int:
+        """Write every queued entry with one bulk INSERT. Returns the number written."""
+        from backend.models import AuditLog
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            db = SessionLocal()
+            try:
+                db.bulk_insert_mappings(AuditLog, batch)
+                db.commit()
+                return len(batch)
+            except Exception as e:
+                db.rollback()
+                print(f"[Audit] Flush of {len(batch)} entries failed, will retry: {e}")
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+            finally:
+                db.close()
+
+    async def flush_now(self):
+        """Write queued entries from async code without blocking the event loop."""
+        if not self.buffering:
+            return
+        with self._lock:
+            if not self._pending:
+                return
+        await self._loop.run_in_executor(None, self.flush)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._loop.run_in_executor(None, self.flush)
+
+    def start(self):
+        """Start the periodic flusher on the running event loop (application startup)."""
+        if AUDIT_MODE == "sync" or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write everything still queued (application shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        written = self.flush()
+        if written:
+            print(f"[Audit] Flushed {written} entries on shutdown")
+
+
+writer = AuditWriter(AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL_SECONDS)
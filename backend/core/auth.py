@@ -1,5 +1,11 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Iterator, Optional, List
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -8,6 +14,7 @@ from sqlalchemy.orm import Session
 from .database import get_db
 from backend.models import User
 from backend import schemas
+from . import activity, audit_log, cache
 import os
 from dotenv import load_dotenv
 
@@ -18,6 +25,19 @@ SECRET_KEY = os.getenv("SECRET_KEY", "polda-ntb-secret-key-change-me")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60 * 24)) # 1 day
 
+# Resolved users kept per (username, token) so authenticated requests skip the users query
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+
+# bcrypt costs 100-300 ms of CPU per call, so request handlers run it on a small pool.
+# At most PASSWORD_HASH_WORKERS calls run at once; callers waiting longer than
+# PASSWORD_HASH_WAIT_SECONDS for a slot get 503 instead of piling up behind a login burst.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_WAIT_SECONDS = int(os.getenv("PASSWORD_HASH_WAIT_SECONDS", 10))
+# Bulk user imports hash in separate processes instead
+PASSWORD_HASH_PROCESSES = int(os.getenv("PASSWORD_HASH_PROCESSES", os.cpu_count() or 2))
+BULK_HASH_MIN_PASSWORDS = 16
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/token", auto_error=False)
 
@@ -27,6 +47,107 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots: Optional[asyncio.Semaphore] = None
+
+async def _run_hashing(fn, *args):
+    global _hash_slots
+    if _hash_slots is None:
+        # Created lazily so it belongs to the running event loop
+        _hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+    try:
+        await asyncio.wait_for(_hash_slots.acquire(), PASSWORD_HASH_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_slots.release()
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """verify_password for request handlers: runs on the bounded bcrypt pool, off the event loop."""
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    """get_password_hash for request handlers: runs on the bounded bcrypt pool, off the event loop."""
+    return await _run_hashing(get_password_hash, password)
+
+def hash_passwords(passwords: List[str]) -> Iterator[str]:
+    """
+    Hash many passwords for bulk imports, yielding hashes in input order.
+    Large batches are spread over a process pool; small ones are hashed inline.
+    """
+    workers = min(PASSWORD_HASH_PROCESSES, len(passwords))
+    if workers <= 1 or len(passwords) < BULK_HASH_MIN_PASSWORDS:
+        yield from map(get_password_hash, passwords)
+        return
+    # spawn: forking a multi-threaded server process is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        yield from pool.map(get_password_hash, passwords, chunksize=8)
+
+class UserCache:
+    """
+    TTL/LRU cache of authenticated users keyed by (username, token).
+
+    Entries hold column values, not ORM instances, so each hit gets its own detached User.
+    Entries are dropped by invalidate(username) and whenever the "users" cache version
+    moves (notify_change from another worker); the TTL bounds anything else.
+    """
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (username, token) -> (values, expires_at, version)
+        self._lock = threading.Lock()
+
+    def get(self, username: str, token: str) -> Optional[User]:
+        key = (username, token)
+        version = cache.get_version("users")
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic() or entry[2] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            values = entry[0]
+        return User(**values)
+
+    def put(self, username: str, token: str, user: User, version: int):
+        values = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+        with self._lock:
+            self._entries[(username, token)] = (values, time.monotonic() + self.ttl, version)
+            self._entries.move_to_end((username, token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        """Forget every cached token of `username` (call after the user row changes)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == username]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -58,9 +179,18 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
+    user = user_cache.get(token_data.username, token)
+    if user is not None:
+        activity.tracker.touch(user.id)
+        return user
+
+    # Read the version before querying so a concurrent change is not cached as current
+    version = cache.get_version("users")
     user = db.query(User).filter(User.username == token_data.username).first()
     if user is None:
         raise credentials_exception
+    user_cache.put(token_data.username, token, user, version)
+    activity.tracker.touch(user.id)
     return user
 
 async def get_current_user_from_token(
@@ -97,9 +227,13 @@ async def get_current_admin(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
-def log_audit(db: Session, user_id: int, action: str, category: str, target: str, target_type: str, details: str, status: str = "success", ip_address: str = None, user_agent: str = None):
+def log_audit(db: Session, user_id: int, action: str, category: str, target: str, target_type: str, details: str, status: str = "success", ip_address: str = None, user_agent: str = None, durable: bool = False):
+    """
+    Record an audit entry. Entries are queued and bulk-inserted by the write-behind
+    audit writer; durable=True commits the row on `db` before returning instead.
+    """
     from backend.models import AuditLog
-    db_log = AuditLog(
+    entry = dict(
         user_id=user_id,
         action=action,
         category=category,
@@ -110,6 +244,27 @@ def log_audit(db: Session, user_id: int, action: str, category: str, target: str
         ip_address=ip_address,
         user_agent=user_agent
     )
-    db.add(db_log)
+    # Stamped here in UTC on every path (not by the column default, which follows the
+    # database server's clock) so buffered, direct and bulk rows agree
+    entry["timestamp"] = datetime.utcnow()
+    if not durable and audit_log.writer.buffering:
+        audit_log.writer.enqueue(entry)
+        return
+
+    db.add(AuditLog(**entry))
     db.commit()
 
+def log_audit_bulk(db: Session, entries: List[dict], commit: bool = True):
+    """
+    Insert many audit rows with a single bulk INSERT.
+    Each entry takes the same keys as log_audit (user_id, action, category, target, ...).
+    """
+    from backend.models import AuditLog
+    if not entries:
+        return
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(AuditLog, [
+        {"status": "success", "timestamp": now, **entry} for entry in entries
+    ])
+    if commit:
+        db.commit()
@@ -0,0 +1,159 @@
+"""
+Versioned Cache for Computed Data
+
+Entities (leaves, personnel, users, ...) carry a data version that is bumped
+whenever ConnectionManager.notify_change reports a mutation. Cached results are
+keyed by the versions they depend on, so they are served until something they
+depend on actually changes - no explicit purge is needed.
+
+The default backend is in-process. Set CACHE_URL=redis://host:6379/0 (and install
+`redis`) to share cached values and versions between workers.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_TTL = int(os.getenv("CACHE_TTL_SECONDS", 300))
+
+
+class MemoryCacheBackend:
+    """
+    Thread-safe dict cache with per-key expiry, local to this process.
+    With max_entries=None nothing is evicted before it expires.
+    """
+
+    def __init__(self, max_entries: Optional[int] = 1024):
+        self.max_entries = max_entries
+        self._data = {}
+        self._counters = {}  # Versions live apart from cached values so eviction never resets them
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key not in self._data:
+                if self.max_entries is None:
+                    self._purge_expired()
+                elif len(self._data) >= self.max_entries:
+                    # Drop the oldest entry (dicts keep insertion order)
+                    self._data.pop(next(iter(self._data)))
+            self._data[key] = (value, expires_at)
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        for key in [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at < now]:
+            del self._data[key]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisCacheBackend:
+    """Shared backend for multi-worker deployments. Values are stored as JSON."""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points to Redis but the 'redis' package is not installed")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self._client.set(key, json.dumps(value), ex=ttl)
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+    def counter(self, key: str) -> int:
+        return int(self._client.get(key) or 0)
+
+    def incr(self, key: str) -> int:
+        return int(self._client.incr(key))
+
+
+def _create_backend():
+    url = os.getenv("CACHE_URL", "")
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        print("[Cache] Using Redis backend")
+        return RedisCacheBackend(url)
+    return MemoryCacheBackend()
+
+
+backend = _create_backend()
+
+
+def get_version(entity: str) -> int:
+    return backend.counter(f"version:{entity}")
+
+
+def bump_version(entity: str) -> int:
+    """Mark data for `entity` as changed; every cache entry depending on it becomes stale."""
+    return backend.incr(f"version:{entity}")
+
+
+# Unversioned keys that the writing process patches in place (e.g. facet counts adjusted
+# by a delta). Other workers only learn about the change from the notification bus, so
+# with the in-process backend those keys are dropped there - see apply_remote_change.
+_local_keys: Dict[str, Set[str]] = {}
+
+
+def register_local_key(entity: str, key: str):
+    """Declare that `key` holds data derived from `entity` without a version in its name."""
+    _local_keys.setdefault(entity, set()).add(key)
+
+
+def apply_remote_change(entity: str):
+    """A change to `entity` made by another worker: bump the local version and drop local keys."""
+    bump_version(entity)
+    for key in _local_keys.get(entity, ()):
+        backend.delete(key)
+
+
+def versioned_key(name: str, entities: Iterable[str], *extra) -> str:
+    versions = ",".join(f"{e}={get_version(e)}" for e in entities)
+    suffix = ":".join(str(x) for x in extra)
+    return f"{name}:{versions}:{suffix}"
+
+
+def get_or_compute(name: str, entities: Iterable[str], compute: Callable[[], Any], *extra, ttl: int = DEFAULT_TTL) -> Any:
+    """
+    Return the cached value for `name` at the current versions of `entities`,
+    computing and storing it on a miss. The key is read before computing so a
+    change committed mid-computation can never be cached under the new version.
+    """
+    key = versioned_key(name, entities, *extra)
+    value = backend.get(key)
+    if value is None:
+        value = compute()
+        backend.set(key, value, ttl)
+    return value
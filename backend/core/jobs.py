@@ -0,0 +1,151 @@
+"""
+Background Jobs for Long-Running Imports
+
+A job runs a blocking function in a small worker pool so the request that
+started it can return a job id immediately. Job state lives in the cache
+backend (shared between workers when CACHE_URL points to Redis) and every
+progress update is also pushed as a "job_progress" message to WebSocket clients
+subscribed to "jobs:<job_id>" - only the user who started the job knows the id.
+"""
+import asyncio
+import functools
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+from . import cache
+from .websocket import manager
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", 24 * 3600))
+
+# Minimum seconds between progress broadcasts for one job (state is still stored every time)
+PROGRESS_INTERVAL = 0.5
+
+# Job records must outlive the job: in-process they get their own store that only drops
+# expired entries, instead of the shared LRU cache that may evict a running job
+_store = cache.MemoryCacheBackend(max_entries=None) if isinstance(cache.backend, cache.MemoryCacheBackend) else cache.backend
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_tasks = set()
+
+ProgressCallback = Callable[..., None]
+
+
+def _key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return _store.get(_key(job_id))
+
+
+def _save(job: Dict[str, Any]):
+    _store.set(_key(job["id"]), job, JOB_TTL_SECONDS)
+
+
+async def _publish(job: Dict[str, Any]):
+    # Only to explicit subscribers of this job, never to clients receiving everything
+    await manager.broadcast({
+        "type": "job_progress",
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "timestamp": datetime.now().isoformat()
+    }, topics=[f"jobs:{job['id']}"], exclusive=True)
+
+
+async def start_job(
+    kind: str,
+    username: str,
+    work: Callable[[ProgressCallback], Dict[str, Any]],
+    on_complete: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    cleanup: Optional[Callable[[], None]] = None
+) -> Dict[str, Any]:
+    """
+    Queue `work(progress)` on the worker pool and return the new job record.
+
+    `work` runs in a worker thread; it reports counters with progress(parsed=..., added=...)
+    and returns the final result (stored on the job). `on_complete(result)` runs back on
+    the event loop afterwards, e.g. for audit logging and change notifications; its errors
+    are logged but do not fail the job. `cleanup()` runs when the job is cancelled before
+    it started (shutdown), e.g. to delete the uploaded file `work` would have removed.
+    """
+    loop = asyncio.get_running_loop()
+    job = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "username": username,
+        "status": "queued",
+        "progress": {},
+        "result": None,
+        "error": None,
+        "created_at": datetime.now().isoformat(),
+        "finished_at": None
+    }
+    _save(job)
+
+    last_publish = [0.0]
+
+    def progress(**counters):
+        job["status"] = "running"
+        job["progress"] = {**job["progress"], **counters}
+        _save(job)
+        now = time.monotonic()
+        if now - last_publish[0] >= PROGRESS_INTERVAL:
+            last_publish[0] = now
+            asyncio.run_coroutine_threadsafe(_publish(dict(job)), loop)
+
+    async def run():
+        try:
+            result = await loop.run_in_executor(_executor, work, progress)
+        except asyncio.CancelledError:
+            job["status"] = "failed"
+            job["error"] = "Cancelled because the server shut down"
+            job["finished_at"] = datetime.now().isoformat()
+            _save(job)
+            if cleanup:
+                try:
+                    cleanup()
+                except Exception as e:
+                    print(f"[Jobs] Cleanup of cancelled {kind} job {job['id']} failed: {e}")
+            raise
+        except Exception as e:
+            print(f"[Jobs] {kind} job {job['id']} failed: {e}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        else:
+            job["status"] = "completed"
+            job["result"] = result
+        job["finished_at"] = datetime.now().isoformat()
+        _save(job)
+
+        if job["status"] == "completed" and on_complete:
+            # The work is committed at this point: a failing follow-up must not report it as failed
+            try:
+                await on_complete(result)
+            except Exception as e:
+                print(f"[Jobs] on_complete of {kind} job {job['id']} failed: {e}")
+        await _publish(job)
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+async def shutdown():
+    """
+    Wait for running jobs and cancel queued ones (application shutdown). The pool is
+    joined in a thread so the event loop keeps serving the jobs' completion callbacks.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, functools.partial(_executor.shutdown, wait=True, cancel_futures=True))
+    if _tasks:
+        await asyncio.gather(*list(_tasks), return_exceptions=True)
@@ -0,0 +1,83 @@
+"""
+Schema Upgrades for Existing Databases
+
+Base.metadata.create_all only creates missing tables; it never touches tables that
+already exist. upgrade_schema() brings a deployed database up to the current models:
+it creates new tables, adds missing nullable columns with ALTER TABLE and creates
+indexes declared on tables that already existed. It is
+idempotent and runs on application startup and from `manage init` / `manage rebuild`.
+
+backfill_derived() then fills derived tables that are still empty although their
+source rows exist (a database that predates them), so they never silently read as
+zero - quota checks against an empty ledger, searches against an empty index.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from .database import Base, SessionLocal
+
+
+def _add_missing_columns(engine: Engine) -> list:
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _create_missing_indexes(engine: Engine) -> list:
+    inspector = inspect(engine)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine, checkfirst=True)
+                created.append(index.name)
+    return created
+
+
+def upgrade_schema(engine: Engine):
+    """Create missing tables, columns and indexes. Safe to run repeatedly."""
+    from backend import models  # noqa: F401 - registers every table on Base.metadata
+    Base.metadata.create_all(bind=engine)
+    for name in _add_missing_columns(engine):
+        print(f"[Migrations] Added column {name}")
+    for name in _create_missing_indexes(engine):
+        print(f"[Migrations] Created index {name}")
+
+
+def backfill_derived():
+    """Build derived tables that are empty on a database with existing personnel or leave history."""
+    from backend import models
+    from backend.utils import balance_utils, rollup_utils, search_utils
+
+    db = SessionLocal()
+    try:
+        if db.query(models.Personnel.id).first() is not None and db.query(models.PersonnelSearchGram.id).first() is None:
+            count = search_utils.rebuild_search_index(db)
+            print(f"[Migrations] Backfilled personnel search index ({count} personnel)")
+        if db.query(models.LeaveHistory.id).first() is None:
+            return
+        if db.query(models.LeaveBalance.id).first() is None:
+            count = balance_utils.rebuild_balances(db)
+            print(f"[Migrations] Backfilled leave balance ledger ({count} rows)")
+        if db.query(models.LeaveDailyRollup.id).first() is None:
+            count = rollup_utils.rebuild_rollups(db)
+            print(f"[Migrations] Backfilled leave rollups ({count} rows)")
+    except Exception as e:
+        db.rollback()
+        print(f"[Migrations] ERROR: backfill failed, run `manage rebuild`: {e}")
+    finally:
+        db.close()
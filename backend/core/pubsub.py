@@ -0,0 +1,188 @@
+"""
+Pub/Sub Transport for Cross-Worker Notifications
+
+ConnectionManager delivers every broadcast to its own clients and publishes it
+here so the other workers can deliver it to theirs. A backend only moves JSON
+envelopes between processes; topic routing stays in the manager.
+
+WS_BUS_URL selects the backend:
+- empty (default): in-process only, for a single uvicorn worker
+- sqlite:///path/to/bus.db: a small SQLite table shared by all workers on one host,
+  polled every WS_BUS_POLL_MS
+- redis://host:6379/0: Redis pub/sub (requires the `redis` package)
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WS_BUS_POLL_MS = int(os.getenv("WS_BUS_POLL_MS", 100))
+WS_BUS_RETENTION_SECONDS = int(os.getenv("WS_BUS_RETENTION_SECONDS", 60))
+
+REDIS_CHANNEL = "ws:notifications"
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class PubSubBackend:
+    """
+    Interface of a transport. start() begins calling `handler` with every envelope
+    published by any worker (the caller skips its own), publish() sends one, and
+    stop() ends the subscription.
+    """
+
+    async def start(self, handler: Handler):
+        pass
+
+    async def publish(self, envelope: Dict[str, Any]):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class LocalPubSub(PubSubBackend):
+    """Single process: the manager already delivered locally, nothing to forward."""
+
+
+class SqlitePubSub(PubSubBackend):
+    """
+    Envelopes are appended to a table in a shared SQLite file. Each worker polls for
+    rows newer than the last one it saw; rows older than WS_BUS_RETENTION_SECONDS
+    are pruned.
+    """
+
+    def __init__(self, path: str, poll_interval: float, retention: int):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._last_prune = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ws_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._conn = conn
+        # Only deliver events published from now on
+        self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM ws_events").fetchone()[0]
+
+    def _insert(self, payload: str):
+        with self._lock:
+            self._conn.execute("INSERT INTO ws_events (created, payload) VALUES (?, ?)", (time.time(), payload))
+
+    def _fetch(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM ws_events WHERE id > ? ORDER BY id", (self._last_id,)
+            ).fetchall()
+            if rows:
+                self._last_id = rows[-1][0]
+            now = time.time()
+            if now - self._last_prune >= self.retention:
+                self._last_prune = now
+                self._conn.execute("DELETE FROM ws_events WHERE created < ?", (now - self.retention,))
+        return [payload for _, payload in rows]
+
+    async def start(self, handler: Handler):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._open)
+        self._task = asyncio.create_task(self._run(handler))
+        print(f"[PubSub] Using SQLite bus at {self.path}")
+
+    async def _run(self, handler: Handler):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                payloads = await loop.run_in_executor(None, self._fetch)
+            except sqlite3.Error as e:
+                print(f"[PubSub] Poll failed: {e}")
+                continue
+            for payload in payloads:
+                await handler(json.loads(payload))
+
+    async def publish(self, envelope: Dict[str, Any]):
+        if self._conn is None:
+            return
+        payload = json.dumps(envelope, separators=(",", ":"), default=str)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._insert, payload)
+        except sqlite3.Error as e:
+            print(f"[PubSub] Publish failed: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RedisPubSub(PubSubBackend):
+    """Shared Redis channel for deployments spanning several hosts."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("WS_BUS_URL points to Redis but the 'redis' package is not installed")
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(REDIS_CHANNEL)
+        self._task = asyncio.create_task(self._run(handler))
+        print("[PubSub] Using Redis bus")
+
+    async def _run(self, handler: Handler):
+        async for item in self._pubsub.listen():
+            if item.get("type") == "message":
+                await handler(json.loads(item["data"]))
+
+    async def publish(self, envelope: Dict[str, Any]):
+        try:
+            await self._client.publish(REDIS_CHANNEL, json.dumps(envelope, separators=(",", ":"), default=str))
+        except Exception as e:
+            print(f"[PubSub] Publish failed: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        await self._client.close()
+
+
+def create_backend() -> PubSubBackend:
+    url = os.getenv("WS_BUS_URL", "")
+    if url.startswith("sqlite:///"):
+        return SqlitePubSub(url[len("sqlite:///"):], WS_BUS_POLL_MS / 1000, WS_BUS_RETENTION_SECONDS)
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisPubSub(url)
+    return LocalPubSub()
@@ -3,45 +3,263 @@ WebSocket Connection Manager for Real-Time Notifications
 
 Handles multiple WebSocket connections and broadcasts notifications
 to all connected clients when database changes occur.
+
+Every connection has its own bounded outbound queue drained by a writer task,
+so a broadcast only serializes the message once and enqueues it - a slow client
+never delays the request that made the change or the other clients. A client
+whose queue overflows is marked lagging: its backlog is replaced by a single
+"resync" message telling it to refetch. Overflowing again before it caught up
+closes the connection.
+
+Clients receive every message until they subscribe. After sending
+{"type": "subscribe", "topics": [...]} they only get data changes for those topics;
+{"type": "unsubscribe", "topics": [...]} removes topics again. A topic is an entity
+("leaves"), one record of it ("personnel:12"), or "*" for everything. Import progress
+is exclusive to "jobs:<job_id>": it only reaches clients subscribed to that exact
+topic, never clients receiving everything. Each request is acknowledged with
+{"type": "subscribed", "topics": [...]} listing the client's current topics.
+
+Bursts of data changes are coalesced per entity: the first change is sent at once,
+further changes within WS_COALESCE_WINDOW_MS are merged into one data_change message
+with "batch": true, "count", "entity_ids" and "changes" ([{action, entity_id}]);
+its "action" is "mixed" when the batch combines different actions.
+
+With several uvicorn workers each one only holds its own sockets, so every broadcast
+is also published on the bus chosen by WS_BUS_URL (see pubsub.py) and the other
+workers deliver it to their clients. Call start()/stop() from the app lifespan.
 """
 from fastapi import WebSocket
-from typing import List, Dict, Any
+from typing import Dict, Any, Iterable, List, Optional, Set
+from collections import defaultdict
+import asyncio
 import json
+import os
+import uuid
 from datetime import datetime
+from dotenv import load_dotenv
+from . import audit_log, cache, pubsub
+
+load_dotenv()
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 100))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", 10))
+WS_COALESCE_WINDOW_MS = int(os.getenv("WS_COALESCE_WINDOW_MS", 500))
+
+# Close code for clients dropped because they could not keep up ("Try Again Later")
+LAGGING_CLOSE_CODE = 1013
+
+# Limits on the subscription protocol
+MAX_TOPICS_PER_CLIENT = 200
+MAX_TOPIC_LENGTH = 64
+
+
+def _serialize(message: Dict[str, Any]) -> str:
+    # Same encoding as WebSocket.send_json
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class ClientConnection:
+    """One WebSocket with its outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.lagging = False
+        self.writer: asyncio.Task = None
+        self.topics: Optional[Set[str]] = None  # None until the client subscribes: receives everything
+
+    def offer(self, text: str) -> bool:
+        """
+        Enqueue a serialized message without waiting.
+        Returns False when the client is lagging for the second time and should be dropped.
+        """
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.lagging:
+            return False
+
+        # Replace the backlog with one resync marker; the client refetches instead
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_serialize({"type": "resync", "timestamp": datetime.now().isoformat()}))
+        self.lagging = True
+        print("[WS] Client lagging, backlog replaced with resync")
+        return True
+
+    async def run_writer(self, on_failure):
+        try:
+            while True:
+                text = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(text), WS_SEND_TIMEOUT_SECONDS)
+                if self.lagging and self.queue.empty():
+                    self.lagging = False
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Close the socket too, otherwise the client keeps heartbeating and never reconnects
+            print(f"[WS] Error sending to client: {e!r}")
+            on_failure(self.websocket, LAGGING_CLOSE_CODE)
 
 
 class ConnectionManager:
     """Manages WebSocket connections and broadcasts notifications."""
-    
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.topic_index: Dict[str, Set[WebSocket]] = defaultdict(set)
+        self.unfiltered: Set[WebSocket] = set()  # Clients that never subscribed
+        self.coalesce_window = WS_COALESCE_WINDOW_MS / 1000
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}  # entity -> changes held in its open window
+        self._windows: Dict[str, asyncio.Task] = {}
+        self.origin = uuid.uuid4().hex  # Identifies this worker's envelopes on the bus
+        self.bus = pubsub.create_backend()
+        self._bus_started = False
+
+    async def start(self):
+        """Subscribe to broadcasts from other workers (application startup)."""
+        if not self._bus_started:
+            await self.bus.start(self._on_bus_message)
+            self._bus_started = True
+
+    async def stop(self):
+        """Stop the subscription and flush coalesced changes still held (application shutdown)."""
+        for task in list(self._windows.values()):
+            task.cancel()
+        for entity in list(self._pending):
+            await self._send_changes(entity, self._pending.pop(entity))
+        if self._bus_started:
+            await self.bus.stop()
+            self._bus_started = False
+
     async def connect(self, websocket: WebSocket):
         """Accept and register a new WebSocket connection."""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket)
+        client.writer = asyncio.create_task(client.run_writer(self.disconnect))
+        self.active_connections[websocket] = client
+        self.unfiltered.add(websocket)
         print(f"[WS] Client connected. Total connections: {len(self.active_connections)}")
-    
-    def disconnect(self, websocket: WebSocket):
-        """Remove a WebSocket connection."""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+
+    def disconnect(self, websocket: WebSocket, code: int = None):
+        """Remove a WebSocket connection and stop its writer (optionally closing the socket)."""
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        self.unfiltered.discard(websocket)
+        self._unindex(websocket, client.topics or ())
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        if code is not None:
+            asyncio.create_task(self._close(websocket, code))
         print(f"[WS] Client disconnected. Total connections: {len(self.active_connections)}")
-    
-    async def broadcast(self, message: Dict[str, Any]):
-        """Send a message to all connected clients."""
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"[WS] Error sending to client: {e}")
-                disconnected.append(connection)
-        
-        # Clean up disconnected clients
-        for conn in disconnected:
-            self.disconnect(conn)
-    
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _unindex(self, websocket: WebSocket, topics: Iterable[str]):
+        for topic in topics:
+            sockets = self.topic_index.get(topic)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.topic_index[topic]
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return
+        if client.topics is None:
+            client.topics = set()
+            self.unfiltered.discard(websocket)
+        for topic in topics:
+            if len(client.topics) >= MAX_TOPICS_PER_CLIENT:
+                break
+            client.topics.add(topic)
+            self.topic_index[topic].add(websocket)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        client = self.active_connections.get(websocket)
+        if client is None or client.topics is None:
+            return
+        topics = set(topics) & client.topics
+        client.topics -= topics
+        self._unindex(websocket, topics)
+
+    def handle_message(self, websocket: WebSocket, text: str):
+        """Apply a subscribe/unsubscribe request from a client; anything else (heartbeats) is ignored."""
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(data, dict) or data.get("type") not in ("subscribe", "unsubscribe"):
+            return
+        topics = data.get("topics")
+        if not isinstance(topics, list):
+            return
+        topics = [t for t in topics if isinstance(t, str) and 0 < len(t) <= MAX_TOPIC_LENGTH]
+
+        if data["type"] == "subscribe":
+            self.subscribe(websocket, topics)
+        else:
+            self.unsubscribe(websocket, topics)
+
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            client.offer(_serialize({"type": "subscribed", "topics": sorted(client.topics or [])}))
+
+    def _recipients(self, topics: Optional[List[str]], exclusive: bool = False) -> List[ClientConnection]:
+        if topics is None:
+            return list(self.active_connections.values())
+        if exclusive:
+            sockets = set()
+        else:
+            sockets = set(self.unfiltered)
+            topics = topics + ["*"]
+        for topic in topics:
+            sockets |= self.topic_index.get(topic, set())
+        return [self.active_connections[websocket] for websocket in sockets if websocket in self.active_connections]
+
+    async def broadcast(self, message: Dict[str, Any], topics: Optional[List[str]] = None, exclusive: bool = False):
+        """
+        Queue a message for connected clients of every worker (serialized once, never waits on a client).
+        With `topics`, only clients subscribed to one of them (or not subscribed at all) get it;
+        with `exclusive` as well, only clients that subscribed to one of those exact topics.
+        """
+        self._deliver(message, topics, exclusive)
+        if self._bus_started:
+            await self.bus.publish({"origin": self.origin, "message": message, "topics": topics, "exclusive": exclusive})
+
+    async def _on_bus_message(self, envelope: Dict[str, Any]):
+        if envelope.get("origin") == self.origin:
+            return
+        try:
+            message = envelope["message"]
+            if message.get("type") == "data_change" and isinstance(cache.backend, cache.MemoryCacheBackend):
+                # Versions and patched keys are per process without a shared cache: invalidate here too
+                cache.apply_remote_change(message["entity"])
+            self._deliver(message, envelope.get("topics"), bool(envelope.get("exclusive")))
+        except Exception as e:
+            print(f"[WS] Ignoring malformed bus message: {e}")
+
+    def _deliver(self, message: Dict[str, Any], topics: Optional[List[str]], exclusive: bool = False):
+        """Queue a message for this worker's clients only."""
+        text = _serialize(message)
+        lagging = [
+            client.websocket for client in self._recipients(topics, exclusive)
+            if not client.offer(text)
+        ]
+
+        # Drop clients that overflowed twice
+        for websocket in lagging:
+            print("[WS] Dropping client that cannot keep up")
+            self.disconnect(websocket, code=LAGGING_CLOSE_CODE)
+
     async def notify_change(
         self,
         entity: str,
@@ -52,7 +270,7 @@ class ConnectionManager:
     ):
         """
         Broadcast a data change notification.
-        
+
         Args:
             entity: The entity type that changed (leaves, personnel, users, etc.)
             action: The action performed (create, update, delete)
@@ -60,6 +278,12 @@ class ConnectionManager:
             entity_id: Optional ID of the affected entity
             details: Optional additional details about the change
         """
+        # Invalidate cached results that depend on this entity
+        cache.bump_version(entity)
+
+        # Clients refetch on this message: make the change's audit row visible first
+        await audit_log.writer.flush_now()
+
         message = {
             "type": "data_change",
             "entity": entity,
@@ -69,9 +293,56 @@ class ConnectionManager:
             "details": details,
             "timestamp": datetime.now().isoformat()
         }
-        await self.broadcast(message)
         print(f"[WS] Notified: {username} {action}d {entity}" + (f" #{entity_id}" if entity_id else ""))
 
+        if self.coalesce_window <= 0:
+            await self._send_changes(entity, [message])
+        elif entity in self._windows:
+            # A change went out recently: hold this one for the batch at the end of the window
+            self._pending.setdefault(entity, []).append(message)
+        else:
+            await self._send_changes(entity, [message])
+            self._windows[entity] = asyncio.create_task(self._run_window(entity))
+
+    async def _run_window(self, entity: str):
+        """Send what accumulated during each window; close once a window passes without changes."""
+        try:
+            while True:
+                await asyncio.sleep(self.coalesce_window)
+                changes = self._pending.pop(entity, None)
+                if not changes:
+                    break
+                await self._send_changes(entity, changes)
+        finally:
+            self._windows.pop(entity, None)
+
+    async def _send_changes(self, entity: str, changes: List[Dict[str, Any]]):
+        if len(changes) == 1:
+            message = changes[0]
+        else:
+            message = self._merge_changes(entity, changes)
+        entity_ids = message.get("entity_ids") or ([message["entity_id"]] if message["entity_id"] is not None else [])
+        topics = [entity] + [f"{entity}:{entity_id}" for entity_id in entity_ids]
+        await self.broadcast(message, topics)
+
+    def _merge_changes(self, entity: str, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        actions = list(dict.fromkeys(c["action"] for c in changes))
+        usernames = list(dict.fromkeys(c["username"] for c in changes if c["username"]))
+        entity_ids = list(dict.fromkeys(c["entity_id"] for c in changes if c["entity_id"] is not None))
+        return {
+            "type": "data_change",
+            "entity": entity,
+            "action": actions[0] if len(actions) == 1 else "mixed",
+            "username": ", ".join(usernames),
+            "entity_id": entity_ids[0] if len(entity_ids) == 1 else None,
+            "details": f"{len(changes)} changes",
+            "timestamp": changes[-1]["timestamp"],
+            "batch": True,
+            "count": len(changes),
+            "entity_ids": entity_ids,
+            "changes": [{"action": c["action"], "entity_id": c["entity_id"]} for c in changes]
+        }
+
 
 # Singleton instance
 manager = ConnectionManager()
@@ -7,8 +7,10 @@ import asyncio
 from datetime import datetime, timedelta
 
 from .core.websocket import manager
-from .core.database import SessionLocal
+from .core import activity, audit_log, jobs, migrations
+from .core.database import SessionLocal, engine
 from .models import AuditLog
+from .utils import calendar_utils
 
 # Background task for cleaning up old audit logs (older than 1 year)
 async def cleanup_old_audit_logs():
@@ -28,6 +30,18 @@ async def cleanup_old_audit_logs():
                 db.close()
         except Exception as e:
             print(f"[Audit Cleanup] Error during cleanup: {e}")
+
+        # The calendar change feed only needs recent history
+        try:
+            db = SessionLocal()
+            try:
+                deleted_count = calendar_utils.prune_changes(db)
+                if deleted_count > 0:
+                    print(f"[Calendar Cleanup] Deleted {deleted_count} leave change rows older than {calendar_utils.CHANGE_RETENTION_DAYS} days")
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"[Calendar Cleanup] Error during cleanup: {e}")
         
         # Wait 24 hours before next cleanup
         await asyncio.sleep(24 * 60 * 60)
@@ -35,9 +49,16 @@ async def cleanup_old_audit_logs():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager - handles startup and shutdown tasks."""
+    # Bring an existing database up to the current models (new tables and columns)
+    migrations.upgrade_schema(engine)
+    migrations.backfill_derived()
+
     # Start background task for audit log cleanup
     cleanup_task = asyncio.create_task(cleanup_old_audit_logs())
     print("[Startup] Audit log cleanup task started")
+    audit_log.writer.start()
+    activity.tracker.start()
+    await manager.start()
     
     yield
     
@@ -47,6 +68,16 @@ async def lifespan(app: FastAPI):
         await cleanup_task
     except asyncio.CancelledError:
         print("[Shutdown] Audit log cleanup task stopped")
+    
+    # Let running import jobs finish
+    await jobs.shutdown()
+
+    # Write audit entries and last-seen times still queued
+    await audit_log.writer.stop()
+    await activity.tracker.stop()
+
+    # Send held notifications and leave the cross-worker bus
+    await manager.stop()
 
 app = FastAPI(
     title="Sistem Monitoring Izin Personel Polda NTB",
@@ -60,9 +91,14 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # Keep connection alive, receive any client messages (heartbeat)
-            await websocket.receive_text()
+            # Heartbeats keep the connection alive; subscribe/unsubscribe requests select topics
+            manager.handle_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    except RuntimeError:
+        # The socket was closed by the server (e.g. dropped for lagging)
+        pass
+    finally:
         manager.disconnect(websocket)
 
 from dotenv import load_dotenv
@@ -88,7 +124,7 @@ os.makedirs("uploads/evidence", exist_ok=True)
 # Mount static files
 app.mount("/api/static", StaticFiles(directory="uploads"), name="static")
 
-from .routers import auth, personnel, leaves, dashboard, reports, audit, users, leave_types, holidays
+from .routers import auth, personnel, leaves, dashboard, reports, audit, users, leave_types, holidays, jobs as jobs_router
 
 app.include_router(auth.router)
 app.include_router(personnel.router)
@@ -99,6 +135,7 @@ app.include_router(reports.router)
 app.include_router(audit.router)
 app.include_router(users.router)
 app.include_router(holidays.router)
+app.include_router(jobs_router.router)
 
 @app.get("/")
 def read_root():
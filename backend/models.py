@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Enum, Date, DateTime, Text
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Enum, Date, DateTime, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -52,7 +52,7 @@ class Personnel(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     nrp = Column(String(20), unique=True, index=True)
-    nama = Column(String(100))
+    nama = Column(String(100), index=True)
     pangkat = Column(String(50))
     jabatan = Column(String(100))
     bag = Column(String(100), nullable=True)
@@ -61,26 +61,93 @@ class Personnel(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     leaves = relationship("LeaveHistory", back_populates="personnel", cascade="all, delete-orphan")
+    leave_balances = relationship("LeaveBalance", cascade="all, delete-orphan")
+    search_grams = relationship("PersonnelSearchGram", cascade="all, delete-orphan")
+    leave_rollups = relationship("LeavePersonnelRollup", cascade="all, delete-orphan")
+
+class PersonnelSearchGram(Base):
+    """Trigram side table for indexed substring search on personnel nama/nrp/jabatan"""
+    __tablename__ = "personnel_search_grams"
+    __table_args__ = (
+        Index("ix_search_gram_lookup", "gram", "field", "personnel_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    personnel_id = Column(Integer, ForeignKey("personnel.id"), nullable=False, index=True)
+    field = Column(String(20), nullable=False)  # "nama", "nrp" or "jabatan"
+    gram = Column(String(3), nullable=False)
 
 class LeaveHistory(Base):
     __tablename__ = "leave_history"
+    __table_args__ = (
+        Index("ix_leave_history_dates", "tanggal_mulai", "tanggal_selesai"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     personnel_id = Column(Integer, ForeignKey("personnel.id"))
     leave_type_id = Column(Integer, ForeignKey("leave_types.id"))
     jumlah_hari = Column(Integer)
     tanggal_mulai = Column(Date)
-    tanggal_selesai = Column(Date, nullable=True)
+    tanggal_selesai = Column(Date, nullable=True)  # Always persisted; defaults to tanggal_mulai + jumlah_hari - 1
     alasan = Column(Text)
     file_path = Column(String(255), nullable=True)
+    file_sha256 = Column(String(64), nullable=True)  # SHA-256 of the stored evidence file
     balance_remaining = Column(Integer, nullable=True) # Snapshot of balance after this leave
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     created_by = Column(Integer, ForeignKey("users.id"))
 
     personnel = relationship("Personnel", back_populates="leaves")
     leave_type = relationship("LeaveType")
     creator = relationship("User")
 
+class LeaveBalance(Base):
+    """Materialized leave usage per (personnel, leave type, year), maintained on leave writes"""
+    __tablename__ = "leave_balances"
+    __table_args__ = (
+        UniqueConstraint("personnel_id", "leave_type_id", "year", name="uq_leave_balance_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    personnel_id = Column(Integer, ForeignKey("personnel.id"), nullable=False, index=True)
+    leave_type_id = Column(Integer, ForeignKey("leave_types.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    used_days = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class LeaveDailyRollup(Base):
+    """Leave count and days per start day and leave type, maintained on leave writes"""
+    __tablename__ = "leave_daily_rollup"
+    __table_args__ = (
+        UniqueConstraint("day", "leave_type_id", name="uq_leave_daily_rollup_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False, index=True)
+    leave_type_id = Column(Integer, ForeignKey("leave_types.id"), nullable=False)
+    leave_count = Column(Integer, nullable=False, default=0)
+    total_days = Column(Integer, nullable=False, default=0)
+
+class LeavePersonnelRollup(Base):
+    """All-time leave count and days per personnel and leave type, maintained on leave writes"""
+    __tablename__ = "leave_personnel_rollup"
+    __table_args__ = (
+        UniqueConstraint("personnel_id", "leave_type_id", name="uq_leave_personnel_rollup_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    personnel_id = Column(Integer, ForeignKey("personnel.id"), nullable=False, index=True)
+    leave_type_id = Column(Integer, ForeignKey("leave_types.id"), nullable=False)
+    leave_count = Column(Integer, nullable=False, default=0)
+    total_days = Column(Integer, nullable=False, default=0)
+
+class LeaveChange(Base):
+    """Append-only feed of leave ids touched by writes; the latest id is the calendar version token"""
+    __tablename__ = "leave_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    leave_id = Column(Integer, nullable=True, index=True)  # No FK: deleted leaves stay listed. NULL = full refresh
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
 
@@ -94,6 +161,6 @@ class AuditLog(Base):
     ip_address = Column(String(45))
     user_agent = Column(String(255))
     status = Column(String(20))
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     user = relationship("User")
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from backend.core import database, auth
 from backend import models, schemas
+from backend.utils import pagination_utils
 import io
 import pandas as pd
 
@@ -104,6 +105,8 @@ async def get_audit_logs(
     end_date: Optional[str] = None,
     sort_by: str = "timestamp",
     sort_order: str = "desc",
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
@@ -143,32 +146,25 @@ async def get_audit_logs(
     if role and role != 'all':
         query = query.filter(models.User.role == role)
         
-    # Get total count before pagination
-    total = query.count()
-    response.headers["X-Total-Count"] = str(total)
+    # Get total count before pagination (optional - skipping it saves a full scan on deep pages)
+    if include_total:
+        total = query.count()
+        response.headers["X-Total-Count"] = str(total)
 
     # Sort
-    if sort_by:
-        # Validate sort field to prevent injection (basic check)
-        valid_sort_fields = {
-            "timestamp": models.AuditLog.timestamp,
-            "user": models.User.username,
-            "action": models.AuditLog.action,
-            "category": models.AuditLog.category,
-            "target": models.AuditLog.target,
-            "status": models.AuditLog.status,
-            "ip_address": models.AuditLog.ip_address
-        }
-        
-        sort_column = valid_sort_fields.get(sort_by, models.AuditLog.timestamp)
-        
-        if sort_order == "asc":
-            query = query.order_by(sort_column.asc())
-        else:
-            query = query.order_by(sort_column.desc())
-    else:
-        # Default
-        query = query.order_by(models.AuditLog.timestamp.desc())
+    # Validate sort field to prevent injection (basic check)
+    valid_sort_fields = {
+        "timestamp": models.AuditLog.timestamp,
+        "user": models.User.username,
+        "action": models.AuditLog.action,
+        "category": models.AuditLog.category,
+        "target": models.AuditLog.target,
+        "status": models.AuditLog.status,
+        "ip_address": models.AuditLog.ip_address
+    }
+    sort_column = valid_sort_fields.get(sort_by, models.AuditLog.timestamp)
     
-    return query.offset(skip).limit(limit).all()
-
+    return pagination_utils.paginate(
+        query, response, sort_column, models.AuditLog.id,
+        descending=sort_order != "asc", skip=skip, limit=limit, cursor=cursor
+    )
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from datetime import timedelta, datetime
-from backend.core import database, auth
+from datetime import timedelta
+from backend.core import database, auth, activity
 from backend import models, schemas
 
 router = APIRouter(
@@ -17,7 +17,7 @@ async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequ
     user_agent = request.headers.get("user-agent")
 
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.password_hash):
+    if not user or not await auth.verify_password_async(form_data.password, user.password_hash):
         # Log failed attempt
         try:
             auth.log_audit(
@@ -41,15 +41,8 @@ async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequ
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Update last_active
-    try:
-        user.last_active = datetime.now()
-        db.commit()
-        db.refresh(user)
-    except Exception as e:
-        print(f"Error updating last_active: {e}")
-        # Build token anyway even if last_active fails
-        pass
+    # Update last_active (written in bulk by the activity tracker)
+    activity.tracker.touch(user.id)
 
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
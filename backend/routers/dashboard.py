@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, text
 from datetime import date, timedelta
-from typing import List
-from backend.core import database, auth
+from typing import List, Optional
+from backend.core import database, auth, cache
 from backend import models, schemas
+from backend.utils import leave_utils, calendar_utils
 from datetime import datetime
 
 router = APIRouter(
@@ -12,43 +14,87 @@ router = APIRouter(
     tags=["Dashboard"]
 )
 
+# Entities whose changes (via manager.notify_change) invalidate the cached stats
+DASHBOARD_DEPENDENCIES = ("leaves", "personnel", "leave_types")
+
+# Widest range served by the calendar feed in one request
+MAX_CALENDAR_WINDOW_DAYS = 366
+
 @router.get("/stats", response_model=schemas.DashboardStats)
 async def get_dashboard_stats(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     today = date.today()
-    cutoff = today - timedelta(days=90)
-    recent_leaves = db.query(models.LeaveHistory).filter(models.LeaveHistory.tanggal_mulai >= cutoff).all()
     
-    active_count = 0
-    for leave in recent_leaves:
-        start = leave.tanggal_mulai
-        end = start + timedelta(days=leave.jumlah_hari - 1)
-        if start <= today <= end:
-            active_count += 1
-            
-    # Top 10 Personnel with most leaves
-    top_frequent_query = db.query(
-        models.LeaveHistory.personnel_id,
-        func.count(models.LeaveHistory.id).label('count')
-    ).group_by(models.LeaveHistory.personnel_id).order_by(desc('count')).limit(10).all()
+    # Aggregates are cached per data version (and per day, since "today" counts depend on it)
+    stats = cache.get_or_compute(
+        "dashboard_stats",
+        DASHBOARD_DEPENDENCIES,
+        lambda: jsonable_encoder(compute_dashboard_stats(db, today)),
+        today.isoformat()
+    )
     
-    top_frequent = []
-    for pid, count in top_frequent_query:
-        personnel = db.query(models.Personnel).filter(models.Personnel.id == pid).first()
-        if personnel:
-            top_frequent.append({
-                "nrp": personnel.nrp,
-                "nama": personnel.nama,
-                "count": count
-            })
-
-    # Recent Activity (Top 5) - from Audit Logs for all entity types
+    # Recent Activity (Top 5) - from Audit Logs for all entity types.
+    # Kept out of the cache: logins write audit rows without a data change notification.
     from sqlalchemy.orm import joinedload
     recent_activity = db.query(models.AuditLog)\
         .options(joinedload(models.AuditLog.user))\
         .order_by(models.AuditLog.timestamp.desc()).limit(5).all()
     
+    return {**stats, "recent_activity": recent_activity}
+
+@router.get("/calendar", response_model=schemas.CalendarFeed)
+async def get_calendar_feed(
+    start_date: date = Query(None),
+    end_date: date = Query(None),
+    since: Optional[str] = Query(None, description="Version token from a previous response; only changes after it are returned"),
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    """Leaves overlapping a date range (defaults to the current month)"""
+    today = date.today()
+    start_date = start_date or today.replace(day=1)
+    end_date = end_date or (start_date.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end_date - start_date).days > MAX_CALENDAR_WINDOW_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_CALENDAR_WINDOW_DAYS} days")
+    
+    return calendar_utils.get_feed(db, start_date, end_date, calendar_utils.parse_version(since))
+
+def compute_dashboard_stats(db: Session, today: date) -> dict:
+    """Compute every dashboard aggregate except recent activity."""
+    cutoff = today - timedelta(days=90)
+    
+    # Leaves covering today, counted in the database
+    active_count = db.query(func.count(models.LeaveHistory.id))\
+        .filter(leave_utils.active_on(today)).scalar() or 0
+            
+    # Per-personnel and per-type aggregates come from the rollup tables
+    # (maintained on every leave write) instead of scanning leave_history.
+    PersonnelRollup = models.LeavePersonnelRollup
+    DailyRollup = models.LeaveDailyRollup
+
+    # Top 10 Personnel with most leaves
+    top_frequent_query = db.query(
+        models.Personnel.nrp,
+        models.Personnel.nama,
+        func.sum(PersonnelRollup.leave_count).label('count')
+    ).join(PersonnelRollup, models.Personnel.id == PersonnelRollup.personnel_id)\
+     .group_by(models.Personnel.id, models.Personnel.nrp, models.Personnel.nama)\
+     .having(func.sum(PersonnelRollup.leave_count) > 0)\
+     .order_by(desc('count')).limit(10).all()
+    
+    top_frequent = [
+        {"nrp": nrp, "nama": nama, "count": int(count)}
+        for nrp, nama, count in top_frequent_query
+    ]
+
     # Statistics Counts
-    total_leaves = db.query(models.LeaveHistory).count()
+    total_leaves, total_days = db.query(
+        func.coalesce(func.sum(DailyRollup.leave_count), 0),
+        func.coalesce(func.sum(DailyRollup.total_days), 0)
+    ).one()
+    total_leaves = int(total_leaves)
 
     current_month_start = today.replace(day=1)
     current_month_start_dt = datetime(current_month_start.year, current_month_start.month, 1)
@@ -56,23 +102,24 @@ async def get_dashboard_stats(current_user: models.User = Depends(auth.get_curre
 
     total_personel = db.query(models.Personnel).count()
 
-    avg_duration = db.query(func.avg(models.LeaveHistory.jumlah_hari)).scalar() or 0.0
+    avg_duration = float(total_days) / total_leaves if total_leaves else 0.0
 
     # Leave Distribution
     leave_dist_query = db.query(
         models.LeaveType.name,
         models.LeaveType.color,
-        func.count(models.LeaveHistory.id).label('count')
-    ).join(models.LeaveHistory, models.LeaveType.id == models.LeaveHistory.leave_type_id)\
-     .group_by(models.LeaveType.name, models.LeaveType.color).all()
+        func.sum(DailyRollup.leave_count).label('count')
+    ).join(DailyRollup, models.LeaveType.id == DailyRollup.leave_type_id)\
+     .group_by(models.LeaveType.name, models.LeaveType.color)\
+     .having(func.sum(DailyRollup.leave_count) > 0).all()
     
     leave_distribution = []
-    total_entries_dist = sum(item[2] for item in leave_dist_query)
+    total_entries_dist = sum(int(item[2]) for item in leave_dist_query)
     
     for name, color, count in leave_dist_query:
         leave_distribution.append({
             "type": name,
-            "count": count,
+            "count": int(count),
             "total": total_entries_dist,
             "color": f"bg-{color}-500" if color else "bg-blue-500"
         })
@@ -80,9 +127,10 @@ async def get_dashboard_stats(current_user: models.User = Depends(auth.get_curre
     # Department Summary (Grouped by Jabatan)
     entries_per_jabatan = db.query(
         models.Personnel.jabatan,
-        func.count(models.LeaveHistory.id).label('entries')
-    ).join(models.LeaveHistory, models.Personnel.id == models.LeaveHistory.personnel_id)\
-     .group_by(models.Personnel.jabatan).all()
+        func.sum(PersonnelRollup.leave_count).label('entries')
+    ).join(PersonnelRollup, models.Personnel.id == PersonnelRollup.personnel_id)\
+     .group_by(models.Personnel.jabatan)\
+     .having(func.sum(PersonnelRollup.leave_count) > 0).all()
      
     personnel_per_jabatan = db.query(
         models.Personnel.jabatan,
@@ -91,7 +139,7 @@ async def get_dashboard_stats(current_user: models.User = Depends(auth.get_curre
     
     dept_map = {}
     for jabatan, entries in entries_per_jabatan:
-        dept_map[jabatan] = {"dept": jabatan, "entries": entries, "personel": 0}
+        dept_map[jabatan] = {"dept": jabatan, "entries": int(entries), "personel": 0}
         
     for jabatan, p_count in personnel_per_jabatan:
         if jabatan not in dept_map:
@@ -102,28 +150,10 @@ async def get_dashboard_stats(current_user: models.User = Depends(auth.get_curre
     department_summary.sort(key=lambda x: x['entries'], reverse=True)
     department_summary = department_summary[:5]
 
-    # Calendar Leaves (from recent_leaves)
-    calendar_leaves_data = []
-    for leave in recent_leaves:
-        # Calculate end date
-        if leave.tanggal_selesai:
-            end_date = leave.tanggal_selesai
-        else:
-            end_date = leave.tanggal_mulai + timedelta(days=leave.jumlah_hari - 1)
-        
-        # Determine color
-        color_name = "blue"
-        if leave.leave_type:
-            color_name = leave.leave_type.color or "blue"
-            
-        calendar_leaves_data.append({
-            "id": leave.id,
-            "personnel_name": leave.personnel.nama if leave.personnel else "Unknown",
-            "leave_type": leave.leave_type.name if leave.leave_type else "Cuti",
-            "start_date": leave.tanggal_mulai,
-            "end_date": end_date,
-            "color": color_name
-        })
+    # Calendar Leaves (last 90 days onwards), projected in one joined query
+    calendar_leaves_data = calendar_utils.to_entries(
+        calendar_utils.window_query(db, cutoff, date.max).all()
+    )
 
     return {
         "total_leaves_today": active_count,
@@ -132,7 +162,6 @@ async def get_dashboard_stats(current_user: models.User = Depends(auth.get_curre
         "total_personel": total_personel,
         "average_duration": round(avg_duration, 1),
         "top_frequent": top_frequent,
-        "recent_activity": recent_activity,
         "leave_distribution": leave_distribution,
         "department_summary": department_summary,
         "calendar_leaves": calendar_leaves_data
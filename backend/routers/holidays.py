@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
 from ..core.database import get_db
 from ..models import Holiday, User, Role
 from ..core.auth import get_current_user
-from pydantic import BaseModel
+from ..core.websocket import manager
+from ..schemas import HolidayCreate, HolidayResponse
+from ..utils import reference_utils
 
 router = APIRouter(
     prefix="/api/holidays",
@@ -13,39 +15,22 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Pydantic Schemas
-class HolidayBase(BaseModel):
-    date: date
-    description: str
-    is_active: bool = True
-
-class HolidayCreate(HolidayBase):
-    pass
-
-class HolidayResponse(HolidayBase):
-    id: int
-    
-    class Config:
-        from_attributes = True
-
 @router.get("/", response_model=List[HolidayResponse])
 def get_holidays(
+    request: Request,
+    response: Response,
     start_date: Optional[date] = None, 
     end_date: Optional[date] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Holiday).filter(Holiday.is_active == True)
-    
-    if start_date:
-        query = query.filter(Holiday.date >= start_date)
-    if end_date:
-        query = query.filter(Holiday.date <= end_date)
-        
-    return query.order_by(Holiday.date).all()
+    # Served from the reference cache; 304 when the client's ETag is still current
+    if reference_utils.not_modified(db, "holidays", request, response):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+    return reference_utils.holidays(db, start_date, end_date)
 
 @router.post("/", response_model=HolidayResponse)
-def create_holiday(
+async def create_holiday(
     holiday: HolidayCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -62,10 +47,20 @@ def create_holiday(
     db.add(db_holiday)
     db.commit()
     db.refresh(db_holiday)
+    reference_utils.invalidate("holidays")
+
+    # Other workers drop their holiday snapshot when this reaches them
+    await manager.notify_change(
+        entity="holidays",
+        action="create",
+        username=current_user.username,
+        entity_id=db_holiday.id,
+        details=f"Created holiday {db_holiday.description}"
+    )
     return db_holiday
 
 @router.delete("/{holiday_id}")
-def delete_holiday(
+async def delete_holiday(
     holiday_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -79,4 +74,13 @@ def delete_holiday(
         
     db.delete(holiday)
     db.commit()
+    reference_utils.invalidate("holidays")
+
+    await manager.notify_change(
+        entity="holidays",
+        action="delete",
+        username=current_user.username,
+        entity_id=holiday_id,
+        details=f"Deleted holiday {holiday.description}"
+    )
     return {"message": "Holiday deleted"}
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, HTTPException
+from backend.core import auth, jobs
+from backend import models, schemas
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["Jobs"]
+)
+
+@router.get("/{job_id}", response_model=schemas.Job)
+async def get_job(job_id: str, current_user: models.User = Depends(auth.get_current_admin)):
+    """Status, progress counters and (once finished) the full result of a background job"""
+    job = jobs.get_job(job_id)
+
+    role = current_user.role.value if hasattr(current_user.role, "value") else str(current_user.role)
+    # Jobs are visible to the user who started them (and Super Admin)
+    if not job or (job["username"] != current_user.username and role != "super_admin"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
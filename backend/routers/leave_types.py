@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from backend.core import database, auth
 from backend.core.websocket import manager
 from backend import models, schemas
+from backend.utils import calendar_utils, reference_utils
 
 router = APIRouter(
     prefix="/api/leave-types",
@@ -12,6 +13,8 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.LeaveType])
 async def get_leave_types(
+    request: Request,
+    response: Response,
     gender: Optional[str] = None,
     include_inactive: bool = False,
     current_user: models.User = Depends(auth.get_current_user),
@@ -22,22 +25,11 @@ async def get_leave_types(
     - gender: Filter by gender_specific field ('P' for female, 'L' for male)
               If provided, returns leave types that match the gender OR are not gender-specific
     - include_inactive: If True, includes inactive leave types
+    Served from the reference cache; answers 304 when If-None-Match matches the ETag.
     """
-    query = db.query(models.LeaveType)
-    
-    if not include_inactive:
-        query = query.filter(models.LeaveType.is_active == True)
-    
-    if gender:
-        # Return leave types that are either:
-        # 1. Not gender-specific (gender_specific is None)
-        # 2. Match the provided gender
-        query = query.filter(
-            (models.LeaveType.gender_specific == None) |
-            (models.LeaveType.gender_specific == gender)
-        )
-    
-    return query.order_by(models.LeaveType.name).all()
+    if reference_utils.not_modified(db, "leave_types", request, response):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+    return reference_utils.leave_types(db, include_inactive=include_inactive, gender=gender)
 
 @router.get("/{leave_type_id}", response_model=schemas.LeaveType)
 async def get_leave_type(
@@ -46,7 +38,7 @@ async def get_leave_type(
     db: Session = Depends(database.get_db)
 ):
     """Get a single leave type by ID"""
-    leave_type = db.query(models.LeaveType).filter(models.LeaveType.id == leave_type_id).first()
+    leave_type = reference_utils.get_leave_type(db, leave_type_id, active_only=False)
     if not leave_type:
         raise HTTPException(status_code=404, detail="Leave type not found")
     return leave_type
@@ -78,6 +70,7 @@ async def create_leave_type(
     db.add(new_leave_type)
     db.commit()
     db.refresh(new_leave_type)
+    reference_utils.invalidate("leave_types")
     
     # Audit log
     auth.log_audit(
@@ -134,8 +127,12 @@ async def update_leave_type(
     for field, value in update_data.items():
         setattr(leave_type, field, value)
     
+    # Calendar entries carry the type name and color
+    if "name" in update_data or "color" in update_data:
+        calendar_utils.record_reset(db)
     db.commit()
     db.refresh(leave_type)
+    reference_utils.invalidate("leave_types")
     
     # Audit log
     auth.log_audit(
@@ -180,6 +177,7 @@ async def delete_leave_type(
     # Soft delete
     leave_type.is_active = False
     db.commit()
+    reference_utils.invalidate("leave_types")
     
     # Audit log
     auth.log_audit(
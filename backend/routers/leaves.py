@@ -1,17 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response
 from fastapi.responses import StreamingResponse
-import io
-import pandas as pd
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import extract, func, or_, and_
 from datetime import date, datetime
-import shutil
-import uuid
 import os
 from typing import Optional
 from backend.core import database, auth
 from backend.core.websocket import manager
 from backend import models, schemas
+from backend.utils import balance_utils, pagination_utils, export_utils, search_utils, upload_utils, leave_utils, rollup_utils, calendar_utils, reference_utils
 
 router = APIRouter(
     prefix="/api/leaves",
@@ -30,11 +28,7 @@ async def export_leaves(
     query = db.query(models.LeaveHistory).join(models.Personnel).join(models.LeaveType)
     
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (models.Personnel.nama.ilike(search_term)) |
-            (models.Personnel.nrp.ilike(search_term))
-        )
+        query = query.filter(search_utils.search_filter(search, ("nama", "nrp")))
         
     if type_filter and type_filter != 'all':
         query = query.filter(models.LeaveType.code == type_filter)
@@ -56,34 +50,42 @@ async def export_leaves(
     else:
          query = query.order_by(models.LeaveHistory.created_at.desc())
          
-    leaves = query.options(joinedload(models.LeaveHistory.leave_type)).all()
+    # Project only the exported columns and pull them in batches - no ORM objects,
+    # no identity map and no lazy loads, so memory does not grow with the table
+    rows = query.with_entities(
+        models.LeaveHistory.created_at,
+        models.Personnel.nrp,
+        models.Personnel.nama,
+        models.LeaveType.name,
+        models.LeaveHistory.tanggal_mulai,
+        models.LeaveHistory.jumlah_hari,
+        models.LeaveHistory.alasan
+    ).yield_per(export_utils.EXPORT_BATCH_SIZE)
     
-    data = []
-    for leave in leaves:
-        data.append({
-            "Tgl Entry": leave.created_at.strftime("%Y-%m-%d %H:%M") if leave.created_at else "-",
-            "NRP": leave.personnel.nrp if leave.personnel else "-",
-            "Personel": leave.personnel.nama if leave.personnel else "-",
-            "Jenis Cuti": leave.leave_type.name if leave.leave_type else "-",
-            "Tanggal Mulai": leave.tanggal_mulai.strftime("%Y-%m-%d"),
-            "Jumlah Hari": leave.jumlah_hari,
-            "Alasan": leave.alasan
-        })
-        
-    df = pd.DataFrame(data)
+    def format_rows():
+        for created_at, nrp, nama, leave_type_name, tanggal_mulai, jumlah_hari, alasan in rows:
+            yield (
+                created_at.strftime("%Y-%m-%d %H:%M") if created_at else "-",
+                nrp or "-",
+                nama or "-",
+                leave_type_name or "-",
+                tanggal_mulai.strftime("%Y-%m-%d") if tanggal_mulai else "-",
+                jumlah_hari,
+                alasan
+            )
     
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Riwayat Cuti', index=False)
-    output.seek(0)
+    columns = ["Tgl Entry", "NRP", "Personel", "Jenis Cuti", "Tanggal Mulai", "Jumlah Hari", "Alasan"]
+    
+    # Workbook is written off the event loop in constant-memory mode, then sent in chunks
+    file_path = await run_in_threadpool(export_utils.write_xlsx, format_rows(), columns, 'Riwayat Cuti')
     
     headers = {
         'Content-Disposition': 'attachment; filename="riwayat_cuti.xlsx"'
     }
-    return StreamingResponse(output, headers=headers, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return StreamingResponse(export_utils.iter_file(file_path), headers=headers, media_type=export_utils.XLSX_MEDIA_TYPE)
 
-VALID_FILE_TYPES = ["image/jpeg", "image/png", "application/pdf"]
 UPLOAD_DIR = "uploads/evidence"
+MAX_BULK_ENTRIES = 1000
 
 @router.get("/recent", response_model=list[schemas.LeaveHistory])
 async def get_recent_leaves(
@@ -109,6 +111,8 @@ async def get_all_leaves(
     created_by: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
@@ -121,11 +125,7 @@ async def get_all_leaves(
         .options(joinedload(models.LeaveHistory.personnel), joinedload(models.LeaveHistory.leave_type))
     
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            (models.Personnel.nama.ilike(search_term)) |
-            (models.Personnel.nrp.ilike(search_term))
-        )
+        query = query.filter(search_utils.search_filter(search, ("nama", "nrp")))
         
     if type_filter and type_filter != 'all':
         query = query.filter(models.LeaveType.code == type_filter)
@@ -139,48 +139,39 @@ async def get_all_leaves(
     if end_date:
         query = query.filter(models.LeaveHistory.tanggal_mulai <= end_date)
     
-    # Total Count
-    total = query.count()
-    response.headers["X-Total-Count"] = str(total)
+    # Total Count (optional - skipping it saves a full scan on deep pages)
+    if include_total:
+        total = query.count()
+        response.headers["X-Total-Count"] = str(total)
     
     # Sorting
-    if sort_by:
-        valid_sort_fields = {
-            "created_at": models.LeaveHistory.created_at,
-            "tanggal_mulai": models.LeaveHistory.tanggal_mulai,
-            "jenis_izin": models.LeaveType.name,
-            "jumlah_hari": models.LeaveHistory.jumlah_hari,
-            "nama": models.Personnel.nama,
-            "nrp": models.Personnel.nrp
-        }
-        
-        sort_column = valid_sort_fields.get(sort_by, models.LeaveHistory.created_at)
-        
-        if sort_order == "asc":
-            query = query.order_by(sort_column.asc())
-        else:
-            query = query.order_by(sort_column.desc())
-    else:
-        query = query.order_by(models.LeaveHistory.created_at.desc())
+    valid_sort_fields = {
+        "created_at": models.LeaveHistory.created_at,
+        "tanggal_mulai": models.LeaveHistory.tanggal_mulai,
+        "jenis_izin": models.LeaveType.name,
+        "jumlah_hari": models.LeaveHistory.jumlah_hari,
+        "nama": models.Personnel.nama,
+        "nrp": models.Personnel.nrp
+    }
+    sort_column = valid_sort_fields.get(sort_by, models.LeaveHistory.created_at)
 
-    leaves = query.offset(skip).limit(limit).all()
+    leaves = pagination_utils.paginate(
+        query, response, sort_column, models.LeaveHistory.id,
+        descending=sort_order != "asc", skip=skip, limit=limit, cursor=cursor
+    )
 
-    # Calculate sisa_cuti for each leave
+    # Calculate sisa_cuti for each leave from the balance ledger (single lookup for the page)
+    keys = [
+        (leave.personnel_id, leave.leave_type_id, leave.tanggal_mulai.year)
+        for leave in leaves if leave.personnel and leave.leave_type
+    ]
+    used_map = balance_utils.get_used_days_map(db, keys)
+    
     for leave in leaves:
         if not leave.personnel or not leave.leave_type:
             continue
             
-        current_year = leave.tanggal_mulai.year
-        
-        # Calculate used quota for this specific year/person/type
-        used_q = db.query(func.sum(models.LeaveHistory.jumlah_hari))\
-            .filter(
-                models.LeaveHistory.personnel_id == leave.personnel_id,
-                models.LeaveHistory.leave_type_id == leave.leave_type_id,
-                extract('year', models.LeaveHistory.tanggal_mulai) == current_year
-            ).scalar()
-            
-        used = used_q or 0
+        used = used_map.get((leave.personnel_id, leave.leave_type_id, leave.tanggal_mulai.year), 0)
         quota = leave.leave_type.default_quota
         leave.sisa_cuti = max(0, quota - used)
 
@@ -205,10 +196,7 @@ async def create_leave(
         raise HTTPException(status_code=404, detail="Personnel with this NRP not found")
 
     # 2. Verify Leave Type
-    leave_type = db.query(models.LeaveType).filter(
-        models.LeaveType.id == leave_type_id,
-        models.LeaveType.is_active == True
-    ).first()
+    leave_type = reference_utils.get_leave_type(db, leave_type_id)
     if not leave_type:
         raise HTTPException(status_code=404, detail="Leave type not found or inactive")
     
@@ -223,14 +211,7 @@ async def create_leave(
     # 4. Calculate remaining quota for THIS SPECIFIC leave type
     current_year = tanggal_mulai.year
     
-    used_q = db.query(func.sum(models.LeaveHistory.jumlah_hari))\
-        .filter(
-            models.LeaveHistory.personnel_id == personnel.id,
-            models.LeaveHistory.leave_type_id == leave_type_id,
-            extract('year', models.LeaveHistory.tanggal_mulai) == current_year
-        ).scalar()
-        
-    used = used_q or 0
+    used = balance_utils.get_used_days(db, personnel.id, leave_type_id, current_year)
     remaining = leave_type.default_quota - used
     
     if remaining < jumlah_hari:
@@ -241,16 +222,9 @@ async def create_leave(
 
     # 5. File Handling
     file_path = None
+    file_sha256 = None
     if file:
-        if file.content_type not in VALID_FILE_TYPES:
-            raise HTTPException(status_code=400, detail="Invalid file type. Allowed: JPG, PNG, PDF")
-        
-        extension = file.filename.split(".")[-1]
-        unique_filename = f"{uuid.uuid4()}.{extension}"
-        file_path = f"{UPLOAD_DIR}/{unique_filename}"
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_path, file_sha256 = await upload_utils.save_evidence(file, UPLOAD_DIR)
             
     # 6. Create Leave Record
     # Snapshot the remaining balance AFTER this leave
@@ -261,13 +235,17 @@ async def create_leave(
         leave_type_id=leave_type_id,
         jumlah_hari=jumlah_hari,
         tanggal_mulai=tanggal_mulai,
-        tanggal_selesai=tanggal_selesai,
+        tanggal_selesai=leave_utils.compute_end_date(tanggal_mulai, jumlah_hari, tanggal_selesai),
         alasan=alasan,
         file_path=file_path,
+        file_sha256=file_sha256,
         created_by=current_user.id,
         balance_remaining=balance_after
     )
     db.add(new_leave)
+    balance_utils.record_leave(db, new_leave)
+    rollup_utils.record_leave(db, new_leave)
+    calendar_utils.record_leaves(db, [new_leave])
     db.commit()
     db.refresh(new_leave)
     
@@ -298,6 +276,123 @@ async def create_leave(
     
     return new_leave
 
+@router.post("/bulk", response_model=schemas.LeaveBulkResult)
+async def create_leaves_bulk(
+    request: Request,
+    payload: schemas.LeaveBulkCreate,
+    current_user: models.User = Depends(auth.get_current_admin),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Create many leave records at once (e.g. group leave for a whole unit).
+    Valid entries are inserted in a single transaction; invalid ones are reported per item.
+    """
+    entries = payload.entries
+    if not entries:
+        raise HTTPException(status_code=400, detail="No entries provided")
+    if len(entries) > MAX_BULK_ENTRIES:
+        raise HTTPException(status_code=400, detail=f"Too many entries. Maximum is {MAX_BULK_ENTRIES} per request")
+
+    # 1. Resolve personnel with one query; leave types come from the reference cache
+    nrps = {e.nrp for e in entries}
+    personnel_map = {
+        p.nrp: p for p in db.query(models.Personnel).filter(models.Personnel.nrp.in_(nrps)).all()
+    }
+    leave_type_map = {lt.id: lt for lt in reference_utils.leave_types(db)}
+
+    # 2. Current usage for every (personnel, type, year) touched, from the ledger in one query
+    keys = {
+        (personnel_map[e.nrp].id, e.leave_type_id, e.tanggal_mulai.year)
+        for e in entries if e.nrp in personnel_map
+    }
+    used_map = balance_utils.get_used_days_map(db, keys)
+
+    # 3. Validate in order, accumulating usage so several entries for one person share the quota
+    results = []
+    accepted = []
+    deltas = {}
+    for index, entry in enumerate(entries):
+        personnel = personnel_map.get(entry.nrp)
+        leave_type = leave_type_map.get(entry.leave_type_id)
+        error = None
+
+        if not personnel:
+            error = "Personnel with this NRP not found"
+        elif not leave_type:
+            error = "Leave type not found or inactive"
+        elif entry.jumlah_hari <= 0:
+            error = "Jumlah hari must be positive"
+        elif leave_type.gender_specific and personnel.jenis_kelamin != leave_type.gender_specific:
+            error = f"Leave type '{leave_type.name}' is only available for personnel with gender '{leave_type.gender_specific}'"
+
+        if not error:
+            key = (personnel.id, leave_type.id, entry.tanggal_mulai.year)
+            remaining = leave_type.default_quota - used_map.get(key, 0)
+            if remaining < entry.jumlah_hari:
+                error = f"Kuota {leave_type.name} tidak mencukupi. Sisa: {remaining} hari, Pengajuan: {entry.jumlah_hari} hari."
+
+        if error:
+            results.append({"index": index, "nrp": entry.nrp, "status": "failed", "error": error})
+            continue
+
+        used_map[key] = used_map.get(key, 0) + entry.jumlah_hari
+        deltas[key] = deltas.get(key, 0) + entry.jumlah_hari
+
+        new_leave = models.LeaveHistory(
+            personnel_id=personnel.id,
+            leave_type_id=leave_type.id,
+            jumlah_hari=entry.jumlah_hari,
+            tanggal_mulai=entry.tanggal_mulai,
+            tanggal_selesai=leave_utils.compute_end_date(entry.tanggal_mulai, entry.jumlah_hari, entry.tanggal_selesai),
+            alasan=entry.alasan,
+            created_by=current_user.id,
+            balance_remaining=leave_type.default_quota - used_map[key]
+        )
+        accepted.append((index, entry, personnel, leave_type, new_leave))
+
+    # 4. Insert leaves, ledger updates and audit rows in one transaction
+    if accepted:
+        db.add_all([item[4] for item in accepted])
+        balance_utils.apply_leave_deltas(db, deltas)
+        rollup_utils.record_leaves(db, [item[4] for item in accepted])
+        calendar_utils.record_leaves(db, [item[4] for item in accepted])
+        db.flush()
+
+        client_ip = request.client.host
+        user_agent = request.headers.get("user-agent")
+        auth.log_audit_bulk(db, [
+            {
+                "user_id": current_user.id,
+                "action": "INPUT_IZIN",
+                "category": "Leave Management",
+                "target": entry.nrp,
+                "target_type": "Personnel",
+                "details": f"Input izin for NRP {entry.nrp}: {leave_type.name} ({entry.jumlah_hari} days) [bulk]",
+                "ip_address": client_ip,
+                "user_agent": user_agent
+            }
+            for _, entry, _, leave_type, _ in accepted
+        ], commit=False)
+        db.commit()
+
+        for index, entry, _, _, new_leave in accepted:
+            results.append({"index": index, "nrp": entry.nrp, "status": "created", "leave_id": new_leave.id})
+
+        # 5. One coalesced notification for the whole batch
+        await manager.notify_change(
+            entity="leaves",
+            action="create",
+            username=current_user.username,
+            details=f"Bulk input of {len(accepted)} leaves"
+        )
+
+    results.sort(key=lambda r: r["index"])
+    return {
+        "created": len(accepted),
+        "failed": len(entries) - len(accepted),
+        "results": results
+    }
+
 @router.post("/{leave_id}", response_model=schemas.LeaveHistory)
 @router.put("/{leave_id}", response_model=schemas.LeaveHistory)
 async def update_leave(
@@ -324,10 +419,7 @@ async def update_leave(
         raise HTTPException(status_code=404, detail="Personnel with this NRP not found")
 
     # Verify Leave Type
-    leave_type = db.query(models.LeaveType).filter(
-        models.LeaveType.id == leave_type_id,
-        models.LeaveType.is_active == True
-    ).first()
+    leave_type = reference_utils.get_leave_type(db, leave_type_id)
     if not leave_type:
         raise HTTPException(status_code=404, detail="Leave type not found or inactive")
     
@@ -341,15 +433,9 @@ async def update_leave(
     # Validate Quota on Update (exclude current record)
     current_year = tanggal_mulai.year
     
-    used_q = db.query(func.sum(models.LeaveHistory.jumlah_hari))\
-        .filter(
-            models.LeaveHistory.personnel_id == personnel.id,
-            models.LeaveHistory.leave_type_id == leave_type_id,
-            extract('year', models.LeaveHistory.tanggal_mulai) == current_year,
-            models.LeaveHistory.id != leave_id
-        ).scalar()
-        
-    used = used_q or 0
+    used = balance_utils.get_used_days(db, personnel.id, leave_type_id, current_year)
+    if (leave.personnel_id, leave.leave_type_id, leave.tanggal_mulai.year) == (personnel.id, leave_type_id, current_year):
+        used -= leave.jumlah_hari or 0
     remaining = leave_type.default_quota - used
     
     if remaining < jumlah_hari:
@@ -358,18 +444,26 @@ async def update_leave(
             detail=f"Kuota {leave_type.name} tidak mencukupi untuk update. Sisa: {remaining} hari, Pengajuan baru: {jumlah_hari} hari."
         )
 
+    # Move the old usage out of the ledger before the fields change
+    balance_utils.record_leave(db, leave, sign=-1)
+    rollup_utils.record_leave(db, leave, sign=-1)
+
     # Update fields
     leave.personnel_id = personnel.id
     leave.leave_type_id = leave_type_id
     leave.jumlah_hari = jumlah_hari
     leave.tanggal_mulai = tanggal_mulai
-    if tanggal_selesai:
-        leave.tanggal_selesai = tanggal_selesai
+    leave.tanggal_selesai = leave_utils.compute_end_date(tanggal_mulai, jumlah_hari, tanggal_selesai)
     leave.alasan = alasan
     
     # Handle File Update/Removal
     old_file_path = leave.file_path
     
+    # Store the new upload first so a rejected file leaves the existing evidence untouched
+    new_file = None
+    if file:
+        new_file = await upload_utils.save_evidence(file, UPLOAD_DIR)
+    
     # If user explicitly requested to remove the file OR is replacing with a new one
     if remove_existing_file or file:
         # Delete old file from disk if it exists
@@ -379,21 +473,14 @@ async def update_leave(
             except OSError:
                 pass  # Ignore deletion errors, continue with update
         leave.file_path = None
+        leave.file_sha256 = None
     
-    # Upload new file if provided
-    if file:
-        if file.content_type not in VALID_FILE_TYPES:
-            raise HTTPException(status_code=400, detail="Invalid file type. Allowed: JPG, PNG, PDF")
-
-        extension = file.filename.split(".")[-1]
-        unique_filename = f"{uuid.uuid4()}.{extension}"
-        file_path = f"{UPLOAD_DIR}/{unique_filename}"
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        leave.file_path = file_path
+    if new_file:
+        leave.file_path, leave.file_sha256 = new_file
 
+    balance_utils.record_leave(db, leave)
+    rollup_utils.record_leave(db, leave)
+    calendar_utils.record_leaves(db, [leave])
     db.commit()
     db.refresh(leave)
     
@@ -441,6 +528,9 @@ async def delete_leave(
         except OSError:
             pass  # Ignore deletion errors, continue with record deletion
     
+    balance_utils.record_leave(db, leave, sign=-1)
+    rollup_utils.record_leave(db, leave, sign=-1)
+    calendar_utils.record_leaves(db, [leave])
     db.delete(leave)
     db.commit()
     
@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response, Request
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import io
 from sqlalchemy.orm import Session
 from sqlalchemy import extract, func
 from typing import List, Dict
-import json
+import os
+import shutil
+import tempfile
 import pandas as pd
-from backend.core import database, auth
+from backend.core import database, auth, jobs
 from backend.core.websocket import manager
 from backend import models, schemas
 from datetime import date, timedelta, datetime
-from backend.utils import import_utils
+from backend.utils import import_utils, balance_utils, pagination_utils, search_utils, leave_utils, rollup_utils, calendar_utils, facet_utils, reference_utils
 
 router = APIRouter(
     prefix="/api/personnel",
@@ -23,38 +26,10 @@ def calculate_personnel_balances(db: Session, personnel: models.Personnel, year:
     Only includes leave types applicable to the personnel's gender.
     Returns: {"Type": {"remaining": 5, "used": 7, "quota": 12}}
     """
-    if year is None:
-        year = datetime.now().year
-    
-    # Get all active leave types applicable to this personnel
-    leave_types = db.query(models.LeaveType).filter(
-        models.LeaveType.is_active == True,
-        (models.LeaveType.gender_specific == None) |
-        (models.LeaveType.gender_specific == personnel.jenis_kelamin)
-    ).all()
-    
-    # Get usage per leave type for the year
-    usage_query = db.query(
-        models.LeaveHistory.leave_type_id,
-        func.sum(models.LeaveHistory.jumlah_hari).label('total_days')
-    ).filter(
-        models.LeaveHistory.personnel_id == personnel.id,
-        extract('year', models.LeaveHistory.tanggal_mulai) == year
-    ).group_by(models.LeaveHistory.leave_type_id).all()
-    
-    usage_map = {res[0]: res[1] or 0 for res in usage_query}
-    
-    balances = {}
-    for lt in leave_types:
-        used = usage_map.get(lt.id, 0)
-        remaining = max(0, lt.default_quota - used)
-        balances[lt.name] = {
-            "remaining": remaining,
-            "quota": lt.default_quota,
-            "used": used
-        }
-    
-    return balances
+    balances = balance_utils.compute_balances(
+        db, [personnel.id], year, genders={personnel.id: personnel.jenis_kelamin}
+    )
+    return balances[personnel.id]
 
 @router.get("/stats")
 async def get_personnel_stats(
@@ -64,18 +39,11 @@ async def get_personnel_stats(
     today = date.today()
     
     # 1. Total Personnel
-    total_personnel = db.query(models.Personnel).count()
-    
-    # 2. On Leave (Sedang Cuti)
-    cutoff = today - timedelta(days=120) 
-    recent_leaves = db.query(models.LeaveHistory).filter(models.LeaveHistory.tanggal_mulai >= cutoff).all()
-    
-    on_leave_count = 0
-    for leave in recent_leaves:
-        start = leave.tanggal_mulai
-        end = start + timedelta(days=leave.jumlah_hari - 1)
-        if start <= today <= end:
-            on_leave_count += 1
+    total_personnel = facet_utils.get_total(db)
+    
+    # 2. On Leave (Sedang Cuti) - distinct personnel with a leave covering today
+    on_leave_count = db.query(func.count(func.distinct(models.LeaveHistory.personnel_id)))\
+        .filter(leave_utils.active_on(today)).scalar() or 0
 
     # 3. New Personnel (This Month)
     current_month_start = today.replace(day=1)
@@ -102,12 +70,7 @@ async def export_personnel(
     q = db.query(models.Personnel)
     
     if query:
-        search = f"%{query}%"
-        q = q.filter(
-            (models.Personnel.nama.ilike(search)) |
-            (models.Personnel.nrp.ilike(search)) |
-            (models.Personnel.jabatan.ilike(search))
-        )
+        q = q.filter(search_utils.search_filter(query))
 
     if pangkat:
         q = q.filter(models.Personnel.pangkat == pangkat)
@@ -136,12 +99,17 @@ async def export_personnel(
     personnel_list = q.all()
     
     # Get all leave types for column headers
-    leave_types = db.query(models.LeaveType).filter(models.LeaveType.is_active == True).all()
+    leave_types = reference_utils.leave_types(db)
+
+    # Per-type balances for everyone in one batch
+    balance_map = balance_utils.compute_balances(
+        db, [p.id for p in personnel_list], genders={p.id: p.jenis_kelamin for p in personnel_list}
+    )
 
     # Create DataFrame with per-type balances
     data = []
     for p in personnel_list:
-        balances = calculate_personnel_balances(db, p)
+        balances = balance_map[p.id]
         row = {
             "NRP": p.nrp,
             "Nama": p.nama,
@@ -171,18 +139,17 @@ async def export_personnel(
 
 @router.get("/filters")
 async def get_personnel_filters(
+    counts: bool = False,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
-    pangkats = db.query(models.Personnel.pangkat).distinct().filter(models.Personnel.pangkat != None).all()
-    jabatans = db.query(models.Personnel.jabatan).distinct().filter(models.Personnel.jabatan != None).all()
-    bags = db.query(models.Personnel.bag).distinct().filter(models.Personnel.bag != None).all()
-    
-    return {
-        "pangkat": sorted([p[0] for p in pangkats if p[0]]),
-        "jabatan": sorted([j[0] for j in jabatans if j[0]]),
-        "bag": sorted([b[0] for b in bags if b[0]])
-    }
+    """Distinct pangkat/jabatan/bag values; with counts=true also how many personnel match each."""
+    facets = facet_utils.get_facets(db)
+    result = {field: sorted(facets[field]) for field in facet_utils.FACET_FIELDS}
+    if counts:
+        result["counts"] = {field: facets[field] for field in facet_utils.FACET_FIELDS}
+        result["total"] = facets["total"]
+    return result
 
 @router.get("/", response_model=List[schemas.Personnel])
 async def get_all_personnel(
@@ -195,18 +162,15 @@ async def get_all_personnel(
     bag: str = None,
     sort_by: str = "nama",
     sort_order: str = "asc",
+    cursor: str = None,
+    include_total: bool = True,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
     q = db.query(models.Personnel)
     
     if query:
-        search = f"%{query}%"
-        q = q.filter(
-            (models.Personnel.nama.ilike(search)) |
-            (models.Personnel.nrp.ilike(search)) |
-            (models.Personnel.jabatan.ilike(search))
-        )
+        q = q.filter(search_utils.search_filter(query))
 
     if pangkat:
         q = q.filter(models.Personnel.pangkat == pangkat)
@@ -217,38 +181,35 @@ async def get_all_personnel(
     if bag:
         q = q.filter(models.Personnel.bag.ilike(f"%{bag}%"))
         
-    # Total Count (Filtered)
-    total = q.count()
-    response.headers["X-Total-Count"] = str(total)
-    
-    # Global Count (Unfiltered)
-    global_total = db.query(models.Personnel).count()
-    response.headers["X-Global-Count"] = str(global_total)
+    # Total Count (Filtered) - optional, skipping it saves a full scan on deep pages
+    if include_total:
+        total = q.count()
+        response.headers["X-Total-Count"] = str(total)
+        
+        # Global Count (Unfiltered)
+        response.headers["X-Global-Count"] = str(facet_utils.get_total(db))
     
     # Sorting
-    if sort_by:
-        valid_sort_fields = {
-            "nama": models.Personnel.nama,
-            "nrp": models.Personnel.nrp,
-            "jabatan": models.Personnel.jabatan,
-            "pangkat": models.Personnel.pangkat,
-            "bag": models.Personnel.bag,
-        }
-        
-        sort_column = valid_sort_fields.get(sort_by, models.Personnel.nama)
-        
-        if sort_order == "desc":
-            q = q.order_by(sort_column.desc())
-        else:
-            q = q.order_by(sort_column.asc())
-    else:
-        q = q.order_by(models.Personnel.nama.asc())
+    valid_sort_fields = {
+        "nama": models.Personnel.nama,
+        "nrp": models.Personnel.nrp,
+        "jabatan": models.Personnel.jabatan,
+        "pangkat": models.Personnel.pangkat,
+        "bag": models.Personnel.bag,
+    }
+    sort_column = valid_sort_fields.get(sort_by, models.Personnel.nama)
 
-    personnel_list = q.offset(skip).limit(limit).all()
+    personnel_list = pagination_utils.paginate(
+        q, response, sort_column, models.Personnel.id,
+        descending=sort_order == "desc", skip=skip, limit=limit, cursor=cursor
+    )
     
-    # Calculate per-type balances for each personnel
+    # Calculate per-type balances for the whole page in one batch
+    balance_map = balance_utils.compute_balances(
+        db, [p.id for p in personnel_list], genders={p.id: p.jenis_kelamin for p in personnel_list}
+    )
     for p in personnel_list:
-        p.balances = calculate_personnel_balances(db, p)
+        p.balances = balance_map[p.id]
             
     return personnel_list
 
@@ -274,8 +235,11 @@ async def create_personnel(
     )
     
     db.add(new_personnel)
+    db.flush()
+    search_utils.index_personnel(db, [new_personnel])
     db.commit()
     db.refresh(new_personnel)
+    facet_utils.apply_changes([(None, facet_utils.snapshot(new_personnel))])
     
     # Calculate balances for response
     new_personnel.balances = calculate_personnel_balances(db, new_personnel)
@@ -340,11 +304,17 @@ async def update_personnel(
     
     # Update fields
     update_data = personnel_update.model_dump(exclude_unset=True)
+    renamed = "nama" in update_data and update_data["nama"] != personnel.nama
+    before = facet_utils.snapshot(personnel)
     for field, value in update_data.items():
         setattr(personnel, field, value)
     
+    search_utils.index_personnel(db, [personnel])
+    if renamed:
+        calendar_utils.record_personnel(db, [personnel.id])
     db.commit()
     db.refresh(personnel)
+    facet_utils.apply_changes([(before, facet_utils.snapshot(personnel))])
     
     # Calculate balances for response
     personnel.balances = calculate_personnel_balances(db, personnel)
@@ -388,11 +358,14 @@ async def delete_personnel(
     
     personnel_name = personnel.nama
     personnel_nrp = personnel.nrp
+    before = facet_utils.snapshot(personnel)
     
-
-    
+    # Leaves go with the personnel (cascade); take them out of the daily rollup first
+    rollup_utils.remove_personnel(db, personnel.id)
+    calendar_utils.record_personnel(db, [personnel.id])
     db.delete(personnel)
     db.commit()
+    facet_utils.apply_changes([(before, None)])
     
     # Log audit
     auth.log_audit(
@@ -419,68 +392,141 @@ async def delete_personnel(
     
     return None
 
+def _excel_summary(result: dict) -> dict:
+    stats = result["stats"]
+    return {
+        "message": f"Process complete. Total: {stats['total']}, Added: {stats['added']}, Updated: {stats['updated']}, Skipped: {stats['skipped']}",
+        "data": result
+    }
+
+def _run_import(kind: str, payload, progress=None) -> dict:
+    """Run one personnel import on its own session (used inline and by background jobs)."""
+    db = database.SessionLocal()
+    try:
+        if kind == "preview":
+            return _excel_summary(import_utils.apply_preview(payload, db, progress))
+        try:
+            if kind == "excel":
+                return _excel_summary(import_utils.process_excel_file(payload, db, progress))
+            with open(payload, "rb") as f:
+                result = import_utils.process_json_data(f, db, progress)
+            return {"message": f"Imported {result['count']} records from JSON", **result}
+        finally:
+            if os.path.exists(payload):
+                os.remove(payload)
+    finally:
+        db.close()
+
+def _run_preview(file_path: str, username: str) -> dict:
+    db = database.SessionLocal()
+    try:
+        return import_utils.create_preview(file_path, db, username)
+    finally:
+        db.close()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+async def _notify_import(username: str, kind: str, result: dict):
+    if kind in ("excel", "preview"):
+        stats = result["data"]["stats"]
+        details = f"Imported personnel (added {stats['added']}, updated {stats['updated']})"
+    else:
+        details = f"Imported {result['count']} personnel from JSON"
+    await manager.notify_change(entity="personnel", action="update", username=username, details=details)
+
 @router.post("/import", status_code=status.HTTP_201_CREATED)
-async def import_personnel(file: UploadFile = File(...), current_user: models.User = Depends(auth.get_current_admin), db: Session = Depends(database.get_db)):
-    content_type = file.content_type
+async def import_personnel(
+    response: Response,
+    file: UploadFile = File(...),
+    background: bool = False,
+    preview: bool = False,
+    current_user: models.User = Depends(auth.get_current_admin)
+):
+    """
+    Import personnel from the Polda roster format (XLSX or CSV) or a JSON array.
+    Files are spooled to disk and streamed into the database in fixed-size chunks.
+    With background=true the file is processed as a job: the response (202) carries the
+    job id, progress is pushed over /ws/notifications and the result is at /api/jobs/{id}.
+    With preview=true (Excel only) nothing is written: the diff is returned with a token
+    for POST /import/apply/{token}.
+    """
+    content_type = file.content_type or ""
+    filename = (file.filename or "").lower()
+    
+    # Custom Parser for Polda Format (Excel or CSV)
+    if "excel" in content_type or filename.endswith(".xlsx") or filename.endswith(".xls"):
+        kind, suffix = "excel", ".xlsx"
+    elif "csv" in content_type or filename.endswith(".csv"):
+        kind, suffix = "excel", ".csv"
+    # Fallback for simple JSON
+    elif "json" in content_type:
+        kind, suffix = "json", ".json"
+    else:
+        raise HTTPException(status_code=400, detail="Invalid format. Use the provided Excel/CSV format or JSON.")
+    
+    # Spool to a temp file; the readers stream from disk
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        await run_in_threadpool(shutil.copyfileobj, file.file, tmp)
+        payload = tmp.name
+    
+    if preview:
+        if kind != "excel":
+            os.remove(payload)
+            raise HTTPException(status_code=400, detail="Preview is only available for Excel and CSV files")
+        response.status_code = status.HTTP_200_OK
+        try:
+            return await run_in_threadpool(_run_preview, payload, current_user.username)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Excel parsing error: {str(e)}")
+    
+    if background:
+        job = await jobs.start_job(
+            "personnel_import",
+            current_user.username,
+            lambda progress: _run_import(kind, payload, progress),
+            on_complete=lambda result: _notify_import(current_user.username, kind, result),
+            cleanup=lambda: os.path.exists(payload) and os.remove(payload)
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"job_id": job["id"], "status": job["status"]}
     
     try:
-        # Custom Excel Parser for Polda Format
-        if "excel" in content_type or file.filename.endswith(".xlsx") or file.filename.endswith(".xls"):
-            import shutil
-            import tempfile
-            import os
-
-            
-            # Save to temp file because import_utils needs path (and excel reading is complex)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-                shutil.copyfileobj(file.file, tmp)
-                tmp_path = tmp.name
-                
-            try:
-                result = import_utils.process_excel_file(tmp_path, db)
-                stats = result["stats"]
-                return {
-                    "message": f"Process complete. Total: {stats['total']}, Added: {stats['added']}, Updated: {stats['updated']}, Skipped: {stats['skipped']}",
-                    "data": result
-                }
-            except Exception as e:
-                raise HTTPException(status_code=400, detail=f"Excel parsing error: {str(e)}")
-            finally:
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
+        result = await run_in_threadpool(_run_import, kind, payload)
+    except Exception as e:
+        prefix = "Excel parsing error: " if kind == "excel" else ""
+        raise HTTPException(status_code=400, detail=f"{prefix}{str(e)}")
+    
+    # Notify connected clients
+    await _notify_import(current_user.username, kind, result)
+    return result
 
-        # Fallback for simple JSON
-        elif "json" in content_type:
-            content = await file.read()
-            data = json.loads(content)
-            count = 0
-            for item in data:
-                nrp = str(item.get("nrp") or item.get("NRP"))
-                if not nrp: continue
-                
-                existing = db.query(models.Personnel).filter(models.Personnel.nrp == nrp).first()
-                if existing:
-                    existing.nama = item.get("nama")
-                    existing.pangkat = item.get("pangkat")
-                    existing.jabatan = item.get("jabatan")
-                    existing.bag = item.get("bag")
-                    existing.jenis_kelamin = item.get("jenis_kelamin")
-                else:
-                    new_p = models.Personnel(
-                        nrp=nrp,
-                        nama=item.get("nama"),
-                        pangkat=item.get("pangkat"),
-                        jabatan=item.get("jabatan"),
-                        bag=item.get("bag"),
-                        jenis_kelamin=item.get("jenis_kelamin")
-                    )
-                    db.add(new_p)
-                count += 1
-            db.commit()
-            return {"message": f"Imported {count} records from JSON"}
-            
-        else:
-            raise HTTPException(status_code=400, detail="Invalid format. Use the provided Excel format or JSON.")
-            
+@router.post("/import/apply/{token}", status_code=status.HTTP_201_CREATED)
+async def apply_import_preview(
+    token: str,
+    response: Response,
+    background: bool = False,
+    current_user: models.User = Depends(auth.get_current_admin)
+):
+    """Commit a previewed Excel import without uploading or parsing the file again"""
+    # Claimed before any work starts: a second concurrent apply of the same token gets 404
+    payload = import_utils.claim_preview(token, current_user.username)
+    if not payload:
+        raise HTTPException(status_code=404, detail="Import preview not found or expired")
+    
+    if background:
+        job = await jobs.start_job(
+            "personnel_import",
+            current_user.username,
+            lambda progress: _run_import("preview", payload, progress),
+            on_complete=lambda result: _notify_import(current_user.username, "preview", result)
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"job_id": job["id"], "status": job["status"]}
+    
+    try:
+        result = await run_in_threadpool(_run_import, "preview", payload)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    
+    await _notify_import(current_user.username, "preview", result)
+    return result
@@ -3,7 +3,7 @@ from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from datetime import date, timedelta
 import pandas as pd
-from sqlalchemy import extract
+from sqlalchemy import extract, func
 from io import BytesIO
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
@@ -14,6 +14,7 @@ from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from openpyxl.utils import get_column_letter
 from backend.core import database, auth
 from backend import models, schemas
+from backend.utils import rollup_utils
 
 router = APIRouter(
     prefix="/api/reports",
@@ -47,16 +48,65 @@ async def get_analytics_summary(
         
     leaves = query.all()
     
-    total_days = sum(l.jumlah_hari for l in leaves)
+    # Totals come from the rollups; the row listing itself still needs the leaves
+    totals = rollup_utils.totals(
+        db, start_date, end_date,
+        leave_type if leave_type and leave_type != 'all' else None,
+        personnel_id
+    )
+    if totals is None:
+        totals = (len(leaves), sum(l.jumlah_hari or 0 for l in leaves))
     unique_personel = len(set(l.personnel_id for l in leaves))
     
     return {
-        "total_records": len(leaves),
-        "total_days": total_days,
+        "total_records": totals[0],
+        "total_days": totals[1],
         "unique_personel": unique_personel,
         "data": leaves
     }
 
+@router.get("/trends", response_model=schemas.AnalyticsTrends)
+async def get_analytics_trends(
+    start_date: date = Query(None),
+    end_date: date = Query(None),
+    leave_type: str = Query(None),
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    """Monthly leave counts and days per leave type, read from the daily rollup"""
+    rollup = models.LeaveDailyRollup
+    year_col = extract('year', rollup.day)
+    month_col = extract('month', rollup.day)
+    
+    query = db.query(
+        year_col.label('year'),
+        month_col.label('month'),
+        models.LeaveType.name,
+        func.sum(rollup.leave_count),
+        func.sum(rollup.total_days)
+    ).join(models.LeaveType, models.LeaveType.id == rollup.leave_type_id)
+    
+    if start_date:
+        query = query.filter(rollup.day >= start_date)
+    if end_date:
+        query = query.filter(rollup.day <= end_date)
+    if leave_type and leave_type != 'all':
+        query = query.filter(models.LeaveType.code == leave_type)
+    
+    rows = query.group_by(year_col, month_col, models.LeaveType.name)\
+        .having(func.sum(rollup.leave_count) > 0)\
+        .order_by(year_col, month_col, models.LeaveType.name).all()
+    
+    data = [
+        {"year": int(year), "month": int(month), "leave_type": name, "count": int(count), "days": int(days or 0)}
+        for year, month, name, count, days in rows
+    ]
+    return {
+        "total_records": sum(d["count"] for d in data),
+        "total_days": sum(d["days"] for d in data),
+        "data": data
+    }
+
 @router.get("/export")
 async def export_report(
     format: str = Query(..., pattern="^(pdf|excel)$"),
@@ -130,7 +180,7 @@ async def export_report(
         for idx, leave in enumerate(leaves, 1):
             # Calculate end date
             tgl_mulai = leave.tanggal_mulai
-            tgl_selesai = tgl_mulai + timedelta(days=leave.jumlah_hari - 1) if tgl_mulai else None
+            tgl_selesai = leave.tanggal_selesai or (tgl_mulai + timedelta(days=leave.jumlah_hari - 1) if tgl_mulai else None)
             
             # Format Dates
             tgl_mulai_str = tgl_mulai.strftime("%d-%m-%Y") if tgl_mulai else "-"
@@ -391,7 +441,7 @@ async def export_report(
             
             # Calculate end date
             tgl_mulai = item.tanggal_mulai
-            tgl_selesai = tgl_mulai + timedelta(days=item.jumlah_hari - 1) if tgl_mulai else None
+            tgl_selesai = item.tanggal_selesai or (tgl_mulai + timedelta(days=item.jumlah_hari - 1) if tgl_mulai else None)
             
             tgl_mulai_str = tgl_mulai.strftime("%d-%m-%Y") if tgl_mulai else "-"
             tgl_selesai_str = tgl_selesai.strftime("%d-%m-%Y") if tgl_selesai else "-"
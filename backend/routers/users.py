@@ -1,24 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import List, Optional
-from passlib.context import CryptContext
-from backend.core import database, auth
+from backend.core import database, auth, activity
 from backend.core.websocket import manager
 from backend import models, schemas
+from backend.utils import pagination_utils
 
 router = APIRouter(
     prefix="/api/users",
     tags=["Users"]
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 @router.get("/me", response_model=schemas.User)
 async def get_current_user_profile(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+@router.get("/auth-cache")
+async def get_auth_cache_stats(current_user: models.User = Depends(auth.get_current_user)):
+    """Hit/miss counters of the authenticated-user cache (super admin only)"""
+    user_role = current_user.role.value if hasattr(current_user.role, "value") else str(current_user.role)
+    if user_role != "super_admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return auth.user_cache.stats()
 
 @router.get("/", response_model=List[schemas.User])
 async def get_users(
@@ -30,6 +37,8 @@ async def get_users(
     status: Optional[str] = None,
     sort_by: str = "created_at",
     sort_order: str = "desc",
+    cursor: Optional[str] = None,
+    include_total: bool = True,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
@@ -62,30 +71,31 @@ async def get_users(
     if status and status != "all":
         query = query.filter(models.User.is_active == (status == "active"))
         
-    # Total Count
-    total = query.count()
-    response.headers["X-Total-Count"] = str(total)
+    # Total Count (optional - skipping it saves a full scan on deep pages)
+    if include_total:
+        total = query.count()
+        response.headers["X-Total-Count"] = str(total)
     
     # Sorting
-    if sort_by:
-        valid_sort_fields = {
-            "username": models.User.username,
-            "full_name": models.User.full_name,
-            "email": models.User.email,
-            "role": models.User.role,
-            "created_at": models.User.created_at
-        }
-        
-        sort_column = valid_sort_fields.get(sort_by, models.User.created_at)
-        
-        if sort_order == "asc":
-            query = query.order_by(sort_column.asc())
-        else:
-            query = query.order_by(sort_column.desc())
-    else:
-        query = query.order_by(models.User.created_at.desc())
+    valid_sort_fields = {
+        "username": models.User.username,
+        "full_name": models.User.full_name,
+        "email": models.User.email,
+        "role": models.User.role,
+        "created_at": models.User.created_at
+    }
+    sort_column = valid_sort_fields.get(sort_by, models.User.created_at)
+
+    users = pagination_utils.paginate(
+        query, response, sort_column, models.User.id,
+        descending=sort_order != "asc", skip=skip, limit=limit, cursor=cursor
+    )
 
-    users = query.offset(skip).limit(limit).all()
+    # Show activity that is still waiting for the next bulk flush
+    for user in users:
+        seen = activity.tracker.pending(user.id)
+        if seen is not None:
+            set_committed_value(user, "last_active", seen)
     return users
 
 @router.post("/", response_model=schemas.User)
@@ -114,7 +124,7 @@ async def create_user(
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
         
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await auth.get_password_hash_async(user.password)
     db_user = models.User(
         username=user.username,
         full_name=user.full_name,
@@ -139,7 +149,8 @@ async def create_user(
         "User", 
         "Created new user",
         ip_address=request.client.host,
-        user_agent=request.headers.get("user-agent")
+        user_agent=request.headers.get("user-agent"),
+        durable=True
     )
     
     # Notify connected clients
@@ -178,6 +189,7 @@ async def update_user(
             detail="You can only update your own profile"
         )
         
+    previous_username = db_user.username
     if user_update.username is not None and user_update.username != db_user.username:
         # Check if new username is already taken
         existing = db.query(models.User).filter(models.User.username == user_update.username).first()
@@ -194,10 +206,12 @@ async def update_user(
     if user_update.status is not None:
         db_user.status = user_update.status
     if user_update.password:
-        db_user.password_hash = get_password_hash(user_update.password)
+        db_user.password_hash = await auth.get_password_hash_async(user_update.password)
         
     db.commit()
     db.refresh(db_user)
+    auth.user_cache.invalidate(previous_username)
+    auth.user_cache.invalidate(db_user.username)
     
     # Log action
     log_action = "UPDATE_USER"
@@ -225,7 +239,8 @@ async def update_user(
         log_details,
         status=log_status,
         ip_address=request.client.host,
-        user_agent=request.headers.get("user-agent")
+        user_agent=request.headers.get("user-agent"),
+        durable=True
     )
     
     # Notify connected clients
@@ -280,8 +295,9 @@ async def reset_password(
             detail="You don't have permission to reset this user's password"
         )
         
-    db_user.password_hash = get_password_hash(reset_data.new_password)
+    db_user.password_hash = await auth.get_password_hash_async(reset_data.new_password)
     db.commit()
+    auth.user_cache.invalidate(db_user.username)
     
     # Log action
     auth.log_audit(
@@ -293,7 +309,8 @@ async def reset_password(
         "User", 
         "Reset user password",
         ip_address=request.client.host,
-        user_agent=request.headers.get("user-agent")
+        user_agent=request.headers.get("user-agent"),
+        durable=True
     )
     
     # Notify connected clients
@@ -307,16 +324,31 @@ async def reset_password(
     
     return {"message": "Password reset successfully", "temporary_password": reset_data.new_password}
 
-import pandas as pd
-import io
 from fastapi import UploadFile, File
+from starlette.concurrency import run_in_threadpool
+from backend.core import jobs
+from backend.utils import import_utils
+
+def _run_users_import(content: bytes, progress=None) -> dict:
+    """Run a users import on its own session (used inline and by background jobs)."""
+    db = database.SessionLocal()
+    try:
+        return import_utils.process_users_file(content, db, progress)
+    finally:
+        db.close()
 
 @router.post("/import", response_model=dict)
 async def import_users(
+    response: Response,
     file: UploadFile = File(...),
-    current_user: models.User = Depends(auth.get_current_admin),
-    db: Session = Depends(database.get_db)
+    background: bool = False,
+    current_user: models.User = Depends(auth.get_current_admin)
 ):
+    """
+    Create users from an Excel sheet (Super Admin only).
+    With background=true the sheet is processed as a job: the response (202) carries the
+    job id, progress is pushed over /ws/notifications and the result is at /api/jobs/{id}.
+    """
     # RBAC: Check role
     user_role = str(current_user.role)
     if hasattr(current_user.role, "value"):
@@ -330,58 +362,38 @@ async def import_users(
             detail="Only Super Admin can import users"
         )
 
-    try:
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents))
-        
-        # Expected columns validation
-        required_columns = ['username', 'password', 'full_name', 'role', 'email']
-        # Normalize column names to lowercase for checking
-        df.columns = [c.lower().strip() for c in df.columns]
-        
-        missing_cols = [col for col in required_columns if col not in df.columns]
-        if missing_cols:
-             raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(missing_cols)}")
-             
-        success_count = 0
-        errors = []
-        
-        for index, row in df.iterrows():
-            try:
-                username = str(row['username']).strip()
-                if pd.isna(username) or not username:
-                    continue
-                    
-                # Check duplicate
-                if db.query(models.User).filter(models.User.username == username).first():
-                    errors.append(f"Row {index+2}: Username '{username}' already exists")
-                    continue
-                
-                # Create user
-                new_user = models.User(
-                    username=username,
-                    password_hash=get_password_hash(str(row['password'])),
-                    full_name=str(row['full_name']) if not pd.isna(row['full_name']) else None,
-                    role=str(row['role']).lower() if not pd.isna(row['role']) else 'admin',
-                    email=str(row['email']) if not pd.isna(row['email']) else None,
-                    status='active'
-                )
-                db.add(new_user)
-                success_count += 1
-                
-            except Exception as e:
-                errors.append(f"Row {index+2}: {str(e)}")
-                
-        db.commit()
-        
-        # Log action
-        auth.log_audit(db, current_user.id, "IMPORT_USERS", "User Management", "Batch Import", "User", f"Imported {success_count} users")
+    contents = await file.read()
+    user_id, username = current_user.id, current_user.username
 
-        return {
-            "message": f"Successfully imported {success_count} users",
-            "errors": errors,
-            "total_processed": len(df)
-        }
-        
+    async def finish(result: dict):
+        # Log action on a fresh session: the request session is gone for background jobs
+        log_db = database.SessionLocal()
+        try:
+            auth.log_audit(log_db, user_id, "IMPORT_USERS", "User Management", "Batch Import", "User", f"Imported {result['created']} users")
+        finally:
+            log_db.close()
+        if result["created"]:
+            await manager.notify_change(
+                entity="users",
+                action="create",
+                username=username,
+                details=f"Imported {result['created']} users"
+            )
+
+    if background:
+        job = await jobs.start_job(
+            "users_import",
+            username,
+            lambda progress: _run_users_import(contents, progress),
+            on_complete=finish
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"job_id": job["id"], "status": job["status"]}
+
+    try:
+        result = await run_in_threadpool(_run_users_import, contents)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+    await finish(result)
+    return result
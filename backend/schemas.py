@@ -70,6 +70,21 @@ class LeaveType(LeaveTypeBase):
     class Config:
         from_attributes = True
 
+# ===== Holiday Schemas =====
+class HolidayBase(BaseModel):
+    date: date
+    description: str
+    is_active: bool = True
+
+class HolidayCreate(HolidayBase):
+    pass
+
+class HolidayResponse(HolidayBase):
+    id: int
+    
+    class Config:
+        from_attributes = True
+
 # ===== Personnel Schemas =====
 class PersonnelBase(BaseModel):
     nrp: str
@@ -107,6 +122,21 @@ class LeaveCreate(BaseModel):
     tanggal_selesai: Optional[date] = None
     alasan: str
     
+class LeaveBulkCreate(BaseModel):
+    entries: List[LeaveCreate]
+
+class LeaveBulkItemResult(BaseModel):
+    index: int
+    nrp: str
+    status: str  # "created" or "failed"
+    leave_id: Optional[int] = None
+    error: Optional[str] = None
+
+class LeaveBulkResult(BaseModel):
+    created: int
+    failed: int
+    results: List[LeaveBulkItemResult]
+    
 class LeaveHistory(BaseModel):
     id: int
     personnel_id: int
@@ -116,6 +146,7 @@ class LeaveHistory(BaseModel):
     tanggal_selesai: Optional[date] = None
     alasan: str
     file_path: Optional[str] = None
+    file_sha256: Optional[str] = None
     created_at: datetime
     created_by: int
     
@@ -160,6 +191,12 @@ class DashboardCalendarLeave(BaseModel):
     end_date: date
     color: str
 
+class CalendarFeed(BaseModel):
+    version: str
+    full: bool
+    leaves: List[DashboardCalendarLeave]
+    removed: List[int]
+
 class DashboardStats(BaseModel):
     total_leaves_today: int
     total_leave_entries: int
@@ -178,3 +215,26 @@ class AnalyticsSummary(BaseModel):
     unique_personel: int
     data: List[LeaveHistory]
 
+class AnalyticsTrendPoint(BaseModel):
+    year: int
+    month: int
+    leave_type: str
+    count: int
+    days: int
+
+class AnalyticsTrends(BaseModel):
+    total_records: int
+    total_days: int
+    data: List[AnalyticsTrendPoint]
+
+# ===== Background Job Schemas =====
+class Job(BaseModel):
+    id: str
+    kind: str
+    username: str
+    status: str  # queued, running, completed, failed
+    progress: dict
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: str
+    finished_at: Optional[str] = None
@@ -10,6 +10,8 @@ Commands:
   seed   - Add dummy data to existing database
   reset  - Clear operational data but keep users and leave types
   check  - Show database status and counts
+  migrate - Upgrade the schema of an existing database (new tables, columns and indexes)
+  rebuild - Recompute derived data (end dates, leave balance ledger, leave rollups, personnel search index)
 """
 import sys
 import os
@@ -21,6 +23,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 from sqlalchemy import text
 from passlib.context import CryptContext
 from backend.core.database import engine, SessionLocal, Base
+from backend.core.migrations import upgrade_schema
 from backend import models
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -45,7 +48,7 @@ def cmd_init():
     
     # Create all tables
     print("\n[1/3] Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
     print("      Tables created successfully.")
     
     db = SessionLocal()
@@ -220,6 +223,10 @@ def cmd_seed():
             db.commit()
             for p in personnels:
                 db.refresh(p)
+            
+            from backend.utils import search_utils
+            search_utils.index_personnel(db, personnels)
+            db.commit()
             print(f"      Created {len(personnels)} personnel records.")
         
         # 2. Seed Leave History
@@ -255,6 +262,7 @@ def cmd_seed():
                     leave_type_id=leave_type.id,
                     jumlah_hari=days,
                     tanggal_mulai=start_date,
+                    tanggal_selesai=start_date + timedelta(days=days - 1),
                     alasan=random.choice(reasons),
                     created_by=admin_id,
                     created_at=datetime.combine(start_date, datetime.min.time())
@@ -277,6 +285,7 @@ def cmd_seed():
                     leave_type_id=leave_type.id,
                     jumlah_hari=days,
                     tanggal_mulai=start_date,
+                    tanggal_selesai=start_date + timedelta(days=days - 1),
                     alasan="Sedang Cuti (Active)",
                     created_by=admin_id,
                     created_at=datetime.now()
@@ -285,6 +294,10 @@ def cmd_seed():
             
             db.commit()
             print("      Created 55 leave history records.")
+            
+            from backend.utils import balance_utils, rollup_utils
+            balance_utils.rebuild_balances(db)
+            rollup_utils.rebuild_rollups(db)
         
         # 3. Seed Audit Logs
         print("\n[3/3] Seeding Audit Logs...")
@@ -345,7 +358,13 @@ def cmd_reset():
     db = SessionLocal()
     try:
         print("[1/3] Clearing Leave History...")
+        from backend.utils import calendar_utils
+        db.query(models.LeaveBalance).delete()
+        db.query(models.LeaveDailyRollup).delete()
+        db.query(models.LeavePersonnelRollup).delete()
         count = db.query(models.LeaveHistory).delete()
+        # Calendar clients holding a feed token must reload their whole window
+        calendar_utils.record_reset(db)
         print(f"      Deleted {count} records.")
         
         print("[2/3] Clearing Audit Logs...")
@@ -353,6 +372,7 @@ def cmd_reset():
         print(f"      Deleted {count} records.")
         
         print("[3/3] Clearing Personnel...")
+        db.query(models.PersonnelSearchGram).delete()
         count = db.query(models.Personnel).delete()
         print(f"      Deleted {count} records.")
         
@@ -383,6 +403,8 @@ def cmd_check():
         print(f"    Leave Types:   {db.query(models.LeaveType).count()}")
         print(f"    Personnel:     {db.query(models.Personnel).count()}")
         print(f"    Leave History: {db.query(models.LeaveHistory).count()}")
+        print(f"    Leave Balances:{db.query(models.LeaveBalance).count()}")
+        print(f"    Leave Rollups: {db.query(models.LeaveDailyRollup).count()}")
         print(f"    Audit Logs:    {db.query(models.AuditLog).count()}")
         
         print("\n  Users:")
@@ -405,6 +427,56 @@ def cmd_check():
         db.close()
 
 
+def cmd_migrate():
+    """Upgrade the schema of an existing database to the current models."""
+    print("=" * 50)
+    print("  MIGRATING DATABASE SCHEMA")
+    print("=" * 50)
+    upgrade_schema(engine)
+    print("\n  Schema is up to date.")
+
+
+def cmd_rebuild():
+    """Recompute derived tables from leave history."""
+    print("=" * 50)
+    print("  REBUILDING DERIVED TABLES")
+    print("=" * 50)
+    
+    from backend.utils import balance_utils, search_utils, leave_utils, rollup_utils
+    
+    # Make sure newly added tables and columns exist on older databases
+    upgrade_schema(engine)
+    
+    db = SessionLocal()
+    try:
+        print("\n[1/4] Backfilling leave end dates...")
+        count = leave_utils.backfill_end_dates(db)
+        print(f"      Updated {count} leave records.")
+        
+        print("\n[2/4] Rebuilding leave balance ledger...")
+        count = balance_utils.rebuild_balances(db)
+        print(f"      Wrote {count} balance rows.")
+        
+        print("\n[3/4] Rebuilding leave rollups...")
+        count = rollup_utils.rebuild_rollups(db)
+        print(f"      Wrote {count} daily rollup rows.")
+        
+        print("\n[4/4] Rebuilding personnel search index...")
+        count = search_utils.rebuild_search_index(db)
+        print(f"      Indexed {count} personnel.")
+        
+        print("\n" + "=" * 50)
+        print("  REBUILD COMPLETE")
+        print("=" * 50)
+        
+    except Exception as e:
+        print(f"\n[ERROR] {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="E-Cuti Database Management CLI",
@@ -416,9 +488,11 @@ Commands:
   seed   - Add dummy data for testing
   reset  - Clear operational data (keep users & leave types)
   check  - Show database status
+  migrate - Upgrade the schema of an existing database
+  rebuild - Recompute derived data (end dates, balances, rollups, search index)
         """
     )
-    parser.add_argument('command', choices=['init', 'fresh', 'seed', 'reset', 'check'],
+    parser.add_argument('command', choices=['init', 'fresh', 'seed', 'reset', 'check', 'migrate', 'rebuild'],
                         help='Command to execute')
     
     args = parser.parse_args()
@@ -429,6 +503,8 @@ Commands:
         'seed': cmd_seed,
         'reset': cmd_reset,
         'check': cmd_check,
+        'migrate': cmd_migrate,
+        'rebuild': cmd_rebuild,
     }
     
     commands[args.command]()
@@ -0,0 +1,85 @@
+"""
+Shared fixtures. DATABASE_URL is read when backend is first imported, so it points at
+a throwaway SQLite file before any backend import. The app also writes uploads/
+relative to the working directory; tests run from the same throwaway directory.
+"""
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="polda_ntb_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["AUDIT_MODE"] = "sync"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import models
+from backend.core import auth, cache
+from backend.core.database import Base, SessionLocal, engine
+from backend.scripts.manage import DEFAULT_LEAVE_TYPES
+from backend.utils import reference_utils
+
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "admin123"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _work_dir():
+    previous = os.getcwd()
+    os.chdir(_TMP_DIR)
+    yield _TMP_DIR
+    os.chdir(previous)
+
+
+@pytest.fixture
+def db():
+    """Fresh schema with the default leave types; in-process caches reset."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    cache.backend = cache.MemoryCacheBackend()
+    reference_utils._snapshots.clear()
+    auth.user_cache._entries.clear()
+
+    session = SessionLocal()
+    for lt_data in DEFAULT_LEAVE_TYPES:
+        session.add(models.LeaveType(**lt_data))
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    """App client with the lifespan running (websocket manager, job runner), as in production."""
+    from backend.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admin_headers(db, client):
+    db.add(models.User(
+        username=ADMIN_USERNAME,
+        password_hash=auth.get_password_hash(ADMIN_PASSWORD),
+        role=models.Role.super_admin,
+        full_name="Administrator"
+    ))
+    db.commit()
+    response = client.post("/api/token", data={"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def leave_type_id(db, code: str) -> int:
+    return db.query(models.LeaveType.id).filter(models.LeaveType.code == code).scalar()
+
+
+def add_personnel(db, nrp: str, nama: str, jenis_kelamin: str = "L", **fields) -> models.Personnel:
+    person = models.Personnel(nrp=nrp, nama=nama, jenis_kelamin=jenis_kelamin,
+                              pangkat=fields.get("pangkat", "BRIPDA"), jabatan=fields.get("jabatan", "BAMIN"),
+                              bag=fields.get("bag"))
+    db.add(person)
+    db.flush()
+    return person
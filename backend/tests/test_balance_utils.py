@@ -0,0 +1,102 @@
+from datetime import date
+
+from backend import models
+from backend.utils import balance_utils
+from backend.tests.conftest import add_personnel, leave_type_id
+
+
+def _leave(db, person, type_id, start, days):
+    leave = models.LeaveHistory(personnel_id=person.id, leave_type_id=type_id,
+                                tanggal_mulai=start, jumlah_hari=days, alasan="test")
+    db.add(leave)
+    db.flush()
+    return leave
+
+
+def test_apply_leave_delta_creates_and_accumulates(db):
+    person = add_personnel(db, "1001", "Andi")
+    tahunan = leave_type_id(db, "cuti_tahunan")
+
+    balance_utils.apply_leave_delta(db, person.id, tahunan, 2024, 3)
+    balance_utils.apply_leave_delta(db, person.id, tahunan, 2024, 2)
+    balance_utils.apply_leave_delta(db, person.id, tahunan, 2024, 0)
+    db.commit()
+
+    assert balance_utils.get_used_days(db, person.id, tahunan, 2024) == 5
+    assert balance_utils.get_used_days(db, person.id, tahunan, 2025) == 0
+    assert db.query(models.LeaveBalance).count() == 1
+
+
+def test_record_leave_add_and_remove(db):
+    person = add_personnel(db, "1001", "Andi")
+    sakit = leave_type_id(db, "sakit")
+    leave = _leave(db, person, sakit, date(2024, 3, 1), 4)
+
+    balance_utils.record_leave(db, leave)
+    db.commit()
+    assert balance_utils.get_used_days(db, person.id, sakit, 2024) == 4
+
+    balance_utils.record_leave(db, leave, sign=-1)
+    db.commit()
+    assert balance_utils.get_used_days(db, person.id, sakit, 2024) == 0
+
+
+def test_apply_leave_deltas_updates_existing_and_inserts_missing(db):
+    andi = add_personnel(db, "1001", "Andi")
+    budi = add_personnel(db, "1002", "Budi")
+    tahunan = leave_type_id(db, "cuti_tahunan")
+    sakit = leave_type_id(db, "sakit")
+    balance_utils.apply_leave_delta(db, andi.id, tahunan, 2024, 3)
+    db.commit()
+
+    balance_utils.apply_leave_deltas(db, {
+        (andi.id, tahunan, 2024): 2,
+        (andi.id, sakit, 2024): 1,
+        (budi.id, tahunan, 2025): 6,
+        (budi.id, sakit, 2025): 0,
+    })
+    db.commit()
+
+    keys = [(andi.id, tahunan, 2024), (andi.id, sakit, 2024), (budi.id, tahunan, 2025), (budi.id, sakit, 2025)]
+    assert balance_utils.get_used_days_map(db, keys) == {
+        (andi.id, tahunan, 2024): 5,
+        (andi.id, sakit, 2024): 1,
+        (budi.id, tahunan, 2025): 6,
+        (budi.id, sakit, 2025): 0,
+    }
+    # Zero deltas never create ledger rows
+    assert db.query(models.LeaveBalance).count() == 3
+
+
+def test_compute_balances_remaining_and_gender(db):
+    andi = add_personnel(db, "1001", "Andi", jenis_kelamin="L")
+    sari = add_personnel(db, "1002", "Sari", jenis_kelamin="P")
+    tahunan = leave_type_id(db, "cuti_tahunan")
+    balance_utils.apply_leave_deltas(db, {(andi.id, tahunan, 2024): 5, (sari.id, tahunan, 2024): 20})
+    db.commit()
+
+    balances = balance_utils.compute_balances(db, [andi.id, sari.id], year=2024)
+
+    assert balances[andi.id]["Cuti Tahunan"] == {"remaining": 7, "quota": 12, "used": 5}
+    # Remaining never goes below zero
+    assert balances[sari.id]["Cuti Tahunan"] == {"remaining": 0, "quota": 12, "used": 20}
+    assert "Melahirkan" not in balances[andi.id]
+    assert balances[sari.id]["Melahirkan"] == {"remaining": 90, "quota": 90, "used": 0}
+
+
+def test_rebuild_balances_matches_history(db):
+    andi = add_personnel(db, "1001", "Andi")
+    tahunan = leave_type_id(db, "cuti_tahunan")
+    sakit = leave_type_id(db, "sakit")
+    _leave(db, andi, tahunan, date(2024, 1, 10), 2)
+    _leave(db, andi, tahunan, date(2024, 6, 1), 3)
+    _leave(db, andi, tahunan, date(2025, 2, 1), 1)
+    _leave(db, andi, sakit, date(2024, 2, 1), 4)
+    # Drifted ledger row that the rebuild must replace
+    balance_utils.apply_leave_delta(db, andi.id, tahunan, 2024, 99)
+    db.commit()
+
+    assert balance_utils.rebuild_balances(db) == 3
+    assert balance_utils.get_used_days(db, andi.id, tahunan, 2024) == 5
+    assert balance_utils.get_used_days(db, andi.id, tahunan, 2025) == 1
+    assert balance_utils.get_used_days(db, andi.id, sakit, 2024) == 4
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from backend import models
+from backend.core import cache
+from backend.utils import import_utils
+from backend.tests.conftest import add_personnel
+
+ROSTER = """DAFTAR PERSONEL;;;;;;
+NO;NAMA;PANGKAT;NRP;JABATAN;BAG;JK
+1;Andi Saputra;BRIPKA;87120345;KASUBBAG;BAGOPS;L
+2;Budi Santoso;BRIPTU;90010112;BAMIN;;L
+3;Sari Dewi;IPDA;85060771;PAUR;BAGSDM;P
+4;Sari Dewi (duplikat);IPDA;85060771;PAUR;BAGSDM;P
+5;Tanpa NRP;BRIPDA;;BAMIN;;L
+"""
+
+
+@pytest.fixture
+def roster_file(tmp_path):
+    path = tmp_path / "roster.csv"
+    path.write_text(ROSTER, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def existing(db):
+    # Andi unchanged, Budi renamed in the file (and bag left empty there), Sari new
+    add_personnel(db, "87120345", "Andi Saputra", pangkat="BRIPKA", jabatan="KASUBBAG", bag="BAGOPS")
+    add_personnel(db, "90010112", "Budi S", pangkat="BRIPTU", jabatan="BAMIN", bag="BAGREN")
+    db.commit()
+
+
+def test_parse_roster_skips_preamble_duplicates_and_missing_nrp(roster_file):
+    rows = import_utils.parse_excel(roster_file)
+    assert rows["nrp"].tolist() == ["87120345", "90010112", "85060771"]
+    assert rows.loc[2, "nama"] == "Sari Dewi"
+    assert rows.loc[1, "bag"] is None
+
+
+def test_compute_diff(db, existing, roster_file):
+    diff = import_utils.compute_diff(db, import_utils.parse_excel(roster_file))
+
+    assert diff["stats"] == {"added": 1, "updated": 1, "skipped": 1, "total": 3}
+    assert [r["nrp"] for r in diff["inserts"]] == ["85060771"]
+    [update] = diff["updates"]
+    assert update["nama"] == "Budi Santoso"
+    # An empty optional column in the file keeps the stored value
+    assert "bag" not in update
+    [updated] = [d for d in diff["details"] if d["type"] == "updated"]
+    assert updated["changes"] == [{"field": "Nama", "old": "Budi S", "new": "Budi Santoso"}]
+    # Nothing is written by a diff
+    assert db.query(models.Personnel).count() == 2
+
+
+def test_preview_is_claimed_once_by_its_owner(db, existing, roster_file):
+    preview = import_utils.create_preview(roster_file, db, "admin")
+    assert preview["stats"] == {"added": 1, "updated": 1, "skipped": 1, "total": 3}
+    token = preview["token"]
+
+    assert import_utils.claim_preview(token, "someone_else") is None
+    # The owner can still claim it after a foreign attempt
+    claimed = import_utils.claim_preview(token, "admin")
+    assert claimed is not None
+    assert import_utils.claim_preview(token, "admin") is None
+    assert import_utils.claim_preview("../../etc", "admin") is None
+    assert not os.listdir(import_utils.PREVIEW_DIR)
+
+    result = import_utils.apply_preview(claimed, db)
+    assert result["stats"]["added"] == 1
+    db.expire_all()
+    names = dict(db.query(models.Personnel.nrp, models.Personnel.nama).all())
+    assert names == {"87120345": "Andi Saputra", "90010112": "Budi Santoso", "85060771": "Sari Dewi"}
+    budi = db.query(models.Personnel).filter(models.Personnel.nrp == "90010112").one()
+    assert budi.bag == "BAGREN"
+
+
+def test_preview_is_rediffed_after_personnel_change(db, existing, roster_file):
+    preview = import_utils.create_preview(roster_file, db, "admin")
+
+    # Someone adds Sari between preview and apply
+    add_personnel(db, "85060771", "Sari Dewi", jenis_kelamin="P", pangkat="IPDA", jabatan="PAUR", bag="BAGSDM")
+    db.commit()
+    cache.bump_version("personnel")
+
+    result = import_utils.apply_preview(import_utils.claim_preview(preview["token"], "admin"), db)
+    assert result["stats"] == {"added": 0, "updated": 1, "skipped": 2, "total": 3}
+    assert db.query(models.Personnel).count() == 3
+
+
+def test_expired_preview_cannot_be_claimed(db, existing, roster_file, monkeypatch):
+    token = import_utils.create_preview(roster_file, db, "admin")["token"]
+    monkeypatch.setattr(import_utils, "PREVIEW_TTL_SECONDS", -1)
+    assert import_utils.claim_preview(token, "admin") is None
@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+
+from backend import models
+from backend.utils import balance_utils
+from backend.tests.conftest import add_personnel, leave_type_id
+
+
+@pytest.fixture
+def people(db):
+    andi = add_personnel(db, "1001", "Andi", jenis_kelamin="L")
+    sari = add_personnel(db, "1002", "Sari", jenis_kelamin="P")
+    db.commit()
+    return andi, sari
+
+
+def _entry(nrp, type_id, days, start="2024-03-01"):
+    return {"nrp": nrp, "leave_type_id": type_id, "jumlah_hari": days, "tanggal_mulai": start, "alasan": "test"}
+
+
+def _bulk(client, headers, entries):
+    response = client.post("/api/leaves/bulk", json={"entries": entries}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_bulk_reports_each_invalid_entry(db, people, client, admin_headers):
+    tahunan = leave_type_id(db, "cuti_tahunan")
+    melahirkan = leave_type_id(db, "melahirkan")
+
+    result = _bulk(client, admin_headers, [
+        _entry("1001", tahunan, 2),
+        _entry("9999", tahunan, 1),
+        _entry("1001", 12345, 1),
+        _entry("1001", tahunan, 0),
+        _entry("1001", melahirkan, 10),
+        _entry("1002", melahirkan, 10),
+    ])
+
+    assert (result["created"], result["failed"]) == (2, 4)
+    statuses = [(r["index"], r["status"]) for r in result["results"]]
+    assert statuses == [(0, "created"), (1, "failed"), (2, "failed"), (3, "failed"), (4, "failed"), (5, "created")]
+    errors = {r["index"]: r["error"] for r in result["results"] if r["status"] == "failed"}
+    assert errors[1] == "Personnel with this NRP not found"
+    assert errors[2] == "Leave type not found or inactive"
+    assert errors[3] == "Jumlah hari must be positive"
+    assert "only available for personnel with gender 'P'" in errors[4]
+
+    created_ids = {r["leave_id"] for r in result["results"] if r["status"] == "created"}
+    assert {leave.id for leave in db.query(models.LeaveHistory).all()} == created_ids
+
+
+def test_bulk_entries_share_the_quota(db, people, client, admin_headers):
+    andi, _ = people
+    tahunan = leave_type_id(db, "cuti_tahunan")
+    balance_utils.apply_leave_delta(db, andi.id, tahunan, 2024, 5)
+    db.commit()
+
+    # 7 days left: 4 fits, the next 4 does not, 3 still does; another year has its own quota
+    result = _bulk(client, admin_headers, [
+        _entry("1001", tahunan, 4, "2024-02-01"),
+        _entry("1001", tahunan, 4, "2024-05-01"),
+        _entry("1001", tahunan, 3, "2024-08-01"),
+        _entry("1001", tahunan, 12, "2025-01-06"),
+    ])
+
+    assert [r["status"] for r in result["results"]] == ["created", "failed", "created", "created"]
+    assert result["results"][1]["error"] == (
+        "Kuota Cuti Tahunan tidak mencukupi. Sisa: 3 hari, Pengajuan: 4 hari."
+    )
+
+    db.expire_all()
+    assert balance_utils.get_used_days(db, andi.id, tahunan, 2024) == 12
+    assert balance_utils.get_used_days(db, andi.id, tahunan, 2025) == 12
+    remaining = dict(db.query(models.LeaveHistory.tanggal_mulai, models.LeaveHistory.balance_remaining).all())
+    assert remaining[date(2024, 2, 1)] == 3
+    assert remaining[date(2024, 8, 1)] == 0
+
+
+def test_bulk_rejects_empty_request(db, client, admin_headers):
+    response = client.post("/api/leaves/bulk", json={"entries": []}, headers=admin_headers)
+    assert response.status_code == 400
@@ -0,0 +1,85 @@
+import pytest
+from fastapi import HTTPException, Response
+
+from backend import models
+from backend.utils import pagination_utils
+from backend.tests.conftest import add_personnel
+
+
+def _walk(db, sort_column, descending, limit):
+    """Collect every page by following X-Next-Cursor; returns the ids in page order."""
+    ids, cursor = [], None
+    while True:
+        response = Response()
+        page = pagination_utils.paginate(
+            db.query(models.Personnel), response, sort_column, models.Personnel.id,
+            descending=descending, limit=limit, cursor=cursor
+        )
+        ids.extend(p.id for p in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+
+
+@pytest.fixture
+def roster(db):
+    # Duplicate and missing bag values exercise the (value, id) tie-break and NULL handling
+    bags = ["BAGOPS", None, "BAGSDM", "BAGSDM", None, "BAGREN", "BAGSDM", "BAGOPS", None, "BAGLOG"]
+    for i, value in enumerate(bags):
+        add_personnel(db, f"{2000 + i}", f"Personel {i:02d}", bag=value)
+    db.commit()
+    return db.query(models.Personnel.id, models.Personnel.bag).all()
+
+
+def test_cursor_roundtrip():
+    token = pagination_utils.encode_cursor("personnel.nama", True, "Budi", 42)
+    assert pagination_utils.decode_cursor(token) == ("personnel.nama", True, "Budi", 42)
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", pagination_utils.encode_cursor("a", False, "b", 1)[:-3]])
+def test_decode_cursor_rejects_garbage(token):
+    with pytest.raises(ValueError):
+        pagination_utils.decode_cursor(token)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 3, 4, 10])
+def test_keyset_pages_match_full_ordering(db, roster, descending, limit):
+    # NULLs sort first ascending and last descending, ties broken by id
+    nulls = sorted(pid for pid, value in roster if value is None)
+    values = sorted(((value, pid) for pid, value in roster if value is not None))
+    expected = nulls + [pid for _, pid in values]
+    if descending:
+        expected.reverse()
+
+    assert _walk(db, models.Personnel.bag, descending, limit) == expected
+
+
+def test_cursor_for_other_sort_is_rejected(db, roster):
+    response = Response()
+    pagination_utils.paginate(db.query(models.Personnel), response, models.Personnel.nama,
+                              models.Personnel.id, descending=False, limit=2)
+    cursor = response.headers["X-Next-Cursor"]
+
+    with pytest.raises(HTTPException) as exc:
+        pagination_utils.paginate(db.query(models.Personnel), Response(), models.Personnel.nrp,
+                                  models.Personnel.id, descending=False, limit=2, cursor=cursor)
+    assert exc.value.status_code == 400
+
+
+def test_personnel_endpoint_follows_cursor(db, roster, client, admin_headers):
+    seen = []
+    params = {"limit": 4, "sort_by": "bag", "include_total": "false"}
+    while True:
+        response = client.get("/api/personnel/", params=params, headers=admin_headers)
+        assert response.status_code == 200, response.text
+        seen.extend(p["id"] for p in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert sorted(seen) == sorted(pid for pid, _ in roster)
+    assert len(seen) == len(set(seen))
+
+    bad = client.get("/api/personnel/", params={"cursor": "garbage"}, headers=admin_headers)
+    assert bad.status_code == 400
@@ -0,0 +1,89 @@
+import io
+import json
+
+import pytest
+
+from backend import models
+from backend.utils import import_utils, reader_utils, search_utils
+
+
+class TrickleReader(io.RawIOBase):
+    """Returns at most `size` bytes per read so values straddle buffer boundaries."""
+
+    def __init__(self, data: bytes, size: int):
+        self._data = io.BytesIO(data)
+        self._size = size
+
+    def read(self, n=-1):
+        return self._data.read(self._size)
+
+
+ITEMS = [
+    {"nrp": "87120345", "nama": "Andi Saputra", "tags": ["a", "b"], "nested": {"x": [1, 2, {"y": None}]}},
+    12345678901234567890,
+    -0.5e-3,
+    "Ni Luh Putu Ayu – ñ 日本 😀",
+    True,
+    None,
+    [],
+    {},
+    "quote \" and ] bracket , comma",
+]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64 * 1024])
+def test_yields_every_element_across_read_boundaries(size):
+    data = json.dumps(ITEMS, ensure_ascii=False, indent=2).encode("utf-8")
+    assert list(reader_utils.iter_json_array(TrickleReader(data, size))) == ITEMS
+
+
+def test_bom_and_whitespace():
+    data = "﻿ \n [ 1 ,2\t,\r\n3 ] \n".encode("utf-8")
+    assert list(reader_utils.iter_json_array(TrickleReader(data, 1))) == [1, 2, 3]
+
+
+def test_number_at_buffer_edge(monkeypatch):
+    # The first read ends in the middle of 1234
+    monkeypatch.setattr(reader_utils, "JSON_READ_SIZE", 3)
+    assert list(reader_utils.iter_json_array(io.BytesIO(b"[1234,5]"))) == [1234, 5]
+
+
+def test_empty_array():
+    assert list(reader_utils.iter_json_array(io.BytesIO(b"[]"))) == []
+
+
+def test_is_lazy():
+    items = reader_utils.iter_json_array(io.BytesIO(b'[{"a": 1}, {"a": 2}, oops'))
+    assert next(items) == {"a": 1}
+    assert next(items) == {"a": 2}
+    with pytest.raises(ValueError):
+        next(items)
+
+
+@pytest.mark.parametrize("data", [b"", b"{}", b'"text"', b"[1, 2", b'[{"a": 1}', b"[1, }]"])
+def test_invalid_input_raises_value_error(data):
+    with pytest.raises(ValueError):
+        list(reader_utils.iter_json_array(io.BytesIO(data)))
+
+
+def test_json_import_in_chunks(db, monkeypatch):
+    monkeypatch.setattr(import_utils, "IMPORT_CHUNK_SIZE", 2)
+    people = [{"nrp": f"{1000 + i}", "nama": f"Personel {i}", "pangkat": "BRIPDA", "jabatan": "BAMIN"} for i in range(5)]
+    people.append({"nrp": "1000", "nama": "Personel 0 (baru)", "pangkat": "BRIPTU", "jabatan": "BAMIN"})
+
+    result = import_utils.process_json_data(io.BytesIO(json.dumps(people).encode()), db)
+
+    assert result == {"count": 6}
+    names = dict(db.query(models.Personnel.nrp, models.Personnel.nama).all())
+    assert len(names) == 5
+    assert names["1000"] == "Personel 0 (baru)"
+    matches = db.query(models.Personnel.nrp).filter(search_utils.search_filter("personel 4")).all()
+    assert matches == [("1004",)]
+
+
+def test_json_import_writes_nothing_on_invalid_input(db, monkeypatch):
+    monkeypatch.setattr(import_utils, "IMPORT_CHUNK_SIZE", 1)
+    with pytest.raises(ValueError):
+        import_utils.process_json_data(io.BytesIO(b'[{"nrp": "1000", "nama": "A"}, {"nrp": '), db)
+    db.rollback()
+    assert db.query(models.Personnel).count() == 0
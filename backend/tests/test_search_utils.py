@@ -0,0 +1,73 @@
+import pytest
+
+from backend import models
+from backend.utils import search_utils
+from backend.tests.conftest import add_personnel
+
+
+def _search(db, term):
+    rows = db.query(models.Personnel.nrp).filter(search_utils.search_filter(term)).all()
+    return sorted(nrp for nrp, in rows)
+
+
+@pytest.fixture
+def indexed(db):
+    people = [
+        add_personnel(db, "87120345", "Andi Saputra", jabatan="KASUBBAG RENMIN"),
+        add_personnel(db, "90010112", "Budi Santoso", jabatan="BAMIN"),
+        add_personnel(db, "85060771", "Sari Dewi", jabatan="PAUR SUBBAG RENMIN"),
+    ]
+    search_utils.index_personnel(db, people)
+    db.commit()
+    return people
+
+
+def test_trigrams_padding():
+    assert search_utils.trigrams("Abc") == {" ab", "abc", "bc "}
+    assert search_utils.trigrams("  ABC ", pad=False) == {"abc"}
+    assert search_utils.trigrams(None) == set()
+
+
+@pytest.mark.parametrize("term, expected", [
+    ("saputra", ["87120345"]),
+    ("SANTOSO", ["90010112"]),
+    ("  budi   santoso ", ["90010112"]),  # whitespace in the term is normalized
+    ("renmin", ["85060771", "87120345"]),
+    ("0345", ["87120345"]),
+    ("sa", ["85060771", "87120345", "90010112"]),
+    ("12", ["87120345", "90010112"]),  # short terms still match mid-value
+    ("xyz", []),
+])
+def test_search_filter_substring(db, indexed, term, expected):
+    assert _search(db, term) == expected
+
+
+def test_grams_must_come_from_one_field(db, indexed):
+    # "andi" (nama) and "bamin" (jabatan of another person) share no single field value
+    assert _search(db, "andi bamin") == []
+
+
+def test_rebuild_picks_up_unindexed_rows(db, indexed):
+    add_personnel(db, "99999999", "Wayan Sudarma")
+    db.commit()
+    assert _search(db, "sudarma") == []
+
+    assert search_utils.rebuild_search_index(db) == 4
+    assert _search(db, "sudarma") == ["99999999"]
+
+
+def test_reindex_after_rename(db, indexed):
+    andi = db.query(models.Personnel).filter(models.Personnel.nrp == "87120345").one()
+    andi.nama = "Andi Pratama"
+    search_utils.index_personnel(db, [andi])
+    db.commit()
+
+    assert _search(db, "saputra") == []
+    assert _search(db, "pratama") == ["87120345"]
+
+
+def test_personnel_endpoint_search(db, indexed, client, admin_headers):
+    response = client.get("/api/personnel/", params={"query": "Dewi"}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    assert [p["nrp"] for p in response.json()] == ["85060771"]
+    assert response.headers["X-Total-Count"] == "1"
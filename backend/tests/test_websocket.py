@@ -0,0 +1,195 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.core import websocket as ws
+
+
+class FakeSocket:
+    """Stands in for a starlette WebSocket; `block` makes sends hang like a stalled client."""
+
+    def __init__(self, block: bool = False, fail: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.block = block
+        self.fail = fail
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise ConnectionResetError("gone")
+        if self.block:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def _settle(seconds: float = 0.01):
+    await asyncio.sleep(seconds)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(ws, "WS_SEND_QUEUE_SIZE", 3)
+    manager = ws.ConnectionManager()
+    manager.coalesce_window = 0.05
+    return manager
+
+
+def test_overflow_replaces_backlog_with_resync(manager):
+    client = ws.ClientConnection(FakeSocket())
+    for i in range(3):
+        assert client.offer(f'"m{i}"')
+
+    # Full queue: the backlog becomes one resync marker
+    assert client.offer('"m3"')
+    assert client.lagging
+    assert client.queue.qsize() == 1
+    assert json.loads(client.queue.get_nowait())["type"] == "resync"
+
+    # Overflowing again while still lagging asks for the client to be dropped
+    for i in range(3):
+        assert client.offer(f'"n{i}"')
+    assert not client.offer('"n3"')
+
+
+def test_writer_clears_lagging_once_drained(manager):
+    async def scenario():
+        socket = FakeSocket()
+        await manager.connect(socket)
+        client = manager.active_connections[socket]
+        client.writer.cancel()
+        for i in range(4):
+            client.offer(json.dumps({"type": "m", "i": i}))
+        assert client.lagging
+
+        client.writer = asyncio.create_task(client.run_writer(manager.disconnect))
+        await _settle()
+        assert [m["type"] for m in socket.sent] == ["resync"]
+        assert not client.lagging
+        manager.disconnect(socket)
+
+    asyncio.run(scenario())
+
+
+def test_stalled_client_is_dropped_others_keep_receiving(manager):
+    async def scenario():
+        stalled, healthy = FakeSocket(block=True), FakeSocket()
+        await manager.connect(stalled)
+        await manager.connect(healthy)
+
+        for i in range(10):
+            await manager.broadcast({"type": "m", "i": i})
+            await _settle()
+
+        assert stalled not in manager.active_connections
+        assert stalled.closed_with == ws.LAGGING_CLOSE_CODE
+        assert [m["i"] for m in healthy.sent] == list(range(10))
+        manager.disconnect(healthy)
+
+    asyncio.run(scenario())
+
+
+def test_send_failure_closes_the_socket(manager):
+    async def scenario():
+        broken = FakeSocket(fail=True)
+        await manager.connect(broken)
+        await manager.broadcast({"type": "m"})
+        await _settle()
+
+        assert broken not in manager.active_connections
+        assert broken.closed_with == ws.LAGGING_CLOSE_CODE
+
+    asyncio.run(scenario())
+
+
+def test_burst_is_coalesced_into_one_batch(db, manager):
+    async def scenario():
+        socket = FakeSocket()
+        await manager.connect(socket)
+
+        await manager.notify_change("leaves", "create", "admin", entity_id=1)
+        await manager.notify_change("leaves", "update", "admin", entity_id=2)
+        await manager.notify_change("leaves", "update", "operator", entity_id=2)
+        await manager.notify_change("personnel", "delete", "admin", entity_id=7)
+        await _settle()
+
+        # First change of each entity goes out at once, the rest waits for the window
+        assert [(m["entity"], m["entity_id"]) for m in socket.sent] == [("leaves", 1), ("personnel", 7)]
+
+        await _settle(manager.coalesce_window * 2)
+        batch = socket.sent[2]
+        assert batch["batch"] is True
+        assert batch["count"] == 2
+        assert batch["action"] == "update"
+        assert batch["entity_ids"] == [2]
+        assert batch["username"] == "admin, operator"
+        assert len(socket.sent) == 3
+
+        # A quiet window closes the coalescing task; the next change is sent immediately again
+        await _settle(manager.coalesce_window * 2)
+        assert not manager._windows
+        await manager.notify_change("leaves", "delete", "admin", entity_id=3)
+        await _settle()
+        assert socket.sent[-1]["entity_id"] == 3
+        assert "batch" not in socket.sent[-1]
+        await manager.stop()
+        manager.disconnect(socket)
+
+    asyncio.run(scenario())
+
+
+def test_merge_reports_mixed_actions(manager):
+    changes = [
+        {"action": "create", "username": "admin", "entity_id": 1, "timestamp": "t1"},
+        {"action": "delete", "username": "admin", "entity_id": 2, "timestamp": "t2"},
+    ]
+    merged = manager._merge_changes("leaves", changes)
+    assert merged["action"] == "mixed"
+    assert merged["entity_id"] is None
+    assert merged["changes"] == [{"action": "create", "entity_id": 1}, {"action": "delete", "entity_id": 2}]
+
+
+def test_stop_flushes_pending_batch(db, manager):
+    async def scenario():
+        socket = FakeSocket()
+        await manager.connect(socket)
+        manager.coalesce_window = 60
+        await manager.notify_change("leaves", "create", "admin", entity_id=1)
+        await manager.notify_change("leaves", "create", "admin", entity_id=2)
+        await manager.notify_change("leaves", "create", "admin", entity_id=3)
+        await manager.stop()
+        await _settle()
+
+        assert [m.get("count") for m in socket.sent] == [None, 2]
+        assert socket.sent[1]["entity_ids"] == [2, 3]
+        manager.disconnect(socket)
+
+    asyncio.run(scenario())
+
+
+def test_topic_filtering(manager):
+    async def scenario():
+        everything, one_record, jobs = FakeSocket(), FakeSocket(), FakeSocket()
+        for socket in (everything, one_record, jobs):
+            await manager.connect(socket)
+        manager.subscribe(one_record, ["personnel:5"])
+        manager.subscribe(jobs, ["jobs:abc"])
+
+        await manager.broadcast({"type": "data_change", "n": 1}, ["personnel", "personnel:5"])
+        await manager.broadcast({"type": "data_change", "n": 2}, ["personnel", "personnel:6"])
+        await manager.broadcast({"type": "job_progress", "n": 3}, ["jobs:abc"], exclusive=True)
+        await _settle()
+
+        assert [m["n"] for m in everything.sent] == [1, 2]
+        assert [m["n"] for m in one_record.sent] == [1]
+        assert [m["n"] for m in jobs.sent] == [3]
+        for socket in (everything, one_record, jobs):
+            manager.disconnect(socket)
+
+    asyncio.run(scenario())
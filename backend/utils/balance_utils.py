@@ -0,0 +1,232 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, extract, func, insert, update
+from sqlalchemy.orm import Session
+from backend.models import LeaveBalance, LeaveHistory, Personnel
+from backend.utils import reference_utils
+
+# Ledger key: (personnel_id, leave_type_id, year)
+BalanceKey = Tuple[int, int, int]
+
+# Max ids per IN (...) list when loading ledger rows for many personnel
+ID_CHUNK_SIZE = 1000
+
+def apply_leave_delta(db: Session, personnel_id: int, leave_type_id: int, year: int, delta: int):
+    """
+    Add `delta` days to the ledger row for the given key, creating it if needed.
+    Does not commit - callers flush/commit together with the leave row so both stay consistent.
+    """
+    if not delta:
+        return
+
+    updated = db.query(LeaveBalance).filter(
+        LeaveBalance.personnel_id == personnel_id,
+        LeaveBalance.leave_type_id == leave_type_id,
+        LeaveBalance.year == year
+    ).update(
+        {LeaveBalance.used_days: LeaveBalance.used_days + delta},
+        synchronize_session=False
+    )
+
+    if not updated:
+        db.add(LeaveBalance(
+            personnel_id=personnel_id,
+            leave_type_id=leave_type_id,
+            year=year,
+            used_days=delta
+        ))
+        db.flush()
+
+def apply_leave_deltas(db: Session, deltas: Dict[BalanceKey, int]):
+    """
+    Set-based variant of apply_leave_delta for many keys at once: one SELECT for the
+    existing keys, one executemany of `used_days = used_days + delta` (atomic like the
+    single-row path, so concurrent writes are not lost), then a bulk INSERT for missing keys.
+    Does not commit.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    personnel_ids = {k[0] for k in deltas}
+    years = {k[2] for k in deltas}
+    existing = set(db.query(
+        LeaveBalance.personnel_id,
+        LeaveBalance.leave_type_id,
+        LeaveBalance.year
+    ).filter(
+        LeaveBalance.personnel_id.in_(personnel_ids),
+        LeaveBalance.year.in_(years)
+    ).all())
+
+    updates = [
+        {"b_personnel_id": pid, "b_leave_type_id": ltid, "b_year": year, "b_delta": delta}
+        for (pid, ltid, year), delta in deltas.items() if (pid, ltid, year) in existing
+    ]
+    if updates:
+        table = LeaveBalance.__table__
+        db.execute(
+            update(table).where(
+                table.c.personnel_id == bindparam("b_personnel_id"),
+                table.c.leave_type_id == bindparam("b_leave_type_id"),
+                table.c.year == bindparam("b_year")
+            ).values(used_days=table.c.used_days + bindparam("b_delta")),
+            updates
+        )
+
+    inserts = [
+        {"personnel_id": pid, "leave_type_id": ltid, "year": year, "used_days": delta}
+        for (pid, ltid, year), delta in deltas.items() if (pid, ltid, year) not in existing
+    ]
+    if inserts:
+        db.execute(insert(LeaveBalance.__table__), inserts)
+
+def record_leave(db: Session, leave: LeaveHistory, sign: int = 1):
+    """Apply a leave row to the ledger (sign=1 when adding, sign=-1 when removing)."""
+    apply_leave_delta(
+        db,
+        leave.personnel_id,
+        leave.leave_type_id,
+        leave.tanggal_mulai.year,
+        sign * (leave.jumlah_hari or 0)
+    )
+
+def get_used_days(db: Session, personnel_id: int, leave_type_id: int, year: int) -> int:
+    used = db.query(LeaveBalance.used_days).filter(
+        LeaveBalance.personnel_id == personnel_id,
+        LeaveBalance.leave_type_id == leave_type_id,
+        LeaveBalance.year == year
+    ).scalar()
+    return used or 0
+
+def get_usage_by_type(db: Session, personnel_id: int, year: int) -> Dict[int, int]:
+    """Returns {leave_type_id: used_days} for one personnel in a year."""
+    rows = db.query(LeaveBalance.leave_type_id, LeaveBalance.used_days).filter(
+        LeaveBalance.personnel_id == personnel_id,
+        LeaveBalance.year == year
+    ).all()
+    return {leave_type_id: used or 0 for leave_type_id, used in rows}
+
+def get_used_days_map(db: Session, keys: Iterable[BalanceKey]) -> Dict[BalanceKey, int]:
+    """Resolve many ledger keys with a single query. Missing keys map to 0."""
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    personnel_ids = {k[0] for k in keys}
+    years = {k[2] for k in keys}
+    rows = db.query(
+        LeaveBalance.personnel_id,
+        LeaveBalance.leave_type_id,
+        LeaveBalance.year,
+        LeaveBalance.used_days
+    ).filter(
+        LeaveBalance.personnel_id.in_(personnel_ids),
+        LeaveBalance.year.in_(years)
+    ).all()
+
+    found = {(pid, ltid, year): used or 0 for pid, ltid, year, used in rows}
+    return {key: found.get(key, 0) for key in keys}
+
+def compute_balances(
+    db: Session,
+    personnel_ids: Sequence[int],
+    year: Optional[int] = None,
+    genders: Optional[Dict[int, Optional[str]]] = None
+) -> Dict[int, Dict[str, Dict[str, int]]]:
+    """
+    Remaining balances for many personnel at once:
+    {personnel_id: {"Type": {"remaining": 5, "used": 7, "quota": 12}}}
+
+    Usage comes from one grouped ledger query (chunked IN lists) and is pivoted into a
+    personnel x leave type matrix; remaining days and gender applicability are computed
+    on whole arrays. `genders` ({personnel_id: jenis_kelamin}) saves a lookup when the
+    caller already has the rows.
+    """
+    if year is None:
+        year = datetime.now().year
+    personnel_ids = list(dict.fromkeys(personnel_ids))
+    if not personnel_ids:
+        return {}
+
+    leave_types = sorted(reference_utils.leave_types(db), key=lambda lt: lt.id)
+    if not leave_types:
+        return {pid: {} for pid in personnel_ids}
+
+    if genders is None:
+        genders = {}
+        for i in range(0, len(personnel_ids), ID_CHUNK_SIZE):
+            chunk = personnel_ids[i:i + ID_CHUNK_SIZE]
+            genders.update(db.query(Personnel.id, Personnel.jenis_kelamin).filter(Personnel.id.in_(chunk)).all())
+
+    usage_rows = []
+    for i in range(0, len(personnel_ids), ID_CHUNK_SIZE):
+        chunk = personnel_ids[i:i + ID_CHUNK_SIZE]
+        usage_rows.extend(db.query(
+            LeaveBalance.personnel_id,
+            LeaveBalance.leave_type_id,
+            func.sum(LeaveBalance.used_days)
+        ).filter(
+            LeaveBalance.personnel_id.in_(chunk),
+            LeaveBalance.year == year
+        ).group_by(LeaveBalance.personnel_id, LeaveBalance.leave_type_id).all())
+
+    type_ids = [lt.id for lt in leave_types]
+    type_names = [lt.name for lt in leave_types]
+    quotas = np.array([lt.default_quota or 0 for lt in leave_types], dtype=np.int64)
+
+    # personnel x leave type matrix of used days
+    usage = pd.DataFrame(usage_rows, columns=["personnel_id", "leave_type_id", "used"])
+    used = usage.pivot_table(index="personnel_id", columns="leave_type_id", values="used", aggfunc="sum")\
+        .reindex(index=personnel_ids, columns=type_ids)\
+        .fillna(0).to_numpy(dtype=np.int64)
+    remaining = np.maximum(quotas - used, 0)
+
+    # Leave type applies when it is not gender specific or matches the personnel's gender
+    person_gender = np.array([genders.get(pid) for pid in personnel_ids], dtype=object)
+    type_gender = np.array([lt.gender_specific for lt in leave_types], dtype=object)
+    applicable = pd.isna(type_gender)[np.newaxis, :] | (person_gender[:, np.newaxis] == type_gender[np.newaxis, :])
+
+    result = {}
+    for row, pid in enumerate(personnel_ids):
+        result[pid] = {
+            type_names[col]: {
+                "remaining": int(remaining[row, col]),
+                "quota": int(quotas[col]),
+                "used": int(used[row, col])
+            }
+            for col in np.flatnonzero(applicable[row])
+        }
+    return result
+
+def rebuild_balances(db: Session) -> int:
+    """
+    Recompute the whole ledger from leave_history.
+    Used for backfilling existing databases and repairing drift. Returns number of ledger rows.
+    """
+    year_col = extract('year', LeaveHistory.tanggal_mulai)
+    rows = db.query(
+        LeaveHistory.personnel_id,
+        LeaveHistory.leave_type_id,
+        year_col.label('year'),
+        func.sum(LeaveHistory.jumlah_hari)
+    ).filter(
+        LeaveHistory.personnel_id != None,
+        LeaveHistory.leave_type_id != None,
+        LeaveHistory.tanggal_mulai != None
+    ).group_by(LeaveHistory.personnel_id, LeaveHistory.leave_type_id, year_col).all()
+
+    totals = defaultdict(int)
+    for pid, ltid, year, used in rows:
+        totals[(pid, ltid, int(year))] += used or 0
+
+    db.query(LeaveBalance).delete(synchronize_session=False)
+    db.bulk_insert_mappings(LeaveBalance, [
+        {"personnel_id": pid, "leave_type_id": ltid, "year": year, "used_days": used}
+        for (pid, ltid, year), used in totals.items()
+    ])
+    db.commit()
+    return len(totals)
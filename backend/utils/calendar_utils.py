@@ -0,0 +1,125 @@
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+from backend.models import LeaveChange, LeaveHistory, LeaveType, Personnel
+from backend.utils import leave_utils
+
+# Feed rows older than this are pruned; clients with an older token get the full window
+CHANGE_RETENTION_DAYS = 30
+
+# Ids are allocated at insert but transactions can commit out of order (InnoDB), so a
+# change with an id just below a client's token may become visible after the client
+# read it. Incremental reads re-send this many ids below `since`; upserts and removals
+# are idempotent, so the overlap is harmless.
+FEED_REREAD_IDS = 100
+
+def record_leaves(db: Session, leaves: Iterable[LeaveHistory]):
+    """
+    Append the given leaves to the change feed.
+    Does not commit - call in the same transaction as the leave write.
+    """
+    leaves = list(leaves)
+    if any(leave.id is None for leave in leaves):
+        db.flush()
+    if leaves:
+        db.bulk_insert_mappings(LeaveChange, [{"leave_id": leave.id} for leave in leaves])
+
+def record_personnel(db: Session, personnel_ids: Iterable[int]):
+    """Append every leave of the given personnel (e.g. after a rename or before a delete)."""
+    personnel_ids = list(personnel_ids)
+    if not personnel_ids:
+        return
+    db.execute(insert(LeaveChange).from_select(
+        ["leave_id"],
+        select(LeaveHistory.id).where(LeaveHistory.personnel_id.in_(personnel_ids))
+    ))
+
+def record_reset(db: Session):
+    """Tell calendar clients to refetch their whole window (bulk changes, leave type renames)."""
+    db.add(LeaveChange(leave_id=None))
+
+def prune_changes(db: Session, retention_days: int = CHANGE_RETENTION_DAYS) -> int:
+    """
+    Delete feed rows older than `retention_days`, always keeping the newest row so the
+    version token never goes back. Returns the number of rows deleted. Commits.
+    """
+    latest = current_version(db)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = db.query(LeaveChange).filter(
+        LeaveChange.changed_at < cutoff,
+        LeaveChange.id < latest
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def current_version(db: Session) -> int:
+    return db.query(func.max(LeaveChange.id)).scalar() or 0
+
+def parse_version(token: Optional[str]) -> Optional[int]:
+    if token is None or token == "":
+        return None
+    try:
+        return int(token)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid version token")
+
+def window_query(db: Session, start: date, end: date):
+    """Projected rows for leaves overlapping [start, end], with names resolved in the same query."""
+    return db.query(
+        LeaveHistory.id,
+        Personnel.nama,
+        LeaveType.name,
+        LeaveType.color,
+        LeaveHistory.tanggal_mulai,
+        LeaveHistory.tanggal_selesai,
+        LeaveHistory.jumlah_hari
+    ).outerjoin(Personnel, Personnel.id == LeaveHistory.personnel_id)\
+     .outerjoin(LeaveType, LeaveType.id == LeaveHistory.leave_type_id)\
+     .filter(leave_utils.overlapping(start, end))\
+     .order_by(LeaveHistory.tanggal_mulai, LeaveHistory.id)
+
+def to_entries(rows) -> list:
+    return [
+        {
+            "id": leave_id,
+            "personnel_name": nama or "Unknown",
+            "leave_type": type_name or "Cuti",
+            "start_date": start,
+            "end_date": end or leave_utils.compute_end_date(start, days),
+            "color": color or "blue"
+        }
+        for leave_id, nama, type_name, color, start, end, days in rows
+    ]
+
+def get_feed(db: Session, start: date, end: date, since: Optional[int] = None) -> dict:
+    """
+    Calendar entries for [start, end].
+
+    Without `since` (or when it cannot be served incrementally) the whole window is returned
+    with full=True. Otherwise only leaves changed after `since` are returned: `leaves` holds
+    entries to upsert and `removed` the ids to drop (deleted or moved out of the window).
+    """
+    # Read the version first: anything committed while we query is re-sent next time
+    version = current_version(db)
+    feed = {"version": str(version), "full": True, "leaves": [], "removed": []}
+
+    # Changes after `since` may have been pruned when it is older than the oldest row kept
+    oldest = db.query(func.min(LeaveChange.id)).scalar() or 0
+    if since is not None and oldest - 1 <= since <= version:
+        changed = db.query(LeaveChange.id, LeaveChange.leave_id)\
+            .filter(LeaveChange.id > since - FEED_REREAD_IDS).all()
+        changed_ids = {leave_id for _, leave_id in changed if leave_id is not None}
+        # Only a reset marker the client has not seen yet forces a full reload
+        reset = any(leave_id is None and change_id > since for change_id, leave_id in changed)
+        if not reset:
+            feed["full"] = False
+            if changed_ids:
+                rows = window_query(db, start, end).filter(LeaveHistory.id.in_(changed_ids)).all()
+                feed["leaves"] = to_entries(rows)
+                feed["removed"] = sorted(changed_ids - {entry["id"] for entry in feed["leaves"]})
+            return feed
+
+    feed["leaves"] = to_entries(window_query(db, start, end).all())
+    return feed
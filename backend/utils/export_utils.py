@@ -0,0 +1,47 @@
+import os
+import tempfile
+from typing import Iterable, List, Sequence
+import xlsxwriter
+
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_BATCH_SIZE = 1000
+
+def write_xlsx(rows: Iterable[Sequence], columns: List[str], sheet_name: str) -> str:
+    """
+    Write rows to a temporary .xlsx file using xlsxwriter's constant_memory mode.
+
+    Rows are flushed to disk one at a time, so memory stays flat regardless of the
+    number of rows. Returns the path of the finished file; the caller is responsible
+    for removing it (e.g. via a response background task).
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        worksheet = workbook.add_worksheet(sheet_name)
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+
+        worksheet.write_row(0, 0, columns, header_format)
+        for row_idx, row in enumerate(rows, 1):
+            worksheet.write_row(row_idx, 0, row)
+
+        workbook.close()
+    except Exception:
+        os.remove(path)
+        raise
+
+    return path
+
+def iter_file(path: str, chunk_size: int = 64 * 1024):
+    """Yield a file in chunks and delete it once fully sent (or the client goes away)."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
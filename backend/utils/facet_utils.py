@@ -0,0 +1,103 @@
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from backend.models import Personnel
+from backend.core import cache
+
+load_dotenv()
+
+FACET_FIELDS = ("pangkat", "jabatan", "bag")
+
+# Upper bound on drift when several workers update a shared cache concurrently
+FACETS_TTL_SECONDS = int(os.getenv("FACETS_TTL_SECONDS", 3600))
+
+_KEY = "personnel_facets"
+_lock = threading.Lock()
+
+# Patched in place by apply_changes, so other workers must drop their copy on a personnel change
+cache.register_local_key("personnel", _KEY)
+
+# Facet values of one personnel before/after a write; None = row did not exist / was deleted
+Snapshot = Optional[Dict[str, Optional[str]]]
+
+def snapshot(personnel) -> Dict[str, Optional[str]]:
+    return {field: getattr(personnel, field) for field in FACET_FIELDS}
+
+def _compute(db: Session) -> dict:
+    facets = {"total": db.query(func.count(Personnel.id)).scalar() or 0}
+    for field in FACET_FIELDS:
+        column = getattr(Personnel, field)
+        rows = db.query(column, func.count(Personnel.id)).filter(column != None).group_by(column).all()
+        facets[field] = {value: count for value, count in rows if value}
+    return facets
+
+def get_facets(db: Session) -> dict:
+    """
+    {"total": n, "pangkat": {value: count}, "jabatan": {...}, "bag": {...}}, computed with
+    one GROUP BY per facet on a miss and kept up to date by apply_changes afterwards.
+    """
+    facets = cache.backend.get(_KEY)
+    if facets is None:
+        with _lock:
+            facets = cache.backend.get(_KEY)
+            if facets is None:
+                facets = _compute(db)
+                cache.backend.set(_KEY, facets, FACETS_TTL_SECONDS)
+    return facets
+
+def get_total(db: Session) -> int:
+    return get_facets(db)["total"]
+
+def new_delta() -> dict:
+    return {"total": 0, **{field: {} for field in FACET_FIELDS}}
+
+def add_changes(delta: dict, changes: Iterable[Tuple[Snapshot, Snapshot]]) -> dict:
+    """Fold (before, after) snapshots into a net delta (size bounded by distinct values, not rows)."""
+    for before, after in changes:
+        if before == after:
+            continue
+        if before is None:
+            delta["total"] += 1
+        if after is None:
+            delta["total"] -= 1
+        for field in FACET_FIELDS:
+            old = before.get(field) if before else None
+            new = after.get(field) if after else None
+            if old == new:
+                continue
+            if old:
+                delta[field][old] = delta[field].get(old, 0) - 1
+            if new:
+                delta[field][new] = delta[field].get(new, 0) + 1
+    return delta
+
+def apply_delta(delta: dict):
+    """
+    Add a net delta to the cached facets. Call after commit.
+    Nothing happens when the cache is cold - the next read recomputes it.
+    """
+    if not delta["total"] and not any(any(delta[field].values()) for field in FACET_FIELDS):
+        return
+    with _lock:
+        facets = cache.backend.get(_KEY)
+        if facets is None:
+            return
+        # Copy first: the in-process backend hands out the stored dict itself
+        facets = {"total": facets["total"] + delta["total"], **{field: dict(facets[field]) for field in FACET_FIELDS}}
+        for field in FACET_FIELDS:
+            counts = facets[field]
+            for value, change in delta[field].items():
+                counts[value] = counts.get(value, 0) + change
+                if counts[value] <= 0:
+                    del counts[value]
+        cache.backend.set(_KEY, facets, FACETS_TTL_SECONDS)
+
+def apply_changes(changes: Iterable[Tuple[Snapshot, Snapshot]]):
+    """Adjust the cached facets for committed writes, given (before, after) snapshots."""
+    apply_delta(add_changes(new_delta(), changes))
+
+def invalidate():
+    cache.backend.delete(_KEY)
@@ -1,125 +1,521 @@
+import io
+import json
+import os
+import time
+import uuid
 import pandas as pd
-import re
-from backend.models import Personnel
+from datetime import datetime
+from itertools import islice
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional
+from backend.models import Personnel, User
+from backend.core import cache
+from backend.core.auth import hash_passwords
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from backend.utils import search_utils, calendar_utils, reader_utils, facet_utils
 
-def process_excel_file(file_path: str, db: Session):
-    print(f"Reading Excel file: {file_path}")
-    try:
-        # Force NRP to string to preserve leading zeros
-        df = pd.read_excel(file_path, header=None, dtype=str)
-    except Exception as e:
-        raise ValueError(f"Failed to read Excel file: {str(e)}")
-    
-    header_idx = -1
-    for i, row in df.iterrows():
-        row_values = [str(x).upper() for x in row.values]
-        # Check for core columns: NO, NAMA, PANGKAT, NRP (flexible match)
-        if "NO" in row_values and "NAMA" in row_values and any("NRP" in str(x) for x in row_values):
-            header_idx = i
-            print(f"Header found at row {i}")
-            break
-            
-    if header_idx == -1:
-        # Fallback: Try header=0 directly if standard format
-        try:
-             if "NAMA" in [str(x).upper() for x in df.iloc[0].values]:
-                header_idx = 0
-        except:
-             pass
-             
-        if header_idx == -1:
-             raise ValueError("Could not find header row with 'NO', 'NAMA', and 'NRP'")
-
-    df.columns = df.iloc[header_idx]
-    df = df[header_idx+1:]
-    
-    # Column mapping
+# progress(**counters) hook used by background import jobs
+Progress = Optional[Callable[..., None]]
+
+# How long a dry-run preview can be applied without uploading the file again
+PREVIEW_TTL_SECONDS = int(os.getenv("IMPORT_PREVIEW_TTL_SECONDS", 1800))
+
+# Previews are files next to the uploads, so every worker on the host can apply them
+PREVIEW_DIR = os.path.join("uploads", "previews")
+
+# Rows per streamed chunk, IN (...) lookup and bulk write statement
+IMPORT_CHUNK_SIZE = 1000
+
+# Rows scanned for the header before falling back to the first row
+HEADER_SCAN_ROWS = 50
+
+# Change details kept for the import response; counts in stats are always complete
+MAX_IMPORT_DETAILS = 10000
+
+PERSONNEL_FIELDS = ["nrp", "nama", "pangkat", "jabatan", "bag", "jenis_kelamin"]
+
+# Fields compared for the change report: (column, label, only compared when the file has a value)
+DIFF_FIELDS = [
+    ("nama", "Nama", False),
+    ("pangkat", "Pangkat", False),
+    ("jabatan", "Jabatan", False),
+    ("bag", "Bagian", True),
+    ("jenis_kelamin", "Jenis Kelamin", True),
+]
+
+def _is_header(values: List[str]) -> bool:
+    """Header row: contains NO, NAMA and an NRP column (values already upper-cased)."""
+    return "NO" in values and "NAMA" in values and any("NRP" in v for v in values)
+
+def _map_columns(header) -> Dict[str, int]:
+    """Map roster fields to column positions from the header labels."""
     col_map = {}
-    for col in df.columns:
+    for idx, col in enumerate(header):
         c_str = str(col).upper().strip()
-        if "NO" == c_str: col_map['no'] = col
-        elif "NAMA" in c_str: col_map['nama'] = col
-        elif "PANGKAT" in c_str: col_map['pangkat'] = col
-        elif "NRP" in c_str: col_map['nrp'] = col
-        elif "JABATAN" in c_str: col_map['jabatan'] = col
-        elif "BAG" in c_str or "BAGIAN" in c_str: col_map['bag'] = col
-        elif "KELAMIN" in c_str or "JK" in c_str: col_map['jenis_kelamin'] = col
-        
+        if "NO" == c_str: col_map['no'] = idx
+        elif "NAMA" in c_str: col_map['nama'] = idx
+        elif "PANGKAT" in c_str: col_map['pangkat'] = idx
+        elif "NRP" in c_str: col_map['nrp'] = idx
+        elif "JABATAN" in c_str: col_map['jabatan'] = idx
+        elif "BAG" in c_str or "BAGIAN" in c_str: col_map['bag'] = idx
+        elif "KELAMIN" in c_str or "JK" in c_str: col_map['jenis_kelamin'] = idx
+    return col_map
+
+def _clean_text(series: pd.Series, empty_as_none: bool = False) -> pd.Series:
+    """Strip values and turn NaN/'nan' into "" (or None for optional columns)."""
+    cleaned = series.fillna("").astype(str).str.strip()
+    cleaned = cleaned.mask(cleaned.str.lower() == "nan", "")
+    if empty_as_none:
+        cleaned = cleaned.astype(object).mask(cleaned == "", None)
+    return cleaned
+
+def open_roster(file_path: str) -> Iterator[list]:
+    """Row iterator for a roster file: CSV by extension, otherwise a (read-only) workbook."""
+    if file_path.lower().endswith(".csv"):
+        return reader_utils.iter_csv_rows(file_path)
+    return reader_utils.iter_xlsx_rows(file_path)
+
+def iter_roster_chunks(rows: Iterable[list], chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Turn raw roster rows into normalized DataFrames of at most `chunk_size` rows.
+    Rows above the header are skipped; NRPs already seen in an earlier chunk are dropped
+    (first wins), so only the NRP set grows with the file size.
+    """
+    rows = iter(rows)
+    scanned = []
+    header = None
+    for row in rows:
+        scanned.append(row)
+        if _is_header([str(v).upper() if v is not None else "" for v in row]):
+            print(f"Header found at row {len(scanned) - 1}")
+            header = row
+            scanned = []
+            break
+        if len(scanned) >= HEADER_SCAN_ROWS:
+            break
+
+    if header is None:
+        # Fallback: Try the first row directly if standard format
+        if scanned and "NAMA" in [str(v).upper() for v in scanned[0]]:
+            header, scanned = scanned[0], scanned[1:]
+        else:
+            raise ValueError("Could not find header row with 'NO', 'NAMA', and 'NRP'")
+
+    col_map = _map_columns(header)
     print(f"Column Mapping: {col_map}")
-    
-    seen_nrps = set()
+    width = len(header)
+    seen = set()
+
+    def normalize(batch):
+        df = pd.DataFrame([(list(r) + [None] * width)[:width] for r in batch], columns=range(width))
+        chunk = normalize_rows(df, col_map)
+        chunk = chunk[~chunk["nrp"].isin(seen)].reset_index(drop=True)
+        seen.update(chunk["nrp"])
+        return chunk
+
+    batch = list(scanned)
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield normalize(batch)
+            batch = []
+    if batch:
+        yield normalize(batch)
+
+def parse_excel(file_path: str) -> pd.DataFrame:
+    """
+    Read a whole roster (XLSX or CSV) into one normalized row per NRP with PERSONNEL_FIELDS
+    columns. Used by previews, which have to keep every row anyway.
+    """
+    chunks = list(iter_roster_chunks(open_roster(file_path)))
+    if not chunks:
+        return pd.DataFrame(columns=PERSONNEL_FIELDS)
+    return pd.concat(chunks, ignore_index=True)
+
+def normalize_rows(df: pd.DataFrame, col_map: Dict[str, object]) -> pd.DataFrame:
+    """Vectorized cleaning of raw roster rows into PERSONNEL_FIELDS columns, deduplicated on NRP."""
+    if 'nrp' not in col_map:
+        raise ValueError("Could not find an NRP column")
+
+    def column(key):
+        return df[col_map[key]] if key in col_map else pd.Series(None, index=df.index, dtype=object)
+
+    nrp_raw = column('nrp')
+    # Skip purely empty rows and rows without an NRP
+    keep = ~(nrp_raw.isna() & column('nama').isna())
+    nrp = _clean_text(nrp_raw).str.replace(r'[^0-9]', '', regex=True)
+    keep &= nrp != ""
+
+    rows = pd.DataFrame({
+        "nrp": nrp,
+        "nama": _clean_text(column('nama')),
+        "pangkat": _clean_text(column('pangkat')),
+        "jabatan": _clean_text(column('jabatan')),
+        "bag": _clean_text(column('bag'), empty_as_none=True),
+        "jenis_kelamin": _clean_text(column('jenis_kelamin'), empty_as_none=True),
+    })[keep]
+
+    return rows.drop_duplicates(subset="nrp", keep="first").reset_index(drop=True)
+
+def load_existing(db: Session, nrps: List[str]) -> pd.DataFrame:
+    """Existing personnel for the given NRPs, loaded with chunked IN queries."""
+    columns = [Personnel.id] + [getattr(Personnel, f) for f in PERSONNEL_FIELDS]
+    found = []
+    for i in range(0, len(nrps), IMPORT_CHUNK_SIZE):
+        chunk = nrps[i:i + IMPORT_CHUNK_SIZE]
+        found.extend(db.query(*columns).filter(Personnel.nrp.in_(chunk)).all())
+    return pd.DataFrame(found, columns=["id"] + PERSONNEL_FIELDS)
+
+def compute_diff(db: Session, rows: pd.DataFrame) -> dict:
+    """
+    Compare normalized rows against the database without writing anything.
+    Returns {"inserts": [...], "updates": [...], "stats": {...}, "details": [...], "facet_changes": [...]}
+    where inserts/updates are plain dicts ready for apply_diff and facet_changes holds
+    [before, after] facet values for facet_utils.apply_changes.
+    """
+    existing = load_existing(db, rows["nrp"].tolist())
+    merged = rows.merge(existing, on="nrp", how="left", suffixes=("", "_old"))
+    is_new = merged["id"].isna()
+
+    # Field-level change masks for existing rows
+    changed = {}
+    for field, _, optional in DIFF_FIELDS:
+        mask = ~is_new & (merged[field] != merged[f"{field}_old"])
+        if optional:
+            mask &= merged[field].notna()
+        changed[field] = mask
+    is_changed = pd.concat(changed.values(), axis=1).any(axis=1) if changed else ~is_new
+
+    stats = {
+        "added": int(is_new.sum()),
+        "updated": int(is_changed.sum()),
+        "skipped": int((~is_new & ~is_changed).sum()),
+        "total": len(merged)
+    }
+
+    inserts, updates, details, facet_changes = [], [], [], []
+    records = merged.astype(object).where(merged.notna(), None).to_dict("records")
+    new_flags = is_new.tolist()
+    changed_flags = is_changed.tolist()
+    changed_fields = {field: mask.tolist() for field, mask in changed.items()}
+
+    for i, rec in enumerate(records):
+        if new_flags[i]:
+            inserts.append({f: rec[f] for f in PERSONNEL_FIELDS})
+            facet_changes.append([None, {f: rec[f] for f in facet_utils.FACET_FIELDS}])
+            details.append({"type": "added", "nrp": rec["nrp"], "nama": rec["nama"], "pangkat": rec["pangkat"], "jabatan": rec["jabatan"]})
+        elif changed_flags[i]:
+            update = {"id": int(rec["id"]), "nrp": rec["nrp"], "nama": rec["nama"], "pangkat": rec["pangkat"], "jabatan": rec["jabatan"]}
+            # Optional columns are only overwritten when the file has a value
+            if rec["bag"]: update["bag"] = rec["bag"]
+            if rec["jenis_kelamin"]: update["jenis_kelamin"] = rec["jenis_kelamin"]
+            updates.append(update)
+            facet_changes.append([
+                {f: rec[f"{f}_old"] for f in facet_utils.FACET_FIELDS},
+                {f: update.get(f, rec[f"{f}_old"]) for f in facet_utils.FACET_FIELDS}
+            ])
+            details.append({
+                "type": "updated",
+                "nrp": rec["nrp"],
+                "nama": rec["nama"],
+                "changes": [
+                    {"field": label, "old": rec[f"{field}_old"], "new": rec[field]}
+                    for field, label, _ in DIFF_FIELDS if changed_fields[field][i]
+                ]
+            })
+
+    return {"inserts": inserts, "updates": updates, "stats": stats, "details": details, "facet_changes": facet_changes}
+
+def _write_mysql(db: Session, diff: dict, now: datetime):
+    """Single-statement upserts on MySQL: INSERT ... ON DUPLICATE KEY UPDATE keyed on the unique NRP."""
+    from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+    table = Personnel.__table__
+    rows = [{**r, "created_at": now} for r in diff["inserts"]] + [
+        {"nrp": u["nrp"], "nama": u["nama"], "pangkat": u["pangkat"], "jabatan": u["jabatan"],
+         "bag": u.get("bag"), "jenis_kelamin": u.get("jenis_kelamin"), "created_at": now}
+        for u in diff["updates"]
+    ]
+    for i in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        stmt = mysql_insert(table).values(rows[i:i + IMPORT_CHUNK_SIZE])
+        stmt = stmt.on_duplicate_key_update(
+            nama=stmt.inserted.nama,
+            pangkat=stmt.inserted.pangkat,
+            jabatan=stmt.inserted.jabatan,
+            bag=func.coalesce(stmt.inserted.bag, table.c.bag),
+            jenis_kelamin=func.coalesce(stmt.inserted.jenis_kelamin, table.c.jenis_kelamin)
+        )
+        db.execute(stmt)
+
+def _write_generic(db: Session, diff: dict, now: datetime):
+    inserts = [{**r, "created_at": now} for r in diff["inserts"]]
+    for i in range(0, len(inserts), IMPORT_CHUNK_SIZE):
+        db.bulk_insert_mappings(Personnel, inserts[i:i + IMPORT_CHUNK_SIZE])
+    for i in range(0, len(diff["updates"]), IMPORT_CHUNK_SIZE):
+        db.bulk_update_mappings(Personnel, diff["updates"][i:i + IMPORT_CHUNK_SIZE])
+
+def write_diff(db: Session, diff: dict, progress: Progress = None, written: int = 0) -> int:
+    """
+    Write a computed diff in bulk and refresh the search index for touched rows.
+    Does not commit. Returns the running count of written rows (starting from `written`).
+    """
+    now = datetime.utcnow()
+    if db.get_bind().dialect.name == "mysql":
+        _write_mysql(db, diff, now)
+    else:
+        _write_generic(db, diff, now)
+    db.flush()
+
+    touched = [r["nrp"] for r in diff["inserts"]] + [u["nrp"] for u in diff["updates"]]
+    for i in range(0, len(touched), IMPORT_CHUNK_SIZE):
+        chunk = db.query(Personnel).filter(Personnel.nrp.in_(touched[i:i + IMPORT_CHUNK_SIZE])).all()
+        search_utils.index_personnel(db, chunk)
+        if progress:
+            progress(written=written + min(i + IMPORT_CHUNK_SIZE, len(touched)))
+    return written + len(touched)
+
+def apply_diff(db: Session, diff: dict, progress: Progress = None):
+    """Write a computed diff and commit it."""
+    write_diff(db, diff, progress)
+    if diff["updates"]:
+        # Renames show up on calendar entries
+        calendar_utils.record_reset(db)
+    db.commit()
+    facet_utils.apply_changes(diff["facet_changes"])
+
+def process_excel_file(file_path: str, db: Session, progress: Progress = None):
+    """
+    Stream a roster (XLSX or CSV) into the database chunk by chunk, in one transaction.
+    Memory stays bounded by the chunk size; only the first MAX_IMPORT_DETAILS change
+    details are kept for the response.
+    """
     stats = {"added": 0, "updated": 0, "skipped": 0, "total": 0}
     details = []
-    
-    for index, row in df.iterrows():
-        # Validation: 'NO' must be present/numeric-ish or 'NRP' present
-        # Skip purely empty rows
-        if pd.isna(row[col_map.get('nrp', '')]) and pd.isna(row[col_map.get('nama', '')]):
-            continue
-            
-        nrp_raw = str(row[col_map.get('nrp')]).strip()
-        if not nrp_raw or nrp_raw.lower() == 'nan':
-            continue
-            
-        # Clean NRP
-        nrp = re.sub(r'[^0-9]', '', nrp_raw)
-        if not nrp: continue
-
-        if nrp in seen_nrps: continue
-        seen_nrps.add(nrp)
-        
-        nama = str(row[col_map.get('nama')]).strip()
-        pangkat = str(row[col_map.get('pangkat')]).strip()
-        pangkat = str(row[col_map.get('pangkat')]).strip()
-        jabatan = str(row[col_map.get('jabatan')]).strip()
-        bag = str(row[col_map.get('bag')]).strip() if 'bag' in col_map else None
-        jk = str(row[col_map.get('jenis_kelamin')]).strip() if 'jenis_kelamin' in col_map else None
-
-        # Clean NaNs
-        if nama.lower() == 'nan': nama = ""
-        if pangkat.lower() == 'nan': pangkat = ""
-        if jabatan.lower() == 'nan': jabatan = ""
-        if bag and (bag.lower() == 'nan' or bag == ''): bag = None
-        if jk and (jk.lower() == 'nan' or jk == ''): jk = None
-        
-        existing = db.query(Personnel).filter(Personnel.nrp == nrp).first()
-        
-        if existing:
-            changes = []
-            if existing.nama != nama: changes.append({"field": "Nama", "old": existing.nama, "new": nama})
-            if existing.pangkat != pangkat: changes.append({"field": "Pangkat", "old": existing.pangkat, "new": pangkat})
-            if existing.jabatan != jabatan: changes.append({"field": "Jabatan", "old": existing.jabatan, "new": jabatan})
-            if bag and existing.bag != bag: changes.append({"field": "Bagian", "old": existing.bag, "new": bag})
-            if jk and existing.jenis_kelamin != jk: changes.append({"field": "Jenis Kelamin", "old": existing.jenis_kelamin, "new": jk})
-            
-            if changes:
-                existing.nama = nama
-                existing.nama = nama
-                existing.pangkat = pangkat
-                existing.jabatan = jabatan
-                if bag: existing.bag = bag
-                if jk: existing.jenis_kelamin = jk
-                
-                stats["updated"] += 1
-                details.append({"type": "updated", "nrp": nrp, "nama": nama, "changes": changes})
-            else:
-                stats["skipped"] += 1
-        else:
-            new_p = Personnel(
-                nrp=nrp,
-                nama=nama,
-                pangkat=pangkat,
-                jabatan=jabatan,
-                bag=bag,
-                jenis_kelamin=jk
-            )
-            db.add(new_p)
-            stats["added"] += 1
-            details.append({"type": "added", "nrp": nrp, "nama": nama, "pangkat": pangkat, "jabatan": jabatan})
-            
-        stats["total"] += 1
+    facet_delta = facet_utils.new_delta()
+    written = 0
 
+    for rows in iter_roster_chunks(open_roster(file_path)):
+        diff = compute_diff(db, rows)
+        for key in stats:
+            stats[key] += diff["stats"][key]
+        details.extend(diff["details"][:MAX_IMPORT_DETAILS - len(details)])
+        facet_utils.add_changes(facet_delta, diff["facet_changes"])
+        if progress:
+            progress(parsed=stats["total"], added=stats["added"], updated=stats["updated"], skipped=stats["skipped"])
+        written = write_diff(db, diff, progress, written)
+
+    if stats["updated"]:
+        # Renames show up on calendar entries
+        calendar_utils.record_reset(db)
     db.commit()
+    facet_utils.apply_delta(facet_delta)
+
     print(f"Import finished. Stats: {stats}")
-    return {"stats": stats, "details": details}
+    result = {"stats": stats, "details": details}
+    if stats["added"] + stats["updated"] > len(details):
+        result["details_truncated"] = True
+    return result
+
+def _personnel_version() -> str:
+    # In-process versions are only comparable within the process that read them
+    if isinstance(cache.backend, cache.MemoryCacheBackend):
+        return f"{os.getpid()}:{cache.get_version('personnel')}"
+    return str(cache.get_version("personnel"))
+
+def _preview_path(token: str) -> str:
+    return os.path.join(PREVIEW_DIR, f"{token}.json")
+
+def _purge_expired_previews():
+    cutoff = time.time() - PREVIEW_TTL_SECONDS
+    for name in os.listdir(PREVIEW_DIR):
+        path = os.path.join(PREVIEW_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def create_preview(file_path: str, db: Session, username: str) -> dict:
+    """
+    Dry run of process_excel_file: parse and diff without writing anything.
+    The parsed rows and the diff are stored under a token for apply_preview.
+    """
+    # Read the version before diffing so a concurrent change always forces a re-diff on apply
+    version = _personnel_version()
+    rows = parse_excel(file_path)
+    diff = compute_diff(db, rows)
+
+    os.makedirs(PREVIEW_DIR, exist_ok=True)
+    _purge_expired_previews()
+    token = uuid.uuid4().hex
+    path = _preview_path(token)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "username": username,
+            "version": version,
+            "rows": rows.to_dict("records"),
+            "diff": diff
+        }, f, default=str)
+    os.replace(f"{path}.tmp", path)
+    return {"token": token, "expires_in": PREVIEW_TTL_SECONDS, "stats": diff["stats"], "details": diff["details"]}
+
+def claim_preview(token: str, username: str) -> Optional[dict]:
+    """
+    Take a preview out of the store so it can be applied exactly once.
+    Returns None when it does not exist, expired, belongs to another user
+    or was already claimed by a concurrent request.
+    """
+    if not token.isalnum():
+        return None
+    path = _preview_path(token)
+    claimed = f"{path}.{uuid.uuid4().hex}.claimed"
+    try:
+        # rename is atomic: of two concurrent claims only one finds the file
+        os.rename(path, claimed)
+    except OSError:
+        return None
+    try:
+        if os.path.getmtime(claimed) < time.time() - PREVIEW_TTL_SECONDS:
+            os.remove(claimed)
+            return None
+        with open(claimed, encoding="utf-8") as f:
+            preview = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if preview["username"] != username:
+        # Not ours: put it back for its owner
+        os.rename(claimed, path)
+        return None
+    os.remove(claimed)
+    return preview
+
+def apply_preview(preview: dict, db: Session, progress: Progress = None) -> dict:
+    """
+    Commit a preview taken with claim_preview. The file is never parsed again; the diff
+    is only recomputed (from the cached rows) when personnel changed since the preview was taken.
+    """
+    diff = preview["diff"]
+    if _personnel_version() != preview["version"]:
+        diff = compute_diff(db, pd.DataFrame(preview["rows"], columns=PERSONNEL_FIELDS))
+    if progress:
+        progress(parsed=diff["stats"]["total"], **{k: diff["stats"][k] for k in ("added", "updated", "skipped")})
+
+    apply_diff(db, diff, progress)
+
+    print(f"Import finished. Stats: {diff['stats']}")
+    return {"stats": diff["stats"], "details": diff["details"]}
+
+def process_json_data(f: IO[bytes], db: Session, progress: Progress = None) -> dict:
+    """
+    Simple JSON array import: every field is overwritten as given. The array is parsed
+    incrementally and written in chunks within one transaction. Returns {"count": n}.
+    """
+    count = 0
+    facet_delta = facet_utils.new_delta()
+    items = reader_utils.iter_json_array(f)
+    while True:
+        batch = list(islice(items, IMPORT_CHUNK_SIZE))
+        if not batch:
+            break
+
+        nrps = [str(item.get("nrp") or item.get("NRP")) for item in batch]
+        existing = {p.nrp: p for p in db.query(Personnel).filter(Personnel.nrp.in_(set(nrps)))}
+
+        touched = {}
+        for nrp, item in zip(nrps, batch):
+            if not nrp: continue
+
+            personnel = existing.get(nrp)
+            before = facet_utils.snapshot(personnel) if personnel is not None else None
+            if personnel is None:
+                personnel = Personnel(nrp=nrp)
+                db.add(personnel)
+                existing[nrp] = personnel
+            personnel.nama = item.get("nama")
+            personnel.pangkat = item.get("pangkat")
+            personnel.jabatan = item.get("jabatan")
+            personnel.bag = item.get("bag")
+            personnel.jenis_kelamin = item.get("jenis_kelamin")
+            facet_utils.add_changes(facet_delta, [(before, facet_utils.snapshot(personnel))])
+            touched[nrp] = personnel
+            count += 1
+
+        db.flush()
+        search_utils.index_personnel(db, list(touched.values()))
+        if progress:
+            progress(parsed=count, written=count)
+
+    calendar_utils.record_reset(db)
+    db.commit()
+    facet_utils.apply_delta(facet_delta)
+    return {"count": count}
+
+def process_users_file(content: bytes, db: Session, progress: Progress = None) -> dict:
+    """
+    Create users from an Excel sheet with username, password, full_name, role and email columns.
+    Existing or repeated usernames are reported per row and skipped.
+    """
+    df = pd.read_excel(io.BytesIO(content))
+
+    # Normalize column names to lowercase for checking
+    df.columns = [str(c).lower().strip() for c in df.columns]
+    required_columns = ['username', 'password', 'full_name', 'role', 'email']
+    missing_cols = [col for col in required_columns if col not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Missing columns: {', '.join(missing_cols)}")
+    if progress:
+        progress(parsed=len(df), created=0, errors=0)
+
+    usernames = [str(u).strip() for u in df['username'].dropna()]
+    taken = set()
+    for i in range(0, len(usernames), IMPORT_CHUNK_SIZE):
+        chunk = usernames[i:i + IMPORT_CHUNK_SIZE]
+        taken.update(u for (u,) in db.query(User.username).filter(User.username.in_(chunk)))
+
+    errors = []
+    accepted = []
+    for index, row in enumerate(df.to_dict("records")):
+        try:
+            if pd.isna(row['username']):
+                continue
+            username = str(row['username']).strip()
+            if not username:
+                continue
+
+            if username in taken:
+                errors.append(f"Row {index+2}: Username '{username}' already exists")
+                continue
+
+            accepted.append((username, row))
+            taken.add(username)
+
+        except Exception as e:
+            errors.append(f"Row {index+2}: {str(e)}")
+
+        finally:
+            if progress:
+                progress(processed=index + 1, errors=len(errors))
+
+    # bcrypt dominates the import time, so all passwords are hashed together in a process pool
+    hashes = hash_passwords([str(row['password']) for _, row in accepted])
+    success_count = 0
+    for (username, row), password_hash in zip(accepted, hashes):
+        db.add(User(
+            username=username,
+            password_hash=password_hash,
+            full_name=str(row['full_name']) if not pd.isna(row['full_name']) else None,
+            role=str(row['role']).lower() if not pd.isna(row['role']) else 'admin',
+            email=str(row['email']) if not pd.isna(row['email']) else None,
+            status='active'
+        ))
+        success_count += 1
+        if progress and (success_count % 50 == 0 or success_count == len(accepted)):
+            progress(created=success_count)
+
+    db.commit()
+    return {
+        "message": f"Successfully imported {success_count} users",
+        "created": success_count,
+        "errors": errors,
+        "total_processed": len(df)
+    }
@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+from typing import Optional
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from backend.models import LeaveHistory
+
+def compute_end_date(tanggal_mulai: date, jumlah_hari: int, tanggal_selesai: Optional[date] = None) -> date:
+    """End date to persist: the explicit one if given, otherwise start + jumlah_hari - 1."""
+    if tanggal_selesai:
+        return tanggal_selesai
+    return tanggal_mulai + timedelta(days=max(jumlah_hari or 1, 1) - 1)
+
+def active_on(day: date):
+    """Filter clause for leaves covering `day` (served by ix_leave_history_dates)."""
+    return and_(LeaveHistory.tanggal_mulai <= day, LeaveHistory.tanggal_selesai >= day)
+
+def overlapping(start: date, end: date):
+    """Filter clause for leaves overlapping the inclusive range [start, end]."""
+    return and_(LeaveHistory.tanggal_mulai <= end, LeaveHistory.tanggal_selesai >= start)
+
+def backfill_end_dates(db: Session, batch_size: int = 1000) -> int:
+    """Fill tanggal_selesai on rows written before it was always persisted. Returns rows updated."""
+    count = 0
+    while True:
+        rows = db.query(LeaveHistory.id, LeaveHistory.tanggal_mulai, LeaveHistory.jumlah_hari)\
+            .filter(LeaveHistory.tanggal_selesai == None, LeaveHistory.tanggal_mulai != None)\
+            .limit(batch_size).all()
+        if not rows:
+            break
+        db.bulk_update_mappings(LeaveHistory, [
+            {"id": leave_id, "tanggal_selesai": compute_end_date(start, days)}
+            for leave_id, start, days in rows
+        ])
+        db.commit()
+        count += len(rows)
+    return count
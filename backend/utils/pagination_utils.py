@@ -0,0 +1,98 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from fastapi import HTTPException, Response
+from sqlalchemy import String, and_, or_, type_coerce
+from sqlalchemy.orm import Query
+
+def _raw(column):
+    """
+    Compare against the value exactly as the database stores it.
+    SQLite keeps server_default timestamps and Python-written timestamps in different
+    text formats, so round-tripping through datetime objects would break tie handling.
+    type_coerce emits no CAST, so indexes on the column are still used.
+    """
+    return type_coerce(column, String)
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date, Decimal)):
+        return str(value)
+    if hasattr(value, "value"):
+        return value.value
+    return value
+
+def encode_cursor(sort_key: str, descending: bool, value, row_id: int) -> str:
+    payload = json.dumps([sort_key, descending, _encode_value(value), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_key, descending, value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return sort_key, bool(descending), value, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def keyset_filter(sort_column, id_column, descending: bool, value, row_id: int):
+    """
+    Rows strictly after (value, row_id) in ORDER BY sort_column, id_column.
+    NULLs sort first ascending and last descending (SQLite/MySQL behaviour).
+    """
+    col = _raw(sort_column)
+    if descending:
+        if value is None:
+            return and_(sort_column == None, id_column < row_id)
+        return or_(
+            col < value,
+            and_(col == value, id_column < row_id),
+            sort_column == None
+        )
+    if value is None:
+        return or_(and_(sort_column == None, id_column > row_id), sort_column != None)
+    return or_(col > value, and_(col == value, id_column > row_id))
+
+def paginate(
+    query: Query,
+    response: Response,
+    sort_column,
+    id_column,
+    descending: bool,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None
+) -> list:
+    """
+    Apply ordering and either offset (skip) or keyset (cursor) pagination.
+
+    Results are always ordered by (sort_column, id) so pages are stable. When a full page
+    is returned, an opaque continuation token is set in the X-Next-Cursor header; passing it
+    back as `cursor` fetches the next page without OFFSET. `skip` is ignored when a cursor is given.
+    """
+    sort_key = str(sort_column)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    if cursor:
+        try:
+            cursor_key, cursor_desc, value, row_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if cursor_key != sort_key or cursor_desc != descending:
+            raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+        query = query.filter(keyset_filter(sort_column, id_column, descending, value, row_id))
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.add_columns(_raw(sort_column), id_column).limit(limit).all()
+    items = [row[0] for row in rows]
+
+    if limit and len(rows) == limit:
+        _, last_value, last_id = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(sort_key, descending, last_value, last_id)
+
+    return items
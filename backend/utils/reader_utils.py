@@ -0,0 +1,128 @@
+import csv
+import json
+import re
+import zipfile
+from typing import IO, Any, Iterator, List, Optional
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Bytes read per step by the incremental JSON parser
+JSON_READ_SIZE = 64 * 1024
+
+# Characters inspected to detect the CSV delimiter
+CSV_SNIFF_SIZE = 16 * 1024
+
+# A top-level number is only complete once one of these follows it
+_NUMBER_END = re.compile(r"[\s,\]]")
+
+def cell_text(value: Any) -> Optional[str]:
+    """Render a cell like pd.read_excel(dtype=str): None stays None, integral floats lose '.0'."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    text = str(value)
+    return text if text != "" else None
+
+def iter_xlsx_rows(file_path: str) -> Iterator[List[Optional[str]]]:
+    """
+    Yield the first worksheet row by row from a read-only workbook, so only the current
+    row is held in memory. Legacy .xls content falls back to a full pandas read.
+    """
+    try:
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile):
+        df = pd.read_excel(file_path, header=None, dtype=str)
+        for row in df.itertuples(index=False):
+            yield [None if pd.isna(v) else v for v in row]
+        return
+
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield [cell_text(v) for v in row]
+    finally:
+        workbook.close()
+
+def iter_csv_rows(file_path: str) -> Iterator[List[Optional[str]]]:
+    """Yield CSV rows (comma or semicolon separated, optional UTF-8 BOM) with empty cells as None."""
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(CSV_SNIFF_SIZE)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(f, dialect):
+            yield [cell_text(v.strip()) for v in row]
+
+def iter_json_array(f: IO[bytes]) -> Iterator[Any]:
+    """
+    Incrementally parse a top-level JSON array, yielding one element at a time.
+    Only the element being decoded (plus one read buffer) is kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+    tail = b""
+
+    def read_more() -> bool:
+        nonlocal buffer, pos, eof, tail
+        chunk = f.read(JSON_READ_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        # Keep incomplete UTF-8 sequences for the next read
+        data = tail + chunk
+        try:
+            text = data.decode("utf-8-sig" if not started and not buffer else "utf-8")
+            tail = b""
+        except UnicodeDecodeError as e:
+            if e.start < len(data) - 3:
+                raise
+            text = data[:e.start].decode("utf-8")
+            tail = data[e.start:]
+        buffer = buffer[pos:] + text
+        pos = 0
+        return True
+
+    while True:
+        # Skip whitespace and separators between elements
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or not read_more():
+                break
+
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of JSON input")
+
+        char = buffer[pos]
+        if not started:
+            if char != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if char == "]":
+            return
+        if char == ",":
+            pos += 1
+            continue
+
+        # A number at the buffer edge may continue in the next read
+        if char in "-0123456789":
+            while not _NUMBER_END.search(buffer, pos) and read_more():
+                pass
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                if eof or not read_more():
+                    raise ValueError("Invalid JSON input")
+        pos = end
+        yield item
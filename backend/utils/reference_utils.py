@@ -0,0 +1,95 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+from backend import schemas
+from backend.models import Holiday, LeaveType
+from backend.core import cache
+
+# Leave types and holidays are tiny and rarely change, so every process keeps a full
+# snapshot of each table. A snapshot is reloaded when the entity's cache version moves,
+# i.e. after invalidate() or a notify_change for it - in any worker when CACHE_URL is shared.
+# Snapshots also expire after CACHE_TTL_SECONDS to pick up writes made outside the API
+# (seed scripts, manual SQL).
+
+# entity -> {"version": int, "loaded_at": float, "items": [...], "etag": str}
+_snapshots: Dict[str, dict] = {}
+_lock = threading.Lock()
+
+def _load_leave_types(db: Session) -> list:
+    return [schemas.LeaveType.model_validate(lt) for lt in db.query(LeaveType).order_by(LeaveType.name).all()]
+
+def _load_holidays(db: Session) -> list:
+    return [schemas.HolidayResponse.model_validate(h) for h in db.query(Holiday).order_by(Holiday.date).all()]
+
+_LOADERS = {
+    "leave_types": _load_leave_types,
+    "holidays": _load_holidays,
+}
+
+def _is_current(snapshot: Optional[dict], version: int) -> bool:
+    return (
+        snapshot is not None
+        and snapshot["version"] == version
+        and time.monotonic() - snapshot["loaded_at"] < cache.DEFAULT_TTL
+    )
+
+def _snapshot(db: Session, entity: str) -> dict:
+    # Read the version before loading so a change committed mid-load forces another reload
+    version = cache.get_version(entity)
+    snapshot = _snapshots.get(entity)
+    if not _is_current(snapshot, version):
+        with _lock:
+            snapshot = _snapshots.get(entity)
+            if not _is_current(snapshot, version):
+                items = _LOADERS[entity](db)
+                payload = json.dumps([item.model_dump(mode="json") for item in items], sort_keys=True)
+                snapshot = {
+                    "version": version,
+                    "loaded_at": time.monotonic(),
+                    "items": items,
+                    "etag": f'"{hashlib.sha1(payload.encode()).hexdigest()[:20]}"'
+                }
+                _snapshots[entity] = snapshot
+    return snapshot
+
+def invalidate(entity: str):
+    """Drop the snapshot for `entity` ("leave_types" or "holidays") in every worker. Call after commit."""
+    cache.bump_version(entity)
+
+def not_modified(db: Session, entity: str, request: Request, response: Response) -> bool:
+    """
+    Set the ETag for `entity` on the response and report whether the client's
+    If-None-Match already matches it (the caller then answers 304).
+    """
+    etag = _snapshot(db, entity)["etag"]
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    candidates = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    return etag in candidates or "*" in candidates
+
+def leave_types(db: Session, include_inactive: bool = False, gender: Optional[str] = None) -> List[schemas.LeaveType]:
+    """Leave types ordered by name; with `gender`, those not gender-specific or matching it."""
+    return [
+        lt for lt in _snapshot(db, "leave_types")["items"]
+        if (include_inactive or lt.is_active)
+        and (not gender or lt.gender_specific is None or lt.gender_specific == gender)
+    ]
+
+def get_leave_type(db: Session, leave_type_id: int, active_only: bool = True) -> Optional[schemas.LeaveType]:
+    for lt in _snapshot(db, "leave_types")["items"]:
+        if lt.id == leave_type_id:
+            return lt if lt.is_active or not active_only else None
+    return None
+
+def holidays(db: Session, start_date=None, end_date=None) -> List[schemas.HolidayResponse]:
+    """Active holidays ordered by date, optionally limited to [start_date, end_date]."""
+    return [
+        h for h in _snapshot(db, "holidays")["items"]
+        if h.is_active
+        and (start_date is None or h.date >= start_date)
+        and (end_date is None or h.date <= end_date)
+    ]
@@ -0,0 +1,136 @@
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from backend.models import LeaveHistory, LeaveDailyRollup, LeavePersonnelRollup, LeaveType
+
+# Rollup delta: key -> [leave_count, total_days]
+Deltas = Dict[Tuple, list]
+
+def _apply(db: Session, model, key_columns: Tuple[str, str], deltas: Deltas):
+    """Add count/day deltas to rollup rows: one SELECT for existing keys, batched UPDATE/INSERT on flush."""
+    deltas = {key: d for key, d in deltas.items() if d[0] or d[1]}
+    if not deltas:
+        return
+
+    first_col, second_col = (getattr(model, c) for c in key_columns)
+    existing = db.query(model).filter(
+        first_col.in_({k[0] for k in deltas}),
+        second_col.in_({k[1] for k in deltas})
+    ).all()
+    existing_map = {(getattr(r, key_columns[0]), getattr(r, key_columns[1])): r for r in existing}
+
+    for key, (count, days) in deltas.items():
+        row = existing_map.get(key)
+        if row:
+            row.leave_count = (row.leave_count or 0) + count
+            row.total_days = (row.total_days or 0) + days
+        else:
+            db.add(model(**{key_columns[0]: key[0], key_columns[1]: key[1]}, leave_count=count, total_days=days))
+    db.flush()
+
+def record_leaves(db: Session, leaves: Iterable[LeaveHistory], sign: int = 1):
+    """
+    Apply leave rows to the rollups (sign=1 when adding, sign=-1 when removing).
+    Does not commit - call in the same transaction as the leave write.
+    """
+    daily = defaultdict(lambda: [0, 0])
+    per_personnel = defaultdict(lambda: [0, 0])
+    for leave in leaves:
+        days = leave.jumlah_hari or 0
+        d = daily[(leave.tanggal_mulai, leave.leave_type_id)]
+        d[0] += sign
+        d[1] += sign * days
+        p = per_personnel[(leave.personnel_id, leave.leave_type_id)]
+        p[0] += sign
+        p[1] += sign * days
+
+    _apply(db, LeaveDailyRollup, ("day", "leave_type_id"), daily)
+    _apply(db, LeavePersonnelRollup, ("personnel_id", "leave_type_id"), per_personnel)
+
+def record_leave(db: Session, leave: LeaveHistory, sign: int = 1):
+    record_leaves(db, [leave], sign)
+
+def remove_personnel(db: Session, personnel_id: int):
+    """
+    Take a personnel's leaves out of the daily rollup before the personnel (and, by cascade,
+    their leaves and per-personnel rollup rows) is deleted.
+    """
+    rows = db.query(
+        LeaveHistory.tanggal_mulai,
+        LeaveHistory.leave_type_id,
+        func.count(LeaveHistory.id),
+        func.sum(LeaveHistory.jumlah_hari)
+    ).filter(LeaveHistory.personnel_id == personnel_id)\
+     .group_by(LeaveHistory.tanggal_mulai, LeaveHistory.leave_type_id).all()
+
+    _apply(db, LeaveDailyRollup, ("day", "leave_type_id"), {
+        (day, ltid): [-count, -(days or 0)] for day, ltid, count, days in rows
+    })
+
+def totals(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    leave_type_code: Optional[str] = None,
+    personnel_id: Optional[int] = None
+) -> Optional[Tuple[int, int]]:
+    """
+    (leave count, total days) for leaves starting in [start, end], read from the rollups.
+    Returns None for a personnel filter combined with dates, which no rollup covers.
+    """
+    if personnel_id is not None:
+        if start or end:
+            return None
+        model = LeavePersonnelRollup
+        query = db.query(func.sum(model.leave_count), func.sum(model.total_days))\
+            .filter(model.personnel_id == personnel_id)
+    else:
+        model = LeaveDailyRollup
+        query = db.query(func.sum(model.leave_count), func.sum(model.total_days))
+        if start:
+            query = query.filter(model.day >= start)
+        if end:
+            query = query.filter(model.day <= end)
+    if leave_type_code:
+        query = query.join(LeaveType, LeaveType.id == model.leave_type_id)\
+            .filter(LeaveType.code == leave_type_code)
+    count, days = query.one()
+    return int(count or 0), int(days or 0)
+
+def rebuild_rollups(db: Session) -> int:
+    """Recompute both rollup tables from leave_history. Returns number of daily rollup rows."""
+    db.query(LeaveDailyRollup).delete(synchronize_session=False)
+    db.query(LeavePersonnelRollup).delete(synchronize_session=False)
+
+    daily = db.query(
+        LeaveHistory.tanggal_mulai,
+        LeaveHistory.leave_type_id,
+        func.count(LeaveHistory.id),
+        func.sum(LeaveHistory.jumlah_hari)
+    ).filter(
+        LeaveHistory.tanggal_mulai != None,
+        LeaveHistory.leave_type_id != None
+    ).group_by(LeaveHistory.tanggal_mulai, LeaveHistory.leave_type_id).all()
+    db.bulk_insert_mappings(LeaveDailyRollup, [
+        {"day": day, "leave_type_id": ltid, "leave_count": count, "total_days": days or 0}
+        for day, ltid, count, days in daily
+    ])
+
+    per_personnel = db.query(
+        LeaveHistory.personnel_id,
+        LeaveHistory.leave_type_id,
+        func.count(LeaveHistory.id),
+        func.sum(LeaveHistory.jumlah_hari)
+    ).filter(
+        LeaveHistory.personnel_id != None,
+        LeaveHistory.leave_type_id != None
+    ).group_by(LeaveHistory.personnel_id, LeaveHistory.leave_type_id).all()
+    db.bulk_insert_mappings(LeavePersonnelRollup, [
+        {"personnel_id": pid, "leave_type_id": ltid, "leave_count": count, "total_days": days or 0}
+        for pid, ltid, count, days in per_personnel
+    ])
+
+    db.commit()
+    return len(daily)
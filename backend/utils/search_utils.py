@@ -0,0 +1,101 @@
+import re
+from typing import Iterable, Sequence, Set
+from sqlalchemy import distinct, func, insert, or_, select
+from sqlalchemy.orm import Session
+from backend.models import Personnel, PersonnelSearchGram
+
+# Personnel columns covered by the trigram index
+SEARCH_FIELDS = ("nama", "nrp", "jabatan")
+
+# Terms shorter than this cannot be answered from trigrams and fall back to a plain ILIKE scan
+MIN_GRAM_TERM = 3
+
+def normalize(text) -> str:
+    if text is None:
+        return ""
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+def trigrams(text: str, pad: bool = True) -> Set[str]:
+    """
+    Split normalized text into 3-character grams.
+    Indexed values are padded with a space on both ends so grams at word boundaries exist;
+    search terms are not padded so they match anywhere inside the value.
+    """
+    text = normalize(text)
+    if not text:
+        return set()
+    if pad:
+        text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def index_personnel(db: Session, personnel_list: Sequence[Personnel]):
+    """
+    (Re)build index rows for the given personnel. Rows must already have ids (flush first).
+    Does not commit - call inside the same transaction as the personnel write.
+    """
+    ids = [p.id for p in personnel_list if p.id is not None]
+    if not ids:
+        return
+
+    db.query(PersonnelSearchGram).filter(
+        PersonnelSearchGram.personnel_id.in_(ids)
+    ).delete(synchronize_session=False)
+
+    mappings = []
+    for p in personnel_list:
+        if p.id is None:
+            continue
+        for field in SEARCH_FIELDS:
+            for gram in trigrams(getattr(p, field)):
+                mappings.append({"personnel_id": p.id, "field": field, "gram": gram})
+
+    if mappings:
+        # Core executemany: no per-row ORM bookkeeping for what can be hundreds of thousands of grams
+        db.execute(insert(PersonnelSearchGram.__table__), mappings)
+
+def rebuild_search_index(db: Session, batch_size: int = 1000) -> int:
+    """Recreate the whole trigram index from the personnel table. Returns number of personnel indexed."""
+    db.query(PersonnelSearchGram).delete(synchronize_session=False)
+
+    count = 0
+    last_id = 0
+    while True:
+        batch = db.query(Personnel).filter(Personnel.id > last_id)\
+            .order_by(Personnel.id).limit(batch_size).all()
+        if not batch:
+            break
+        index_personnel(db, batch)
+        count += len(batch)
+        last_id = batch[-1].id
+        db.expunge_all()
+
+    db.commit()
+    return count
+
+def search_filter(term: str, fields: Iterable[str] = SEARCH_FIELDS):
+    """
+    Build a filter clause on Personnel matching `term` in any of `fields`.
+
+    Terms of 3+ characters are substring matches: candidates come from the trigram index
+    (a personnel/field must contain every gram of the term) and are then confirmed with
+    ILIKE on that small candidate set. Shorter terms are the same substring match
+    (`%term%`) without the index.
+    """
+    fields = list(fields)
+    columns = [getattr(Personnel, field) for field in fields]
+    needle = normalize(term)
+
+    if len(needle) < MIN_GRAM_TERM:
+        return or_(*[col.ilike(f"%{needle}%") for col in columns])
+
+    grams = trigrams(needle, pad=False)
+    candidates = select(PersonnelSearchGram.personnel_id).where(
+        PersonnelSearchGram.field.in_(fields),
+        PersonnelSearchGram.gram.in_(grams)
+    ).group_by(
+        PersonnelSearchGram.personnel_id,
+        PersonnelSearchGram.field
+    ).having(func.count(distinct(PersonnelSearchGram.gram)) == len(grams))
+
+    pattern = f"%{needle}%"
+    return Personnel.id.in_(candidates) & or_(*[col.ilike(pattern) for col in columns])
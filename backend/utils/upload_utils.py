@@ -0,0 +1,66 @@
+import hashlib
+import os
+import uuid
+from typing import Optional, Tuple
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Maximum evidence upload size, enforced while streaming to disk
+MAX_EVIDENCE_SIZE = int(os.getenv("MAX_EVIDENCE_SIZE_MB", 10)) * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Allowed evidence types identified by their leading magic bytes: (signature, content type, extension)
+EVIDENCE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (b"%PDF-", "application/pdf", "pdf"),
+]
+
+def sniff_content_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """Return (content_type, extension) detected from the first bytes of a file, or None."""
+    for signature, content_type, extension in EVIDENCE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    return None
+
+async def save_evidence(file: UploadFile, directory: str, max_size: Optional[int] = None) -> Tuple[str, str]:
+    """
+    Stream an uploaded evidence file to disk in chunks without blocking the event loop.
+
+    The real type is taken from magic bytes (the client-supplied content type is ignored),
+    the size limit is enforced while copying, and a SHA-256 digest is computed on the way.
+    Returns (file_path, sha256_hex). Partial files are removed on any failure.
+    """
+    max_size = max_size or MAX_EVIDENCE_SIZE
+    head = await file.read(CHUNK_SIZE)
+    detected = sniff_content_type(head)
+    if not detected:
+        raise HTTPException(status_code=400, detail="Invalid file type. Allowed: JPG, PNG, PDF")
+
+    _, extension = detected
+    file_path = f"{directory}/{uuid.uuid4()}.{extension}"
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(file_path, "wb") as out:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum size is {max_size // (1024 * 1024)} MB"
+                    )
+                digest.update(chunk)
+                await out.write(chunk)
+                chunk = await file.read(CHUNK_SIZE)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    return file_path, digest.hexdigest()
@@ -13,7 +13,7 @@ import {
   Calendar as CalendarIcon, // Rename to avoid conflict
   Loader2
 } from 'lucide-react';
-import { useEffect, useState, useCallback } from 'react';
+import { useEffect, useState, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { formatTimeAgo } from '@/utils/dateUtils';
 import { AddLeaveModal } from '@/components/AddLeaveModal';
@@ -21,6 +21,9 @@ import { useEntitySubscription } from '@/lib/NotificationContext';
 import { Calendar } from "@/components/ui/calendar";
 import axios from 'axios';
 
+const toISODate = (d) =>
+  `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}-${String(d.getDate()).padStart(2, '0')}`;
+
 export default function Dashboard() {
   const navigate = useNavigate();
   const userRole = localStorage.getItem('role');
@@ -42,6 +45,11 @@ export default function Dashboard() {
   const [isAddLeaveModalOpen, setIsAddLeaveModalOpen] = useState(false);
   const [date, setDate] = useState(new Date());
   const [holidays, setHolidays] = useState([]);
+  const [calendarMonth, setCalendarMonth] = useState(new Date());
+  const [calendarLeaves, setCalendarLeaves] = useState([]);
+  // Per-month snapshots ({ version, leaves }) so revisiting a month only fetches what changed
+  const calendarCache = useRef({});
+  const activeMonthKey = useRef(null);
 
   const fetchStats = useCallback(async () => {
     try {
@@ -66,6 +74,41 @@ export default function Dashboard() {
     fetchStats();
   }, [fetchStats]);
 
+  const fetchCalendar = useCallback(async () => {
+    const start = new Date(calendarMonth.getFullYear(), calendarMonth.getMonth(), 1);
+    const end = new Date(calendarMonth.getFullYear(), calendarMonth.getMonth() + 1, 0);
+    const key = toISODate(start);
+    activeMonthKey.current = key;
+
+    const cached = calendarCache.current[key];
+    if (cached) setCalendarLeaves(cached.leaves);
+
+    try {
+      const token = localStorage.getItem('token');
+      const res = await axios.get('/api/dashboard/calendar', {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { start_date: key, end_date: toISODate(end), since: cached?.version }
+      });
+      const { version, full, leaves, removed } = res.data;
+
+      let merged = leaves;
+      if (!full && cached) {
+        const replaced = new Set([...removed, ...leaves.map(l => l.id)]);
+        merged = [...cached.leaves.filter(l => !replaced.has(l.id)), ...leaves];
+      }
+      calendarCache.current[key] = { version, leaves: merged };
+
+      // Ignore responses for a month the user already navigated away from
+      if (activeMonthKey.current === key) setCalendarLeaves(merged);
+    } catch (error) {
+      console.error("Error fetching calendar leaves:", error);
+    }
+  }, [calendarMonth]);
+
+  useEffect(() => {
+    fetchCalendar();
+  }, [fetchCalendar]);
+
   // Fetch holidays from API
   useEffect(() => {
     const fetchHolidays = async () => {
@@ -87,6 +130,9 @@ export default function Dashboard() {
   useEntitySubscription('personnel', fetchStats);
   useEntitySubscription('users', fetchStats);
   useEntitySubscription('leave_types', fetchStats);
+  useEntitySubscription('leaves', fetchCalendar);
+  useEntitySubscription('personnel', fetchCalendar);
+  useEntitySubscription('leave_types', fetchCalendar);
 
   // Get icon and colors based on audit action type
   const getActivityStyle = (activity) => {
@@ -158,7 +204,7 @@ export default function Dashboard() {
   };
 
   const hasLeave = (day) => {
-    return statsData.calendar_leaves?.some(leave => {
+    return calendarLeaves.some(leave => {
       const start = new Date(leave.start_date);
       const end = new Date(leave.end_date);
       const current = new Date(day);
@@ -173,7 +219,7 @@ export default function Dashboard() {
     if (!date) return [];
     const current = new Date(date);
     current.setHours(0, 0, 0, 0);
-    return statsData.calendar_leaves?.filter(leave => {
+    return calendarLeaves.filter(leave => {
       const start = new Date(leave.start_date);
       const end = new Date(leave.end_date);
       start.setHours(0, 0, 0, 0);
@@ -432,6 +478,8 @@ export default function Dashboard() {
                 mode="single"
                 selected={date}
                 onSelect={setDate}
+                month={calendarMonth}
+                onMonthChange={setCalendarMonth}
                 className="rounded-md border p-3"
                 modifiers={{
                   holiday: (d) => isHoliday(d),
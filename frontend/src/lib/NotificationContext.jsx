@@ -165,7 +165,8 @@ export function NotificationProvider({ children }) {
         const actionLabels = {
           create: 'membuat',
           update: 'mengubah',
-          delete: 'menghapus'
+          delete: 'menghapus',
+          mixed: 'mengubah beberapa'
         };
 
         const entityLabels = {
@@ -177,19 +178,27 @@ export function NotificationProvider({ children }) {
           audit: 'audit log'
         };
 
+        // Coalesced bursts arrive as one message with a change count; warn if any change was a delete
+        const countLabel = data.batch ? ` (${data.count} perubahan)` : '';
+        const message = `${username} ${actionLabels[action] || action} ${entityLabels[entity] || entity}${countLabel}`;
+        const hasDelete = data.batch
+          ? (data.changes || []).some((change) => change.action === 'delete')
+          : action === 'delete';
+        const toastType = hasDelete ? 'warning' : 'info';
+
         addToast({
-          type: action === 'delete' ? 'warning' : 'info',
+          type: toastType,
           title: 'Data Diperbarui',
-          message: `${username} ${actionLabels[action] || action} ${entityLabels[entity] || entity}`,
+          message,
           entity,
           action
         });
 
         // Add to notification history
         addToHistory({
-          type: action === 'delete' ? 'warning' : 'info',
+          type: toastType,
           title: 'Data Diperbarui',
-          message: `${username} ${actionLabels[action] || action} ${entityLabels[entity] || entity}`,
+          message,
           entity,
           action,
           username,
@@ -198,6 +207,17 @@ export function NotificationProvider({ children }) {
 
         // Notify all subscribers for this entity
         notifySubscribers(entity, data);
+      } else if (data.type === 'resync') {
+        // The server dropped events we could not receive in time: every subscriber refetches
+        subscribersRef.current.forEach((subscribers, entity) => {
+          subscribers.forEach((callback) => {
+            try {
+              callback({ ...data, entity });
+            } catch (error) {
+              console.error('[WS] Error in subscriber callback:', error);
+            }
+          });
+        });
       }
     } catch (error) {
       console.error('[WS] Error parsing message:', error);
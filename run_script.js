@@ -19,6 +19,7 @@ if (!scriptName) {
   console.error('  manage seed   - Add dummy data for testing');
   console.error('  manage reset  - Clear operational data');
   console.error('  manage check  - Show database status');
+  console.error('  manage rebuild - Recompute derived tables (balances, search index)');
   process.exit(1);
 }
 